@@ -28,7 +28,8 @@ fi
 
 # Run the application
 echo "Starting VeDownloader Portable..."
-python "$SCRIPT_DIR/app/advanced_gui.py"
+# As a module, so it loads from its precompiled bytecode (see package_portable.py)
+python -m advanced_gui
 
 # Deactivate virtual environment when done
 deactivate
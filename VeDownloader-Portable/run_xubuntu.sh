@@ -37,75 +37,104 @@ else
     echo "Continuing anyway..."
 fi
 
-# Check if Python is installed
-if ! command -v python3 &> /dev/null; then
-    echo "Error: Python 3 is not installed."
-    echo "Please install Python 3 using your distribution's package manager."
-    echo "For example: sudo apt install python3 python3-pip python3-venv"
-    exit 1
-fi
+# The checks below start Python, pip and dpkg several times, so they are
+# skipped while nothing they looked at has changed. The stamp written after
+# they pass holds the versions they found and, on its last line, a hash of
+# the interpreter, the installed packages and this launcher.
+STAMP=".venv/.run_xubuntu-stamp"
+
+venv_hash() {
+    # Read without starting Python; creating the venv or installing,
+    # upgrading or removing a package changes it
+    {
+        stat -L -c '%n %s %Y' .venv/bin/python3
+        cat .venv/pyvenv.cfg
+        printf '%s\n' .venv/lib/python*/site-packages/*.dist-info .venv/lib/python*/site-packages/*.egg-info
+        cksum < "${BASH_SOURCE[0]}"
+    } 2>/dev/null | cksum
+}
+
+if [ -f "$STAMP" ] && [ "$(tail -n 1 "$STAMP")" == "venv $(venv_hash)" ]; then
+    echo "Dependencies unchanged since the last check."
+    if ! command -v ffmpeg &> /dev/null; then
+        echo "Warning: FFmpeg is not installed. Some download features may not work properly."
+    fi
+    source .venv/bin/activate
+else
+    # Check if Python is installed
+    if ! command -v python3 &> /dev/null; then
+        echo "Error: Python 3 is not installed."
+        echo "Please install Python 3 using your distribution's package manager."
+        echo "For example: sudo apt install python3 python3-pip python3-venv"
+        exit 1
+    fi
 
-# Check Python version
-PYTHON_VERSION=$(python3 -c 'import sys; print(f"{sys.version_info.major}.{sys.version_info.minor}")')
-REQUIRED_VERSION="3.6"
+    # Check Python version
+    PYTHON_VERSION=$(python3 -c 'import sys; print(f"{sys.version_info.major}.{sys.version_info.minor}")')
+    REQUIRED_VERSION="3.6"
 
-if [ "$(printf '%s\n' "$REQUIRED_VERSION" "$PYTHON_VERSION" | sort -V | head -n1)" != "$REQUIRED_VERSION" ]; then
-    echo "Error: Python version $PYTHON_VERSION is installed, but VeDownloader requires Python $REQUIRED_VERSION or higher."
-    exit 1
-fi
+    if [ "$(printf '%s\n' "$REQUIRED_VERSION" "$PYTHON_VERSION" | sort -V | head -n1)" != "$REQUIRED_VERSION" ]; then
+        echo "Error: Python version $PYTHON_VERSION is installed, but VeDownloader requires Python $REQUIRED_VERSION or higher."
+        exit 1
+    fi
 
-# Check for required packages
-echo "Checking for required packages..."
-
-# Check for libxcb-xinerama0
-if ! dpkg -l | grep -q libxcb-xinerama0; then
-    echo "Warning: libxcb-xinerama0 is not installed."
-    echo "This package is required for PyQt5 to work properly on Xubuntu."
-    echo "To install it, run: sudo apt install libxcb-xinerama0"
-    echo ""
-    echo "Would you like to install it now? (y/n)"
-    read -r INSTALL_LIBXCB
-    if [[ "$INSTALL_LIBXCB" == "y" || "$INSTALL_LIBXCB" == "Y" ]]; then
-        sudo apt install -y libxcb-xinerama0
-    else
-        echo "Continuing without libxcb-xinerama0..."
+    # Check for required packages
+    echo "Checking for required packages..."
+
+    # Check for libxcb-xinerama0
+    if ! dpkg -l | grep -q libxcb-xinerama0; then
+        echo "Warning: libxcb-xinerama0 is not installed."
+        echo "This package is required for PyQt5 to work properly on Xubuntu."
+        echo "To install it, run: sudo apt install libxcb-xinerama0"
+        echo ""
+        echo "Would you like to install it now? (y/n)"
+        read -r INSTALL_LIBXCB
+        if [[ "$INSTALL_LIBXCB" == "y" || "$INSTALL_LIBXCB" == "Y" ]]; then
+            sudo apt install -y libxcb-xinerama0
+        else
+            echo "Continuing without libxcb-xinerama0..."
+        fi
     fi
-fi
 
-# Check for FFmpeg
-if ! command -v ffmpeg &> /dev/null; then
-    echo "Warning: FFmpeg is not installed."
-    echo "Some download features may not work properly."
-    echo "To install FFmpeg, run: sudo apt install ffmpeg"
-    echo ""
-    echo "Would you like to install it now? (y/n)"
-    read -r INSTALL_FFMPEG
-    if [[ "$INSTALL_FFMPEG" == "y" || "$INSTALL_FFMPEG" == "Y" ]]; then
-        sudo apt install -y ffmpeg
-    else
-        echo "Continuing without FFmpeg..."
+    # Check for FFmpeg
+    if ! command -v ffmpeg &> /dev/null; then
+        echo "Warning: FFmpeg is not installed."
+        echo "Some download features may not work properly."
+        echo "To install FFmpeg, run: sudo apt install ffmpeg"
+        echo ""
+        echo "Would you like to install it now? (y/n)"
+        read -r INSTALL_FFMPEG
+        if [[ "$INSTALL_FFMPEG" == "y" || "$INSTALL_FFMPEG" == "Y" ]]; then
+            sudo apt install -y ffmpeg
+        else
+            echo "Continuing without FFmpeg..."
+        fi
     fi
-fi
 
-# Set up virtual environment if it doesn't exist
-if [ ! -d ".venv" ]; then
-    echo "Setting up virtual environment..."
-    python3 -m venv .venv
-    echo "Virtual environment created."
-fi
+    # Set up virtual environment if it doesn't exist
+    if [ ! -d ".venv" ]; then
+        echo "Setting up virtual environment..."
+        python3 -m venv .venv
+        echo "Virtual environment created."
+    fi
 
-# Activate virtual environment
-echo "Activating virtual environment..."
-source .venv/bin/activate
+    # Activate virtual environment
+    echo "Activating virtual environment..."
+    source .venv/bin/activate
+
+    # Install required packages if needed; one pip run reports both
+    echo "Checking dependencies..."
+    DEPENDENCIES=$(pip show PyQt5 yt-dlp 2> /dev/null | awk '/^Name:/ {name = $2} /^Version:/ {print name, $2}')
+    if [ "$(printf '%s\n' "$DEPENDENCIES" | grep -c .)" -lt 2 ]; then
+        echo "Installing required packages..."
+        pip install PyQt5 yt-dlp
+        echo "Dependencies installed."
+        DEPENDENCIES=$(pip show PyQt5 yt-dlp 2> /dev/null | awk '/^Name:/ {name = $2} /^Version:/ {print name, $2}')
+    else
+        echo "Dependencies already installed."
+    fi
 
-# Install required packages if needed
-echo "Checking dependencies..."
-if ! pip show PyQt5 &> /dev/null || ! pip show yt-dlp &> /dev/null; then
-    echo "Installing required packages..."
-    pip install PyQt5 yt-dlp
-    echo "Dependencies installed."
-else
-    echo "Dependencies already installed."
+    printf 'python %s\n%s\nvenv %s\n' "$PYTHON_VERSION" "$DEPENDENCIES" "$(venv_hash)" > "$STAMP"
 fi
 
 # Set environment variables for Xubuntu
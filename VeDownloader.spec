@@ -1,12 +1,30 @@
 # -*- mode: python ; coding: utf-8 -*-
+#
+# Build layouts, selected by options after "--" (build_exe.py passes them):
+#
+#   pyinstaller VeDownloader.spec                   onedir: dist/VeDownloader/ holds the
+#                                                   executable next to its libraries
+#   pyinstaller VeDownloader.spec -- --onefile      one executable that unpacks all of
+#                                                   the above into a temp directory on every start
+#
+# yt_dlp is collected as modules, so it ends up compiled in the PYZ archive
+# rather than as source files that have to be compiled on first import.
+import argparse
 
+from PyInstaller.utils.hooks import collect_submodules
+
+parser = argparse.ArgumentParser(prog="pyinstaller VeDownloader.spec --")
+parser.add_argument("--onefile", action="store_true", help="build one self-extracting executable")
+options = parser.parse_args()
 
 a = Analysis(
     ['advanced_gui.py'],
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=[],
+    # Extractors are imported by name when first used, and the engine when
+    # the window is up, so neither is found by following imports alone
+    hiddenimports=collect_submodules('yt_dlp') + ['engine'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -14,25 +32,54 @@ a = Analysis(
     noarchive=False,
     optimize=0,
 )
+
 pyz = PYZ(a.pure)
 
-exe = EXE(
-    pyz,
-    a.scripts,
-    a.binaries,
-    a.datas,
-    [],
-    name='VeDownloader',
-    debug=False,
-    bootloader_ignore_signals=False,
-    strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
-    console=False,
-    disable_windowed_traceback=False,
-    argv_emulation=False,
-    target_arch=None,
-    codesign_identity=None,
-    entitlements_file=None,
-)
+if options.onefile:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        a.binaries,
+        a.datas,
+        [],
+        name='VeDownloader',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        upx=True,
+        upx_exclude=[],
+        runtime_tmpdir=None,
+        console=False,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+    )
+else:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        [],
+        exclude_binaries=True,
+        name='VeDownloader',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        upx=True,
+        console=False,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+    )
+    coll = COLLECT(
+        exe,
+        a.binaries,
+        a.datas,
+        strip=False,
+        upx=True,
+        upx_exclude=[],
+        name='VeDownloader',
+    )
@@ -1,51 +1,30 @@
+import importlib
 import sys
 import os
-import yt_dlp
+import threading
+import time
+from collections import Counter, deque, OrderedDict
+from datetime import datetime
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLabel, QLineEdit, QFileDialog, QMessageBox,
-    QProgressBar, QComboBox, QTabWidget, QListWidget, QGroupBox,
-    QFormLayout, QSpinBox, QCheckBox, QStatusBar, QAction, QMenu,
-    QTextBrowser, QDialog
+    QProgressBar, QComboBox, QTabWidget, QListView, QGroupBox,
+    QFormLayout, QSpinBox, QDoubleSpinBox, QCheckBox, QStatusBar, QAction, QMenu,
+    QTextBrowser, QDialog, QTableWidget, QTableWidgetItem, QHeaderView,
+    QAbstractItemView
 )
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QSize
-from PyQt5.QtGui import QIcon, QFont, QPixmap
-
-class ProgressHook:
-    """Progress hook for yt-dlp to report download progress"""
-    def __init__(self, progress_signal, status_signal):
-        self.progress_signal = progress_signal
-        self.status_signal = status_signal
-
-    def __call__(self, d):
-        if d['status'] == 'downloading':
-            # Calculate download progress
-            downloaded_bytes = d.get('downloaded_bytes', 0)
-
-            # Try to get total bytes or estimated total bytes
-            if 'total_bytes' in d and d['total_bytes'] is not None and d['total_bytes'] > 0:
-                percent = int((downloaded_bytes / d['total_bytes']) * 100)
-                self.progress_signal.emit(percent)
-            elif 'total_bytes_estimate' in d and d['total_bytes_estimate'] is not None and d['total_bytes_estimate'] > 0:
-                percent = int((downloaded_bytes / d['total_bytes_estimate']) * 100)
-                self.progress_signal.emit(percent)
-            else:
-                # If we can't calculate percentage, just show indeterminate progress
-                self.status_signal.emit(f"Downloading... ({downloaded_bytes / 1024 / 1024:.2f} MB downloaded)")
-                # Send a progress update that's not 100% to show activity
-                self.progress_signal.emit(min(downloaded_bytes % 100, 95))
-
-            # Update status with download speed
-            if 'speed' in d and d['speed'] is not None:
-                speed = d['speed'] / 1024 / 1024  # Convert to MB/s
-                self.status_signal.emit(f"Downloading: {speed:.2f} MB/s")
-            else:
-                self.status_signal.emit("Downloading...")
-
-        elif d['status'] == 'finished':
-            self.status_signal.emit("Download finished, now processing...")
-        elif d['status'] == 'error':
-            self.status_signal.emit(f"Error: {d.get('error', 'Unknown error')}")
+from PyQt5.QtCore import Qt, QEvent, QObject, QThread, QTimer, QAbstractListModel, QModelIndex, pyqtSignal, QSize
+from PyQt5.QtGui import QColor, QIcon, QFont, QPixmap
+from history import HistoryStore
+from journal import JobJournal
+from playlist import PlaylistExpander
+from postprocess import get_postprocess_stage
+from politeness import HostScheduler, MAX_THROTTLE_RETRIES, host_key, is_throttled
+from archive import get_download_archive
+from autotune import ConcurrencyTuner
+from bandwidth import PRIORITY_WEIGHTS, get_bandwidth_limiter, parse_schedule
+from budget import get_connection_budget
+from info_cache import get_info_cache
 
 
 class DownloadThread(QThread):
@@ -53,234 +32,498 @@ class DownloadThread(QThread):
     progress_signal = pyqtSignal(int)
     status_signal = pyqtSignal(str)
     finished_signal = pyqtSignal(bool, str)
+    # The download is done and the job is queued for post-processing
+    downloaded_signal = pyqtSignal()
 
-    def __init__(self, url, output_dir, quality="best", format_option="mp4", subtitles=False):
+    def __init__(self, url, output_dir, quality="best", format_option="mp4", subtitles=False, archive=None,
+                 format_id=None, connections=1, fragments=1, playlist=False, priority="normal"):
         super().__init__()
-        self.url = url
-        self.output_dir = output_dir
-        self.quality = quality
-        self.format_option = format_option
-        self.subtitles = subtitles
-        self.is_cancelled = False
+        # yt-dlp is loaded with the engine, after the window is up
+        from engine import DownloadJob
+
+        self.job = DownloadJob(url, output_dir, quality, format_option, subtitles,
+                               on_progress=self.progress_signal.emit,
+                               on_status=self.status_signal.emit,
+                               archive=archive,
+                               info_cache=get_info_cache(),
+                               format_id=format_id,
+                               connections=connections,
+                               fragments=fragments,
+                               budget=get_connection_budget(),
+                               bandwidth=get_bandwidth_limiter().share(PRIORITY_WEIGHTS[priority]),
+                               expand_playlists=playlist,
+                               postprocess=get_postprocess_stage(),
+                               on_downloaded=self.downloaded_signal.emit)
+
+    @property
+    def is_cancelled(self):
+        return self.job.is_cancelled
+
+    def cancel(self):
+        """Ask the job to stop; the thread exits once yt-dlp has unwound"""
+        self.job.cancel()
+
+    @property
+    def extract_count(self):
+        return self.job.extract_count
 
     def run(self):
-        try:
-            if self.is_cancelled:
-                self.status_signal.emit("Download cancelled")
-                self.finished_signal.emit(False, "Download cancelled by user")
-                return
-
-            self.status_signal.emit("Starting download...")
-
-            # Map quality selection to yt-dlp format strings
-            format_string = self._get_format_string()
-
-            # Configure yt-dlp options
-            ydl_opts = {
-                'format': format_string,
-                'outtmpl': os.path.join(self.output_dir, '%(title)s.%(ext)s'),
-                'progress_hooks': [ProgressHook(self.progress_signal, self.status_signal)],
-                'quiet': True,
-                'no_warnings': True,
-                'noplaylist': True,  # Only download the video, not the playlist
-            }
-
-            # If audio only is selected, we can avoid needing FFmpeg
-            if self.quality == "audio only":
-                ydl_opts.update({
-                    'format': 'bestaudio/best',
-                    'postprocessor_args': ['-ar', '44100'],
-                    'prefer_ffmpeg': False,  # Try to avoid using FFmpeg if possible
-                    'extractaudio': True,    # Extract audio
-                    'nopostoverwrites': False,
-                    'keepvideo': False,
-                    # Avoid post-processing that requires FFmpeg
-                    'postprocessors': [{
-                        'key': 'FFmpegExtractAudio',
-                        'preferredcodec': 'mp3',
-                        'preferredquality': '192',
-                        'nopostoverwrites': False,
-                        'already_have_video': True  # Skip FFmpeg if possible
-                    }] if self.format_option.lower() in ['mp3', 'aac'] else []
-                })
-
-            # Add subtitle options if requested
-            if self.subtitles:
-                ydl_opts.update({
-                    'writesubtitles': True,
-                    'writeautomaticsub': True,
-                    'subtitleslangs': ['en'],
+        success, message = self.job.run()
+        self.finished_signal.emit(success, message)
+
+
+class DownloadManager(QObject):
+    """Queue of download jobs that runs up to max_concurrent threads at once
+
+    Jobs start in queue order, except that a job waits while its site is at
+    its per-host cap or backing off (see politeness.py) and later jobs for
+    other sites go first. Jobs turned away with 429/503 are queued again.
+
+    A job also gives up its slot when its download is done and it moves on
+    to the shared post-processing stage (see postprocess.py).
+
+    A playlist job gives up its slot once the playlist is extracted, and a
+    PlaylistExpander queues its entries as jobs of their own while they are
+    downloaded (see playlist.py).
+
+    With a journal, every job is recorded until it finishes, fails or is
+    cancelled by the user; jobs still queued or running when the application
+    exits stay in it and are picked up again by resume_unfinished().
+    """
+    job_added = pyqtSignal(int, str)
+    job_started = pyqtSignal(int)
+    job_progress = pyqtSignal(int, int)
+    job_status = pyqtSignal(int, str)
+    job_finished = pyqtSignal(int, bool, str, object)  # job id, success, message, JobRecord
+    queue_changed = pyqtSignal(int, int)  # running, pending
+    tuning_changed = pyqtSignal(str)  # description of an auto-tuning decision
+    # Emitted from expander threads
+    entry_found = pyqtSignal(int, str)  # playlist job id, entry URL
+    playlist_done = pyqtSignal(int)  # playlist job id
+
+    def __init__(self, max_concurrent=3, journal=None, parent=None):
+        super().__init__(parent)
+        self.max_concurrent = max_concurrent
+        # Connections per plain HTTP download and HLS/DASH fragments fetched
+        # at once, for jobs submitted from now on
+        self.connections = 1
+        self.fragments = 4
+        self.journal = journal
+        self.pending = deque()
+        self.running = {}
+        # Jobs past their download, waiting for or in post-processing
+        self.processing = {}
+        self.urls = {}
+        # Entries already active are not queued again when a playlist is resumed
+        self.active_urls = Counter()
+        self.expanders = {}
+        # Queued entry job id -> expander waiting for it to start
+        self.feeds = {}
+        # Queued job id -> .part file a resumed job continues from
+        self.part_paths = {}
+        self.entry_found.connect(self._on_entry)
+        self.playlist_done.connect(self._on_expanded)
+        self.journal_ids = {}
+        self.closing = False
+        # Set while auto-tuning; it then owns max_concurrent and the connection limit
+        self.tuner = None
+        self._tune_timer = QTimer(self)
+        self._tune_timer.timeout.connect(self._tune)
+        # Threads are kept referenced until Qt reports they have exited
+        self._threads = set()
+        self.hosts = HostScheduler()
+        self.job_args = {}
+        self.retries = {}
+        # Queued job id -> why it waits although a download slot is free
+        self.host_waits = {}
+        # Wakes the scheduler when a backing-off host becomes ready again
+        self._host_timer = QTimer(self)
+        self._host_timer.setSingleShot(True)
+        self._host_timer.timeout.connect(self._schedule)
+        self._next_id = 1
+
+    def submit(self, url, output_dir, quality="best", format_option="mp4", subtitles=False, archive=None,
+               journal_id=None, format_id=None, connections=None, fragments=None, playlist=False,
+               priority="normal", feed=None, part_path=None):
+        """Add a job to the queue and return its id
+
+        journal_id, format_id and part_path are given when resuming a
+        journalled job.
+        With playlist, a playlist or channel URL is expanded into a job for
+        each entry. priority is a key of PRIORITY_WEIGHTS and sets the job's
+        share of the bandwidth limit. feed is the PlaylistExpander of the
+        playlist the job is an entry of.
+        """
+        job_id = self._next_id
+        self._next_id += 1
+        self.urls[job_id] = url
+        self.active_urls[url] += 1
+        if feed is not None:
+            self.feeds[job_id] = feed
+        if part_path:
+            self.part_paths[job_id] = part_path
+        connections = connections or self.connections
+        fragments = fragments or self.fragments
+        if self.journal is not None:
+            if journal_id is None:
+                journal_id = self.journal.add(url, {
+                    "output_dir": output_dir, "quality": quality, "format": format_option,
+                    "subtitles": subtitles, "archive": archive is not None, "connections": connections,
+                    "fragments": fragments, "playlist": playlist, "priority": priority,
                 })
+            self.journal_ids[job_id] = journal_id
+        self.pending.append((job_id, (url, output_dir, quality, format_option, subtitles, archive, format_id,
+                                      connections, fragments, playlist, priority)))
+        self.job_added.emit(job_id, url)
+        self._schedule()
+        return job_id
+
+    def resume_unfinished(self):
+        """Queue the jobs a previous run left in the journal; returns how many"""
+        if self.journal is None:
+            return 0
+        entries = self.journal.unfinished()
+        for entry in entries:
+            options = entry["options"]
+            archive = get_download_archive() if options.get("archive") else None
+            self.submit(entry["url"], options["output_dir"], options["quality"], options["format"],
+                        options["subtitles"], archive, journal_id=entry["id"], format_id=entry["format_id"],
+                        connections=options.get("connections"), fragments=options.get("fragments"),
+                        playlist=options.get("playlist", False), priority=options.get("priority", "normal"),
+                        part_path=entry["part_path"])
+        return len(entries)
+
+    def set_max_concurrent(self, value):
+        """Set the number of concurrent jobs, or its upper bound while auto-tuning"""
+        if self.tuner is not None:
+            self.tuner.set_bounds(max_jobs=value)
+            value = self.tuner.jobs
+        self.max_concurrent = value
+        self._schedule()
+
+    def set_connection_limit(self, value):
+        """Set the shared connection limit, or its upper bound while auto-tuning"""
+        if self.tuner is not None:
+            self.tuner.set_bounds(max_connections=value)
+            value = self.tuner.connections
+        get_connection_budget().set_limit(value)
+
+    def set_autotune(self, enabled, max_jobs, max_connections):
+        """Switch auto-tuning on within the given bounds, or back to them as fixed values"""
+        self.tuner = ConcurrencyTuner(max_jobs, max_connections) if enabled else None
+        if enabled:
+            self._tune_timer.start(int(self.tuner.interval * 1000))
+            self.max_concurrent = self.tuner.jobs
+            get_connection_budget().set_limit(self.tuner.connections)
+        else:
+            self._tune_timer.stop()
+            self.max_concurrent = max_jobs
+            get_connection_budget().set_limit(max_connections)
+        self._schedule()
+
+    def set_connections(self, value):
+        self.connections = value
+
+    def set_max_per_host(self, value):
+        self.hosts.max_per_host = value
+        self._schedule()
+
+    def set_fragments(self, value):
+        self.fragments = value
+
+    def set_priority(self, job_id, priority):
+        """Change the bandwidth priority of a job; a playlist passes it on to entries queued later"""
+        if job_id in self.job_args:
+            self.job_args[job_id] = self.job_args[job_id][:-1] + (priority,)
+            thread = self.running.get(job_id)
+            if thread is not None:
+                thread.job.bandwidth.weight = PRIORITY_WEIGHTS[priority]
+            return
+        for index, (pending_id, args) in enumerate(self.pending):
+            if pending_id == job_id:
+                self.pending[index] = (job_id, args[:-1] + (priority,))
+                return
 
-            # Add format-specific options
-            if self.format_option.lower() != "auto":
-                if self.format_option.lower() == "mp4":
-                    ydl_opts.update({
-                        'merge_output_format': 'mp4',
-                        'postprocessor_args': ['-movflags', 'faststart'],
-                    })
-                elif self.format_option.lower() in ["mkv", "webm", "mp3", "aac"]:
-                    ydl_opts.update({
-                        'merge_output_format': self.format_option.lower(),
-                    })
-
-            # Download the video
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                try:
-                    self.status_signal.emit("Extracting video information...")
-                    info = ydl.extract_info(self.url, download=False)
-
-                    if self.is_cancelled:
-                        self.status_signal.emit("Download cancelled")
-                        self.finished_signal.emit(False, "Download cancelled by user")
-                        return
-
-                    if info:
-                        video_title = info.get('title', 'Video')
-                        self.status_signal.emit(f"Downloading: {video_title}")
-
-                        try:
-                            # Perform the actual download
-                            ydl.download([self.url])
-
-                            if self.is_cancelled:
-                                self.status_signal.emit("Download cancelled")
-                                self.finished_signal.emit(False, "Download cancelled by user")
-                                return
-
-                            # Final success message
-                            self.status_signal.emit("Download complete!")
-                            self.finished_signal.emit(True, f"Successfully downloaded: {video_title}")
-                        except yt_dlp.utils.DownloadError as e:
-                            error_msg = str(e)
-
-                            # Check for FFmpeg error and try alternative download method
-                            if "ffmpeg is not installed" in error_msg:
-                                self.status_signal.emit("FFmpeg not found. Trying alternative download method...")
-                                success = self._try_direct_download(info, video_title)
-                                if success:
-                                    return
-
-                                # If alternative method failed, show FFmpeg installation instructions
-                                ffmpeg_msg = (
-                                    "FFmpeg is required but not installed. Please install FFmpeg:\n\n"
-                                    "1. Download FFmpeg from https://www.gyan.dev/ffmpeg/builds/\n"
-                                    "2. Extract the zip file\n"
-                                    "3. Copy the ffmpeg.exe file from the bin folder\n"
-                                    "4. Paste it into your Python installation folder or add it to your system PATH"
-                                )
-                                self.finished_signal.emit(False, ffmpeg_msg)
-                            else:
-                                self.status_signal.emit(f"Download error: {error_msg}")
-                                self.finished_signal.emit(False, f"Download error: {error_msg}")
-                    else:
-                        self.status_signal.emit("Failed to get video information")
-                        self.finished_signal.emit(False, "Failed to get video information")
-                except yt_dlp.utils.DownloadError as e:
-                    error_msg = str(e)
-                    self.status_signal.emit(f"Download error: {error_msg}")
-
-                    # Check for FFmpeg error
-                    if "ffmpeg is not installed" in error_msg:
-                        ffmpeg_msg = (
-                            "FFmpeg is required but not installed. Please install FFmpeg:\n\n"
-                            "1. Download FFmpeg from https://www.gyan.dev/ffmpeg/builds/\n"
-                            "2. Extract the zip file\n"
-                            "3. Copy the ffmpeg.exe file from the bin folder\n"
-                            "4. Paste it into your Python installation folder or add it to your system PATH"
-                        )
-                        self.finished_signal.emit(False, ffmpeg_msg)
-                    else:
-                        self.finished_signal.emit(False, f"Download error: {error_msg}")
-
-        except Exception as e:
-            self.status_signal.emit(f"Error: {str(e)}")
-            self.finished_signal.emit(False, str(e))
-
-    def _try_direct_download(self, info, video_title):
-        """Try to download a single format that doesn't require merging with FFmpeg"""
-        try:
-            self.status_signal.emit("Trying direct download without FFmpeg...")
-
-            # Get available formats
-            formats = info.get('formats', [])
-            if not formats:
-                self.status_signal.emit("No suitable formats found for direct download")
-                return False
-
-            # Find a suitable format based on quality preference
-            target_format = None
-
-            # For audio only, find the best audio format
-            if self.quality == "audio only":
-                audio_formats = [f for f in formats if f.get('acodec') != 'none' and f.get('vcodec') == 'none']
-                if audio_formats:
-                    target_format = max(audio_formats, key=lambda x: x.get('abr', 0) or 0)
-            else:
-                # For video, try to find a format with both audio and video
-                complete_formats = [f for f in formats if f.get('acodec') != 'none' and f.get('vcodec') != 'none']
-
-                if complete_formats:
-                    # Filter by height if a specific quality was requested
-                    if self.quality == "1080p":
-                        filtered = [f for f in complete_formats if f.get('height', 0) <= 1080]
-                    elif self.quality == "720p":
-                        filtered = [f for f in complete_formats if f.get('height', 0) <= 720]
-                    elif self.quality == "480p":
-                        filtered = [f for f in complete_formats if f.get('height', 0) <= 480]
-                    elif self.quality == "360p":
-                        filtered = [f for f in complete_formats if f.get('height', 0) <= 360]
-                    else:
-                        filtered = complete_formats
-
-                    if filtered:
-                        # Get the best quality within our filter
-                        target_format = max(filtered, key=lambda x: x.get('height', 0) or 0)
-
-            if target_format:
-                format_id = target_format.get('format_id')
-                self.status_signal.emit(f"Found compatible format: {format_id}")
-
-                # Configure yt-dlp for direct download
-                ydl_opts = {
-                    'format': format_id,
-                    'outtmpl': os.path.join(self.output_dir, '%(title)s.%(ext)s'),
-                    'progress_hooks': [ProgressHook(self.progress_signal, self.status_signal)],
-                    'quiet': True,
-                    'no_warnings': True,
-                    'noplaylist': True,
-                }
-
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    ydl.download([self.url])
-
-                self.status_signal.emit("Download complete!")
-                self.finished_signal.emit(True, f"Successfully downloaded: {video_title}")
-                return True
-            else:
-                self.status_signal.emit("No compatible format found for direct download")
-                return False
-
-        except Exception as e:
-            self.status_signal.emit(f"Direct download failed: {str(e)}")
-            return False
-
-    def _get_format_string(self):
-        """Convert UI quality selection to yt-dlp format string"""
-        if self.quality == "best":
-            return "bestvideo+bestaudio/best"
-        elif self.quality == "1080p":
-            return "bestvideo[height<=1080]+bestaudio/best[height<=1080]"
-        elif self.quality == "720p":
-            return "bestvideo[height<=720]+bestaudio/best[height<=720]"
-        elif self.quality == "480p":
-            return "bestvideo[height<=480]+bestaudio/best[height<=480]"
-        elif self.quality == "360p":
-            return "bestvideo[height<=360]+bestaudio/best[height<=360]"
-        elif self.quality == "audio only":
-            return "bestaudio/best"
+    def is_active(self, job_id):
+        return (job_id in self.running or job_id in self.processing or job_id in self.expanders
+                or any(j == job_id for j, _ in self.pending))
+
+    def active_jobs(self):
+        return list(self.running) + list(self.processing) + list(self.expanders) + [j for j, _ in self.pending]
+
+    def stage_counts(self):
+        """Number of jobs in each stage of the pipeline"""
+        stage = get_postprocess_stage().stats()
+        return {
+            "queued": len(self.pending),
+            "downloading": len(self.running),
+            "processing": stage["active"],
+            "waiting": stage["waiting"],
+        }
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job"""
+        for entry in self.pending:
+            if entry[0] == job_id:
+                from engine import CANCELLED_MESSAGE
+
+                self.pending.remove(entry)
+                self._on_finished(job_id, False, CANCELLED_MESSAGE)
+                return
+        thread = self.running.get(job_id) or self.processing.get(job_id)
+        if thread is not None and not thread.is_cancelled:
+            # The job keeps its slot until its thread reports it has stopped
+            thread.cancel()
+            self.job_status.emit(job_id, "Cancelling...")
+        expander = self.expanders.get(job_id)
+        if expander is not None and not expander.cancelled:
+            # Entries already queued stay in the queue
+            expander.cancel()
+            self.job_status.emit(job_id, "Cancelling...")
+
+    def cancel_all(self):
+        for job_id in self.active_jobs():
+            self.cancel(job_id)
+
+    def shutdown(self, timeout=10000):
+        """Stop every job and wait up to timeout ms in all for their threads to exit
+
+        The jobs are kept in the journal so they resume on the next start.
+        """
+        self.closing = True
+        self._host_timer.stop()
+        self.cancel_all()
+        threads = list(self._threads)
+        # Every thread is told to stop before any is waited for, so they all
+        # wind down at once
+        for thread in threads:
+            if not thread.is_cancelled:
+                thread.cancel()
+        deadline = time.monotonic() + timeout / 1000
+        for thread in threads:
+            thread.wait(max(0, int((deadline - time.monotonic()) * 1000)))
+
+    def _schedule(self):
+        if self.closing:
+            # Nothing new starts once shutdown() has begun
+            return
+        while self.pending and len(self.running) < self.max_concurrent:
+            index, delay = self.hosts.pick([host_key(self.urls[j]) for j, _ in self.pending])
+            if index is None:
+                if delay is not None:
+                    self._host_timer.start(int(delay * 1000) + 10)
+                break
+            job_id, args = self.pending[index]
+            del self.pending[index]
+            self.hosts.try_start(host_key(self.urls[job_id]))
+            feed = self.feeds.pop(job_id, None)
+            if feed is not None:
+                feed.release()
+            self.job_args[job_id] = args
+            thread = DownloadThread(*args)
+            thread.progress_signal.connect(lambda value, j=job_id: self.job_progress.emit(j, value))
+            thread.status_signal.connect(lambda message, j=job_id: self.job_status.emit(j, message))
+            thread.finished_signal.connect(lambda success, message, j=job_id: self._on_finished(j, success, message))
+            thread.downloaded_signal.connect(lambda j=job_id: self._on_downloaded(j))
+            thread.finished.connect(lambda t=thread: self._threads.discard(t))
+            if self.tuner is not None:
+                # The tuner counts bytes under its own lock
+                thread.job.on_bytes = self.tuner.record
+            thread.job.part_path = self.part_paths.pop(job_id, None)
+            journal_id = self.journal_ids.get(job_id)
+            if journal_id is not None:
+                # Called from the job's thread; the journal has its own lock
+                thread.job.on_format = lambda format_id, j=journal_id: self.journal.set_format(j, format_id)
+                thread.job.on_file = lambda path, j=journal_id: self.journal.set_part_path(j, path)
+            self._threads.add(thread)
+            self.running[job_id] = thread
+            thread.start()
+            self.job_started.emit(job_id)
+        self._report_host_waits()
+        self.queue_changed.emit(len(self.running), len(self.pending))
+
+    def _report_host_waits(self):
+        """Give queued jobs held back by their site's limits, not max_concurrent, a status saying so"""
+        waits = {}
+        if len(self.running) < self.max_concurrent:
+            for job_id, _ in self.pending:
+                host = host_key(self.urls[job_id])
+                delay = self.hosts.wait_time(host)
+                if delay is None:
+                    waits[job_id] = (f"Waiting: {host} already has {self.hosts.max_per_host} downloads "
+                                     f"running (Maximum Downloads Per Site)")
+                elif delay > 0 and self.hosts.strikes.get(host):
+                    waits[job_id] = f"Waiting: {host} asked to slow down, retrying in {delay:.0f}s"
+        for job_id, reason in waits.items():
+            if self.host_waits.get(job_id) != reason:
+                self.job_status.emit(job_id, reason)
+        for job_id in self.host_waits.keys() - waits.keys():
+            if any(j == job_id for j, _ in self.pending):
+                self.job_status.emit(job_id, "Queued")
+        self.host_waits = waits
+
+    def _tune(self):
+        saturated = bool(self.pending) or len(self.running) >= self.max_concurrent
+        decision = self.tuner.update(saturated)
+        if decision:
+            self.max_concurrent = self.tuner.jobs
+            get_connection_budget().set_limit(self.tuner.connections)
+            self._schedule()
+        self.tuning_changed.emit(decision or "")
+
+    def _on_downloaded(self, job_id):
+        thread = self.running.pop(job_id, None)
+        if thread is None:
+            return
+        # The site is not contacted again and the slot goes to the next download
+        self.processing[job_id] = thread
+        self.hosts.finish(host_key(self.urls[job_id]))
+        self._schedule()
+
+    def _on_finished(self, job_id, success, message):
+        result = None
+        if job_id in self.processing:
+            result = self.processing.pop(job_id).job.result
+            self.job_args.pop(job_id)
+        elif job_id in self.running:
+            thread = self.running.pop(job_id)
+            result = thread.job.result
+            args = self.job_args.pop(job_id)
+            throttled = not success and not thread.is_cancelled and is_throttled(message)
+            delay = self.hosts.finish(host_key(self.urls[job_id]), throttled)
+            if success and thread.job.entries is not None:
+                self._expand(job_id, thread.job, args)
+                self._schedule()
+                return
+            if throttled and self.retries.get(job_id, 0) < MAX_THROTTLE_RETRIES:
+                # Back to the front of the queue; other sites keep going meanwhile
+                self.retries[job_id] = self.retries.get(job_id, 0) + 1
+                self.pending.appendleft((job_id, args))
+                self.job_status.emit(job_id, f"Rate limited by {host_key(self.urls[job_id])}, "
+                                             f"retrying in {delay:.0f}s")
+                self._schedule()
+                return
+        elif job_id not in self.urls:
+            return
+        feed = self.feeds.pop(job_id, None)
+        if feed is not None:
+            feed.release()
+        self._finish(job_id, success, message, result)
+
+    def _expand(self, job_id, job, args):
+        # Runs on its own thread, outside the download slots
+        expander = PlaylistExpander(job.entries, lambda url: self.entry_found.emit(job_id, url),
+                                    lambda _: self.playlist_done.emit(job_id), job.cancel_event)
+        self.expanders[job_id] = expander
+        # Entries are queued with the playlist's options
+        self.job_args[job_id] = args
+        expander.start()
+
+    def _on_entry(self, job_id, url):
+        expander = self.expanders.get(job_id)
+        if expander is None:
+            return
+        if url in self.active_urls:
+            # Already queued by the journal when a playlist is resumed
+            expander.release()
+            return
+        _, output_dir, quality, format_option, subtitles, archive, _, connections, fragments, playlist, priority = \
+            self.job_args[job_id]
+        self.submit(url, output_dir, quality, format_option, subtitles, archive, connections=connections,
+                    fragments=fragments, playlist=playlist, priority=priority, feed=expander)
+
+    def _on_expanded(self, job_id):
+        from engine import CANCELLED_MESSAGE
+
+        expander = self.expanders.pop(job_id)
+        self.job_args.pop(job_id, None)
+        if expander.cancelled:
+            success, message = False, CANCELLED_MESSAGE
+        elif expander.error:
+            success, message = False, f"Playlist stopped after {expander.count} entries: {expander.error}"
         else:
-            return "bestvideo+bestaudio/best"
+            success, message = True, f"Queued {expander.count} entries"
+        self._finish(job_id, success, message, None)
+
+    def _finish(self, job_id, success, message, result):
+        from engine import CANCELLED_MESSAGE
+
+        self.retries.pop(job_id, None)
+        self.part_paths.pop(job_id, None)
+        url = self.urls.pop(job_id, None)
+        self.active_urls[url] -= 1
+        if self.active_urls[url] <= 0:
+            del self.active_urls[url]
+        journal_id = self.journal_ids.pop(job_id, None)
+        if journal_id is not None and not (self.closing and message == CANCELLED_MESSAGE):
+            self.journal.remove(journal_id)
+        self.job_finished.emit(job_id, success, message, result)
+        self._schedule()
+
+
+class HistoryModel(QAbstractListModel):
+    """List model that reads the download history from the database a page at a time"""
+    PAGE_SIZE = 200
+    MAX_PAGES = 20
+
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.pages = OrderedDict()
+        self.total = store.count()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.total
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        entry = self.entry(index.row())
+        if entry is None:
+            return None
+        if role == Qt.DisplayRole:
+            completed = datetime.fromtimestamp(entry['completed_at']).strftime("%Y-%m-%d %H:%M")
+            title = entry['title'] or entry['url']
+            return f"{completed}  {title}"
+        if role == Qt.ToolTipRole:
+            lines = [entry['url']]
+            if entry['output_path']:
+                lines.append(entry['output_path'])
+            if entry['size']:
+                lines.append(f"{entry['size'] / 1024 / 1024:.2f} MB")
+            if entry['format']:
+                lines.append(f"Format: {entry['format']}")
+            return "\n".join(lines)
+        return None
+
+    def entry(self, row):
+        page_number, offset = divmod(row, self.PAGE_SIZE)
+        page = self.pages.get(page_number)
+        if page is None:
+            page = self.store.page(page_number * self.PAGE_SIZE, self.PAGE_SIZE)
+            self.pages[page_number] = page
+            # Only a few pages are kept in memory at once
+            while len(self.pages) > self.MAX_PAGES:
+                self.pages.popitem(last=False)
+        else:
+            self.pages.move_to_end(page_number)
+        return page[offset] if offset < len(page) else None
+
+    def add(self, url, result=None):
+        """Record a download and show it at the top of the list"""
+        self.store.add(url, result)
+        self.beginInsertRows(QModelIndex(), 0, 0)
+        # New entries shift every row down, so cached pages are stale
+        self.pages.clear()
+        self.total += 1
+        self.endInsertRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self.store.clear()
+        self.pages.clear()
+        self.total = 0
+        self.endResetModel()
 
 
 class HelpDialog(QDialog):
@@ -470,7 +713,29 @@ class AboutDialog(QDialog):
         layout.addWidget(self.close_button)
 
 
+class StartupProbe(QObject):
+    """Write the time.monotonic() of the window's first paint to a file and quit
+
+    Also writes whether yt-dlp had been imported by then. A file rather than
+    stdout, which windowed builds on Windows do not have.
+    """
+    def __init__(self, parent, path):
+        super().__init__(parent)
+        self.path = path
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint:
+            obj.removeEventFilter(self)
+            with open(self.path, "w", encoding="utf-8") as probe_file:
+                probe_file.write(f"first_paint {time.monotonic():.6f} yt_dlp_loaded={'yt_dlp' in sys.modules}\n")
+            QTimer.singleShot(0, QApplication.quit)
+        return False
+
+
 class MainWindow(QMainWindow):
+    # Emitted from the thread that loads the engine once it has
+    engine_loaded = pyqtSignal()
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("VeDownloader")
@@ -479,6 +744,19 @@ class MainWindow(QMainWindow):
         # Create menu bar
         self.setup_menu()
 
+        # Download queue shared by all jobs started from the Download tab,
+        # journalled so unfinished jobs survive a restart
+        self.download_manager = DownloadManager(journal=JobJournal(), parent=self)
+        self.download_manager.job_added.connect(self.add_job_row)
+        self.download_manager.job_started.connect(self.job_started)
+        self.download_manager.job_progress.connect(self.update_job_progress)
+        self.download_manager.job_status.connect(self.update_job_status)
+        self.download_manager.job_finished.connect(self.download_finished)
+        self.download_manager.queue_changed.connect(self.update_queue_status)
+        self.download_manager.tuning_changed.connect(self.update_tuning_status)
+        self.job_rows = {}
+        self.job_progress = {}
+
         # Create central widget with tabs
         self.central_widget = QWidget()
         self.setCentralWidget(self.central_widget)
@@ -497,23 +775,66 @@ class MainWindow(QMainWindow):
         self.tabs.addTab(self.history_tab, "History")
         self.tabs.addTab(self.settings_tab, "Settings")
 
-        # Set up each tab
+        # Only the Download tab is set up before the window appears; the
+        # others are set up the first time they are shown
         self.setup_download_tab()
-        self.setup_history_tab()
-        self.setup_settings_tab()
+        self.history_store = HistoryStore()
+        self.history_model = None
+        self.tab_builders = {self.history_tab: self.setup_history_tab, self.settings_tab: self.setup_settings_tab}
+        self.tabs.currentChanged.connect(self.build_tab)
 
         # Create status bar
         self.statusBar = QStatusBar()
         self.setStatusBar(self.statusBar)
         self.statusBar.showMessage("Ready")
+        self.tuning_label = QLabel()
+        self.statusBar.addPermanentWidget(self.tuning_label)
+        # Depth of each pipeline stage; jobs move between the post-processing
+        # queue and its workers without a signal, so it is polled
+        self.stages_label = QLabel()
+        self.statusBar.addPermanentWidget(self.stages_label)
+        self._stages_timer = QTimer(self)
+        self._stages_timer.timeout.connect(self.update_stages_status)
+        self._stages_timer.start(500)
 
-        # Initialize download history
-        self.download_history = []
 
         # Set default output directory
         downloads_dir = os.path.join(os.path.expanduser("~"), "Downloads")
         self.dir_input.setText(downloads_dir)
 
+        # yt-dlp is loaded off the GUI thread once the window has been
+        # painted, and interrupted downloads are picked up when it has
+        self.painted = False
+        self.engine_loaded.connect(self.resume_downloads)
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.painted:
+            self.painted = True
+            QTimer.singleShot(0, self.start_background_work)
+
+    def start_background_work(self):
+        threading.Thread(target=self.load_engine, daemon=True).start()
+
+    def load_engine(self):
+        """Import the engine and yt-dlp; runs on its own thread"""
+        importlib.import_module("engine")
+        self.engine_loaded.emit()
+
+    def resume_downloads(self):
+        # Pick up downloads interrupted by the last exit or crash. Queuing a
+        # job creates its DownloadJob, so this waits for the engine to load
+        # rather than importing it on the GUI thread
+        resumed = self.download_manager.resume_unfinished()
+        if resumed:
+            self.statusBar.showMessage(f"Resuming {resumed} unfinished download(s)")
+
+    def build_tab(self, index):
+        """Set up a tab the first time it is shown"""
+        builder = self.tab_builders.pop(self.tabs.widget(index), None)
+        if builder is not None:
+            builder()
+
     def setup_menu(self):
         """Set up the application menu bar"""
         menubar = self.menuBar()
@@ -585,11 +906,22 @@ class MainWindow(QMainWindow):
         self.format_combo.addItems(["Auto", "MP4", "MKV", "WebM", "MP3", "AAC"])
         options_layout.addRow("Format:", self.format_combo)
 
+        # Share of the bandwidth limit
+        self.priority_combo = QComboBox()
+        self.priority_combo.addItems([name.capitalize() for name in PRIORITY_WEIGHTS])
+        self.priority_combo.setCurrentText("Normal")
+        options_layout.addRow("Priority:", self.priority_combo)
+
         # Additional options
         self.subtitle_check = QCheckBox("Download subtitles if available")
         self.subtitle_check.setChecked(True)
         options_layout.addRow("", self.subtitle_check)
 
+        self.playlist_check = QCheckBox("Download whole playlists and channels")
+        self.playlist_check.setChecked(True)
+        self.playlist_check.setToolTip("Otherwise only the video of a URL that names both is downloaded")
+        options_layout.addRow("", self.playlist_check)
+
         options_group.setLayout(options_layout)
         layout.addWidget(options_group)
 
@@ -597,6 +929,18 @@ class MainWindow(QMainWindow):
         progress_group = QGroupBox("Download Progress")
         progress_layout = QVBoxLayout()
 
+        self.queue_table = QTableWidget(0, 3)
+        self.queue_table.setHorizontalHeaderLabels(["URL", "Status", "Progress"])
+        self.queue_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.queue_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        self.queue_table.verticalHeader().setVisible(False)
+        self.queue_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.queue_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.queue_table.itemSelectionChanged.connect(self.update_cancel_button)
+        self.queue_table.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.queue_table.customContextMenuRequested.connect(self.show_queue_menu)
+        progress_layout.addWidget(self.queue_table)
+
         self.progress_bar = QProgressBar()
         self.progress_bar.setValue(0)
         progress_layout.addWidget(self.progress_bar)
@@ -624,12 +968,21 @@ class MainWindow(QMainWindow):
         self.cancel_button.setMinimumHeight(40)
         button_layout.addWidget(self.cancel_button)
 
+        self.clear_finished_button = QPushButton("Clear Finished")
+        self.clear_finished_button.clicked.connect(self.clear_finished_jobs)
+        self.clear_finished_button.setMinimumHeight(40)
+        button_layout.addWidget(self.clear_finished_button)
+
         layout.addLayout(button_layout)
 
     def setup_history_tab(self):
         layout = QVBoxLayout(self.history_tab)
 
-        self.history_list = QListWidget()
+        # Download history is kept in a database and read lazily by the model
+        self.history_model = HistoryModel(self.history_store, self)
+        self.history_list = QListView()
+        self.history_list.setModel(self.history_model)
+        self.history_list.setUniformItemSizes(True)
         layout.addWidget(self.history_list)
 
         button_layout = QHBoxLayout()
@@ -657,9 +1010,71 @@ class MainWindow(QMainWindow):
 
         self.max_downloads = QSpinBox()
         self.max_downloads.setRange(1, 10)
-        self.max_downloads.setValue(3)
+        self.max_downloads.setValue(self.download_manager.max_concurrent)
+        self.max_downloads.setToolTip("Downloads that may run at once; downloads from one site are also "
+                                      "limited by Maximum Downloads Per Site")
+        self.max_downloads.valueChanged.connect(self.download_manager.set_max_concurrent)
         general_layout.addRow("Maximum Concurrent Downloads:", self.max_downloads)
 
+        self.per_host_spin = QSpinBox()
+        self.per_host_spin.setRange(1, 10)
+        self.per_host_spin.setValue(self.download_manager.hosts.max_per_host)
+        self.per_host_spin.setToolTip("Downloads from the same site that may run at once")
+        self.per_host_spin.valueChanged.connect(self.download_manager.set_max_per_host)
+        general_layout.addRow("Maximum Downloads Per Site:", self.per_host_spin)
+
+        self.connections_spin = QSpinBox()
+        self.connections_spin.setRange(1, 16)
+        self.connections_spin.setValue(self.download_manager.connections)
+        self.connections_spin.setToolTip("Fetch large files over several connections at once")
+        self.connections_spin.valueChanged.connect(self.download_manager.set_connections)
+        general_layout.addRow("Connections Per Download:", self.connections_spin)
+
+        self.fragments_spin = QSpinBox()
+        self.fragments_spin.setRange(1, 16)
+        self.fragments_spin.setValue(self.download_manager.fragments)
+        self.fragments_spin.setToolTip("Fragments of HLS/DASH streams fetched at once")
+        self.fragments_spin.valueChanged.connect(self.download_manager.set_fragments)
+        general_layout.addRow("Fragments Per Download:", self.fragments_spin)
+
+        self.connection_limit_spin = QSpinBox()
+        self.connection_limit_spin.setRange(1, 64)
+        self.connection_limit_spin.setValue(get_connection_budget().limit)
+        self.connection_limit_spin.setToolTip("Connections shared by all running downloads")
+        self.connection_limit_spin.valueChanged.connect(self.download_manager.set_connection_limit)
+        general_layout.addRow("Total Connection Limit:", self.connection_limit_spin)
+
+        self.autotune_check = QCheckBox()
+        self.autotune_check.setToolTip("Adjust concurrent downloads and connections to the measured\n"
+                                       "throughput, up to the limits above")
+        self.autotune_check.toggled.connect(self.toggle_autotune)
+        general_layout.addRow("Auto-tune Concurrency:", self.autotune_check)
+
+        self.postprocess_spin = QSpinBox()
+        self.postprocess_spin.setRange(1, 64)
+        self.postprocess_spin.setValue(get_postprocess_stage().workers)
+        self.postprocess_spin.setToolTip("Finished downloads merged or converted by FFmpeg at once\n"
+                                         "(default: one per CPU core)")
+        self.postprocess_spin.valueChanged.connect(get_postprocess_stage().set_workers)
+        general_layout.addRow("Post-processing Workers:", self.postprocess_spin)
+
+        self.bandwidth_spin = QDoubleSpinBox()
+        self.bandwidth_spin.setRange(0, 1000)
+        self.bandwidth_spin.setDecimals(1)
+        self.bandwidth_spin.setSuffix(" MB/s")
+        self.bandwidth_spin.setSpecialValueText("Unlimited")
+        self.bandwidth_spin.setToolTip("Download rate shared by all running downloads")
+        self.bandwidth_spin.valueChanged.connect(
+            lambda value: get_bandwidth_limiter().set_rate(int(value * 1024 * 1024)))
+        general_layout.addRow("Bandwidth Limit:", self.bandwidth_spin)
+
+        self.bandwidth_schedule_input = QLineEdit()
+        self.bandwidth_schedule_input.setPlaceholderText("e.g. 09:00-17:00=5M, 22:00-07:00=0")
+        self.bandwidth_schedule_input.setToolTip("Limits for times of day, overriding the one above;\n"
+                                                 "0 means unlimited")
+        self.bandwidth_schedule_input.editingFinished.connect(self.update_bandwidth_schedule)
+        general_layout.addRow("Bandwidth Schedule:", self.bandwidth_schedule_input)
+
         general_group.setLayout(general_layout)
         layout.addWidget(general_group)
 
@@ -674,6 +1089,10 @@ class MainWindow(QMainWindow):
         self.dark_mode_check = QCheckBox()
         advanced_layout.addRow("Dark Mode:", self.dark_mode_check)
 
+        self.skip_archived_check = QCheckBox()
+        self.skip_archived_check.setChecked(True)
+        advanced_layout.addRow("Skip Already Downloaded Videos:", self.skip_archived_check)
+
         advanced_group.setLayout(advanced_layout)
         layout.addWidget(advanced_group)
 
@@ -702,6 +1121,8 @@ class MainWindow(QMainWindow):
         quality = self.quality_combo.currentText().lower()
         format_option = self.format_combo.currentText().lower()
         subtitles = self.subtitle_check.isChecked()
+        priority = self.priority_combo.currentText().lower()
+        playlist = self.playlist_check.isChecked()
 
         if not url:
             QMessageBox.warning(self, "Warning", "Please enter a URL")
@@ -714,30 +1135,119 @@ class MainWindow(QMainWindow):
                 QMessageBox.critical(self, "Error", f"Could not create output directory: {str(e)}")
                 return
 
-        # Disable download button and enable cancel button
-        self.download_button.setEnabled(False)
-        self.cancel_button.setEnabled(True)
+        # Queue the job; it starts as soon as a download slot is free
+        # Skipping is on until the Settings tab is built and says otherwise
+        skip_archived = self.settings_tab in self.tab_builders or self.skip_archived_check.isChecked()
+        archive = get_download_archive() if skip_archived else None
+        self.download_manager.submit(url, output_dir, quality, format_option, subtitles, archive,
+                                     playlist=playlist, priority=priority)
+        self.url_input.clear()
 
-        # Reset progress bar
-        self.progress_bar.setValue(0)
+    def cancel_download(self):
+        """Cancel the selected jobs, or every active job if none is selected"""
+        rows = {index.row() for index in self.queue_table.selectionModel().selectedRows()}
+        job_ids = [job_id for job_id, row in self.job_rows.items() if row in rows]
+        if not job_ids:
+            job_ids = self.download_manager.active_jobs()
+        for job_id in job_ids:
+            self.download_manager.cancel(job_id)
+        self.update_cancel_button()
+
+    def show_queue_menu(self, position):
+        """Context menu to change the priority of the selected jobs"""
+        rows = {index.row() for index in self.queue_table.selectionModel().selectedRows()}
+        job_ids = [job_id for job_id, row in self.job_rows.items()
+                   if row in rows and self.download_manager.is_active(job_id)]
+        if not job_ids:
+            return
+        menu = QMenu(self)
+        priority_menu = menu.addMenu("Priority")
+        for name in PRIORITY_WEIGHTS:
+            action = priority_menu.addAction(name.capitalize())
+            action.triggered.connect(lambda checked, p=name: self.set_jobs_priority(job_ids, p))
+        menu.exec_(self.queue_table.viewport().mapToGlobal(position))
+
+    def set_jobs_priority(self, job_ids, priority):
+        for job_id in job_ids:
+            self.download_manager.set_priority(job_id, priority)
+
+    def add_job_row(self, job_id, url):
+        row = self.queue_table.rowCount()
+        self.queue_table.insertRow(row)
+        self.queue_table.setItem(row, 0, QTableWidgetItem(url))
+        self.queue_table.setItem(row, 1, QTableWidgetItem("Queued"))
+        progress = QProgressBar()
+        progress.setValue(0)
+        self.queue_table.setCellWidget(row, 2, progress)
+        self.job_rows[job_id] = row
+        self.job_progress[job_id] = 0
+
+    def job_started(self, job_id):
+        self.update_job_status(job_id, "Starting download...")
+
+    def update_job_progress(self, job_id, value):
+        row = self.job_rows.get(job_id)
+        if row is not None:
+            self.queue_table.cellWidget(row, 2).setValue(value)
+        if job_id in self.job_progress:
+            self.job_progress[job_id] = value
+            self.update_progress(sum(self.job_progress.values()) // len(self.job_progress))
+
+    def update_job_status(self, job_id, message):
+        row = self.job_rows.get(job_id)
+        if row is not None:
+            self.queue_table.item(row, 1).setText(message)
+        self.update_status(message)
+
+    def update_queue_status(self, running, pending):
+        self.update_cancel_button()
+        if running or pending:
+            waiting = len(self.download_manager.host_waits)
+            self.statusBar.showMessage(f"{running} downloading, {pending} queued"
+                                       + (f", {waiting} waiting on per-site limits" if waiting else ""))
+
+    def update_stages_status(self):
+        counts = self.download_manager.stage_counts()
+        if not any(counts.values()):
+            self.stages_label.clear()
+            return
+        self.stages_label.setText(f"Queued {counts['queued']} | Downloading {counts['downloading']} | "
+                                  f"Post-processing {counts['processing']} (+{counts['waiting']} waiting)")
 
-        # Create and start download thread
-        self.download_thread = DownloadThread(url, output_dir, quality, format_option, subtitles)
-        self.download_thread.progress_signal.connect(self.update_progress)
-        self.download_thread.status_signal.connect(self.update_status)
-        self.download_thread.finished_signal.connect(self.download_finished)
-        self.download_thread.start()
+    def toggle_autotune(self, enabled):
+        self.download_manager.set_autotune(enabled, self.max_downloads.value(), self.connection_limit_spin.value())
+        self.update_tuning_status("")
 
-    def cancel_download(self):
-        if hasattr(self, 'download_thread') and self.download_thread.isRunning():
-            # Set the cancellation flag
-            self.download_thread.is_cancelled = True
-            # Terminate the thread (this is not ideal but works for our demo)
-            self.download_thread.terminate()
-            self.update_status("Download cancelled")
-            self.download_button.setEnabled(True)
-            self.cancel_button.setEnabled(False)
-            self.progress_bar.setValue(0)
+    def update_bandwidth_schedule(self):
+        try:
+            schedule = parse_schedule(self.bandwidth_schedule_input.text())
+        except ValueError as e:
+            QMessageBox.warning(self, "Bandwidth Schedule", str(e))
+            return
+        get_bandwidth_limiter().set_schedule(schedule)
+
+    def update_tuning_status(self, decision):
+        tuner = self.download_manager.tuner
+        if tuner is None:
+            self.tuning_label.clear()
+            return
+        self.tuning_label.setText(f"Auto: {tuner.jobs} jobs, {tuner.connections} connections, "
+                                  f"{tuner.throughput / 1024 / 1024:.1f} MB/s")
+        if decision:
+            self.statusBar.showMessage(f"Auto-tune: {decision}", 5000)
+
+    def update_cancel_button(self):
+        self.cancel_button.setEnabled(bool(self.download_manager.active_jobs()))
+
+    def clear_finished_jobs(self):
+        """Remove finished jobs from the queue table"""
+        for job_id, row in sorted(self.job_rows.items(), key=lambda item: item[1], reverse=True):
+            if not self.download_manager.is_active(job_id):
+                self.queue_table.removeRow(row)
+                del self.job_rows[job_id]
+        # Rows shift up after removal, so rebuild the job id to row mapping
+        for index, job_id in enumerate(sorted(self.job_rows, key=self.job_rows.get)):
+            self.job_rows[job_id] = index
 
     def update_progress(self, value):
         self.progress_bar.setValue(value)
@@ -746,23 +1256,44 @@ class MainWindow(QMainWindow):
         self.status_label.setText(message)
         self.statusBar.showMessage(message)
 
-    def download_finished(self, success, message):
-        self.download_button.setEnabled(True)
-        self.cancel_button.setEnabled(False)
+    def download_finished(self, job_id, success, message, result):
+        from engine import CANCELLED_MESSAGE
 
+        url = self.queue_table.item(self.job_rows[job_id], 0).text() if job_id in self.job_rows else ""
+        self.update_job_status(job_id, message)
         if success:
-            QMessageBox.information(self, "Success", message)
+            self.update_job_progress(job_id, 100)
+        self.job_progress.pop(job_id, None)
+        if not self.job_progress:
+            self.progress_bar.setValue(0)
 
-            # Add to history
-            url = self.url_input.text()
-            self.download_history.append(url)
-            self.history_list.addItem(url)
-        else:
-            QMessageBox.critical(self, "Error", f"Download failed: {message}")
+        if success:
+            # Add to history (jobs skipped through the archive have no result)
+            if result is not None:
+                if self.history_model is not None:
+                    self.history_model.add(url, result)
+                else:
+                    self.history_store.add(url, result)
+        elif message != CANCELLED_MESSAGE:
+            # Many jobs can fail at once (a playlist of a site that is down),
+            # so failures are shown in their rows rather than a dialog each
+            row = self.job_rows.get(job_id)
+            if row is None:
+                QMessageBox.critical(self, "Error", f"Download failed: {message}")
+                return
+            summary = message.splitlines()[0]
+            item = self.queue_table.item(row, 1)
+            item.setText(f"Failed: {summary}")
+            item.setToolTip(message)
+            item.setForeground(QColor(Qt.red))
+            self.statusBar.showMessage(f"Download failed: {summary} (hover over its status for details)")
 
     def clear_history(self):
-        self.download_history.clear()
-        self.history_list.clear()
+        self.history_model.clear()
+
+    def closeEvent(self, event):
+        self.download_manager.shutdown()
+        super().closeEvent(event)
 
     def save_settings(self):
         # In a real application, you would save these settings to a config file
@@ -776,6 +1307,9 @@ if __name__ == "__main__":
     app.setStyle("Fusion")
 
     window = MainWindow()
+    if os.environ.get("VEDOWNLOADER_STARTUP_PROBE"):
+        # Used by startup_benchmark.py: report the first paint and quit
+        window.installEventFilter(StartupProbe(window, os.environ["VEDOWNLOADER_STARTUP_PROBE"]))
     window.show()
 
     sys.exit(app.exec_())
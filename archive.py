@@ -0,0 +1,94 @@
+"""Download archive shared by all jobs
+
+The archive uses yt-dlp's download_archive format: one "<extractor> <video id>"
+line per downloaded video. A DownloadArchive is passed to yt-dlp as the
+download_archive option, so yt-dlp records finished downloads in it, and jobs
+check it before extraction to skip videos that were already downloaded.
+"""
+import os
+import threading
+from functools import lru_cache
+
+from paths import DATA_DIR
+
+ARCHIVE_PATH = os.path.join(DATA_DIR, "archive.txt")
+
+
+def make_archive_id(extractor, video_id):
+    """Normalized archive key, the same as yt-dlp's make_archive_id"""
+    return f"{extractor.lower()} {video_id}"
+
+
+@lru_cache(maxsize=4096)
+def archive_id_for_url(url):
+    """Work out the archive id of a URL from the extractor URL patterns alone
+
+    Returns None when no specific extractor recognises the URL or its pattern
+    has no id group; the URL then has to be extracted to know its id.
+    A playlist entry that names its extractor is only tested against that one.
+    """
+    from extractor_index import get_extractor_index
+    from playlist import split_entry_url
+
+    url, ie_key = split_entry_url(url)
+    ies = get_extractor_index().candidates(url)
+    if ie_key:
+        ies = [ie for ie in ies if ie.ie_key() == ie_key]
+    for ie in ies:
+        if ie.ie_key() == "Generic" or not ie.suitable(url):
+            continue
+        video_id = ie.get_temp_id(url)
+        return make_archive_id(ie.ie_key(), video_id) if video_id else None
+    return None
+
+
+class DownloadArchive:
+    """Thread-safe set of archive ids backed by an append-only file
+
+    Implements the set interface yt-dlp expects from download_archive
+    (in, add and truthiness).
+    """
+    def __init__(self, path=ARCHIVE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.ids = set()
+        try:
+            with open(path, encoding="utf-8") as archive_file:
+                self.ids.update(line.strip() for line in archive_file if line.strip())
+        except FileNotFoundError:
+            pass
+
+    def __contains__(self, archive_id):
+        return archive_id in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, archive_id):
+        with self.lock:
+            if archive_id in self.ids:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as archive_file:
+                archive_file.write(archive_id + "\n")
+            self.ids.add(archive_id)
+
+    def match_url(self, url):
+        """Return the archive id of url if it is already archived, without network access"""
+        if not self.ids:
+            return None
+        archive_id = archive_id_for_url(url)
+        return archive_id if archive_id in self.ids else None
+
+
+_shared_archive = None
+_shared_lock = threading.Lock()
+
+
+def get_download_archive():
+    """Archive shared by every job in this process"""
+    global _shared_archive
+    with _shared_lock:
+        if _shared_archive is None:
+            _shared_archive = DownloadArchive()
+        return _shared_archive
@@ -0,0 +1,146 @@
+"""Adaptive tuning of download concurrency from measured throughput
+
+A ConcurrencyTuner adjusts two settings within user-set bounds: the number of
+jobs running at once and the connection budget shared by their fragments and
+segments (see budget.py). Jobs report the bytes they receive with record(),
+and the scheduler calls update() at a fixed interval.
+
+The tuning is additive-increase/multiplicative-decrease. After a few steady
+intervals the tuner probes one more job or connection, alternating between the
+two, or both at once when probing either alone did not help. A probe that
+raises throughput by GAIN or more is kept and followed by another; one that
+does not is undone. When throughput falls by DROP or more, as it does when
+hosts start throttling or the disk falls behind, both settings are cut by
+DECREASE_FACTOR.
+"""
+import threading
+import time
+from collections import deque
+
+GAIN = 0.05
+DROP = 0.15
+DECREASE_FACTOR = 0.75
+
+# Steady intervals before the next probe
+PROBE_AFTER = 3
+
+
+def _format_rate(rate):
+    return f"{rate / 1024 / 1024:.1f} MB/s"
+
+
+class ConcurrencyTuner:
+    """AIMD tuner for the number of running jobs and shared connections"""
+    def __init__(self, max_jobs=10, max_connections=16, min_jobs=1, min_connections=1, interval=5.0):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.min_jobs, self.max_jobs = min_jobs, max_jobs
+        self.min_connections, self.max_connections = min_connections, max_connections
+        # Start halfway and let the probes find the rest
+        self.jobs = max(min_jobs, max_jobs // 2)
+        self.connections = max(min_connections, max_connections // 2)
+        self.throughput = 0.0
+        self.decisions = deque(maxlen=20)
+        self._bytes = 0
+        self._last_time = None
+        self._last_rate = None
+        self._probe = ()  # the settings raised by the last probe
+        self._next_probe = "jobs"
+        self._failed = set()  # settings whose last probe did not help
+        self._steady = PROBE_AFTER
+
+    def record(self, nbytes):
+        """Count bytes received by any job; safe to call from any thread"""
+        with self.lock:
+            self._bytes += nbytes
+
+    def set_bounds(self, max_jobs=None, max_connections=None):
+        with self.lock:
+            if max_jobs is not None:
+                self.max_jobs = max(self.min_jobs, max_jobs)
+                self.jobs = min(self.jobs, self.max_jobs)
+            if max_connections is not None:
+                self.max_connections = max(self.min_connections, max_connections)
+                self.connections = min(self.connections, self.max_connections)
+
+    def update(self, saturated=True, now=None):
+        """Measure the last interval and adjust the settings
+
+        saturated says whether there was enough work to use every job slot;
+        without it a lower throughput means nothing. Returns a description of
+        the change, or None when the settings are unchanged.
+        """
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            nbytes, self._bytes = self._bytes, 0
+            if self._last_time is None or now <= self._last_time:
+                self._last_time = now
+                return None
+            rate = nbytes / (now - self._last_time)
+            self._last_time = now
+            previous, self._last_rate = self._last_rate, rate
+            self.throughput = rate
+
+            if not saturated or previous is None:
+                self._probe = ()
+                return None
+            if rate < previous * (1 - DROP):
+                self._probe = ()
+                self._steady = 0
+                jobs, connections = self.jobs, self.connections
+                self.jobs = max(self.min_jobs, int(self.jobs * DECREASE_FACTOR))
+                self.connections = max(self.min_connections, int(self.connections * DECREASE_FACTOR))
+                if (jobs, connections) == (self.jobs, self.connections):
+                    return None
+                return self._decide(f"throughput fell from {_format_rate(previous)} to {_format_rate(rate)}")
+            if self._probe:
+                settings, self._probe = self._probe, ()
+                if rate >= previous * (1 + GAIN):
+                    self._failed.clear()
+                    return self._raise(settings, f"throughput rose to {_format_rate(rate)}")
+                for name in settings:
+                    setattr(self, name, getattr(self, name) - 1)
+                self._failed.update(settings)
+                self._steady = 0
+                return self._decide(f"no gain from one more {' and '.join(name[:-1] for name in settings)}")
+            self._steady += 1
+            if self._steady < PROBE_AFTER:
+                return None
+            self._steady = 0
+            if self._failed == {"jobs", "connections"}:
+                self._failed.clear()
+                return self._raise(("jobs", "connections"), "probing")
+            return self._raise((self._next_probe,), "probing")
+
+    def _raise(self, settings, reason):
+        # Raise the given settings that are below their bound; a single one
+        # at its bound is swapped for the other
+        if len(settings) == 1 and self._at_bound(settings[0]):
+            settings = ("connections" if settings[0] == "jobs" else "jobs",)
+        settings = tuple(name for name in settings if not self._at_bound(name))
+        if not settings:
+            return None
+        for name in settings:
+            setattr(self, name, getattr(self, name) + 1)
+        self._probe = settings
+        self._next_probe = "connections" if settings[-1] == "jobs" else "jobs"
+        return self._decide(reason)
+
+    def _at_bound(self, name):
+        return getattr(self, name) >= getattr(self, "max_" + name)
+
+    def _decide(self, reason):
+        message = f"{reason}: {self.jobs} jobs, {self.connections} connections"
+        self.decisions.append((time.time(), message))
+        return message
+
+    def stats(self):
+        with self.lock:
+            return {
+                "jobs": self.jobs,
+                "connections": self.connections,
+                "max_jobs": self.max_jobs,
+                "max_connections": self.max_connections,
+                "throughput": round(self.throughput),
+                "decisions": [{"time": at, "message": message} for at, message in self.decisions],
+            }
@@ -0,0 +1,160 @@
+"""Bandwidth limit shared by every job in the process
+
+A BandwidthLimiter is a token bucket for the whole process. Each job
+takes a BandwidthShare with a priority weight. While several jobs are
+receiving data, each one gets the part of the rate that its weight is of
+the total, so a job with weight 2 downloads twice as fast as one with
+weight 1. Jobs pay for the bytes they have read and sleep until their bucket
+is back in credit, which slows the sender through TCP flow control.
+
+The rate can change at any time and can follow a daily schedule, e.g.
+"09:00-17:00=5M" to hold downloads to 5 MB/s during working hours and leave
+them unlimited the rest of the day.
+"""
+import re
+import threading
+import time
+
+# Seconds of traffic a job may send in one burst
+BURST_SECONDS = 0.5
+
+# Longest single sleep of a job waiting for its bucket
+MAX_SLEEP = 0.25
+
+# A job that has not received anything for this long no longer takes a share
+IDLE_SECONDS = 2.0
+
+_UNITS = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+
+# Weights of the named job priorities
+PRIORITY_WEIGHTS = {"low": 0.5, "normal": 1.0, "high": 2.0}
+
+
+def parse_rate(text):
+    """Bytes per second from "500K", "5M", "1.5G" or a plain number; 0 is unlimited"""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([kmg]?)(?:i?b(?:/s)?)?\s*", text, re.IGNORECASE)
+    if not match:
+        raise ValueError(f"invalid rate: {text!r}")
+    return int(float(match.group(1)) * _UNITS[match.group(2).lower()])
+
+
+def parse_schedule(text):
+    """Parse "HH:MM-HH:MM=RATE" entries separated by commas
+
+    Ranges may wrap past midnight ("22:00-06:00=0"). Returns a list of
+    (start minute, end minute, bytes per second) tuples.
+    """
+    schedule = []
+    for entry in filter(None, (part.strip() for part in text.split(","))):
+        match = re.fullmatch(r"(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*=\s*(.+)", entry)
+        if not match:
+            raise ValueError(f"invalid schedule entry: {entry!r}")
+        start_hour, start_minute, end_hour, end_minute = (int(value) for value in match.groups()[:4])
+        if start_hour > 24 or end_hour > 24 or start_minute > 59 or end_minute > 59:
+            raise ValueError(f"invalid time in schedule entry: {entry!r}")
+        schedule.append((start_hour * 60 + start_minute, end_hour * 60 + end_minute,
+                         parse_rate(match.group(5))))
+    return schedule
+
+
+class BandwidthLimiter:
+    """Process-wide token bucket, split between active jobs by weight
+
+    rate is in bytes per second; 0 or None means unlimited. Schedule entries
+    override it for their time of day. clock is the monotonic time source.
+    """
+    def __init__(self, rate=0, schedule=None, clock=time.monotonic):
+        self.rate = rate or 0
+        self.clock = clock
+        self.schedule = schedule or []
+        self.lock = threading.Lock()
+        self.active = {}  # share -> time it last received data
+        self.buckets = {}  # share -> (tokens, time of last refill)
+
+    def set_rate(self, rate):
+        with self.lock:
+            self.rate = rate or 0
+
+    def set_schedule(self, schedule):
+        with self.lock:
+            self.schedule = schedule or []
+
+    def current_rate(self, now=None):
+        """The rate in force at the given local time (default now)"""
+        local = time.localtime(now)
+        minute = local.tm_hour * 60 + local.tm_min
+        for start, end, rate in self.schedule:
+            if start <= minute < end or (end < start and (minute >= start or minute < end)):
+                return rate
+        return self.rate
+
+    def share(self, weight=1.0):
+        """Handle for one job; weight is its priority relative to other jobs"""
+        return BandwidthShare(self, weight)
+
+    def consume(self, share, nbytes, cancel_event=None):
+        """Account for nbytes received by share and sleep until they are paid for"""
+        delay = self._charge(share, nbytes)
+        while delay > 0:
+            # Sleep in short steps so a new rate also applies to jobs already waiting
+            if cancel_event is not None:
+                if cancel_event.wait(min(delay, MAX_SLEEP)):
+                    return
+            else:
+                time.sleep(min(delay, MAX_SLEEP))
+            delay = self._charge(share, 0)
+
+    def _charge(self, share, nbytes):
+        # Refill the share's bucket, take nbytes from it and return the
+        # seconds until it is out of debt
+        with self.lock:
+            rate = self.current_rate()
+            now = self.clock()
+            self.active[share] = now
+            if not rate:
+                self.buckets.pop(share, None)
+                return 0
+            for other, last in list(self.active.items()):
+                if now - last > IDLE_SECONDS:
+                    del self.active[other]
+                    self.buckets.pop(other, None)
+            job_rate = rate * share.weight / sum(other.weight for other in self.active)
+            tokens, last = self.buckets.get(share, (job_rate * BURST_SECONDS, now))
+            tokens = min(job_rate * BURST_SECONDS, tokens + (now - last) * job_rate) - nbytes
+            self.buckets[share] = (tokens, now)
+            return -tokens / job_rate if tokens < 0 else 0
+
+    def release(self, share):
+        with self.lock:
+            self.active.pop(share, None)
+            self.buckets.pop(share, None)
+
+    def stats(self):
+        with self.lock:
+            return {"rate": self.rate, "current_rate": self.current_rate(), "active": len(self.active)}
+
+
+class BandwidthShare:
+    """A job's handle on the shared limiter"""
+    def __init__(self, limiter, weight=1.0):
+        self.limiter = limiter
+        self.weight = max(weight, 0.01)
+
+    def consume(self, nbytes, cancel_event=None):
+        self.limiter.consume(self, nbytes, cancel_event)
+
+    def release(self):
+        self.limiter.release(self)
+
+
+_shared_limiter = None
+_shared_lock = threading.Lock()
+
+
+def get_bandwidth_limiter():
+    """Bandwidth limiter shared by every job in this process"""
+    global _shared_limiter
+    with _shared_lock:
+        if _shared_limiter is None:
+            _shared_limiter = BandwidthLimiter()
+        return _shared_limiter
@@ -0,0 +1,50 @@
+"""Budget of download connections shared by every job in the process
+
+Jobs that fetch over several connections at once (fragments of HLS/DASH
+streams, ranges of a segmented HTTP download) lease them from the budget for
+each file they download, so N jobs with M connections each cannot open more
+than the limit between them. A lease is never refused: a job gets at least
+one connection, just as it would without any parallelism, and only the extra
+ones depend on what is left.
+"""
+import threading
+
+
+class ConnectionBudget:
+    """Counter of connections in use, with a limit that can change at any time"""
+    def __init__(self, limit=16):
+        self.limit = limit
+        self.in_use = 0
+        self.lock = threading.Lock()
+
+    def acquire(self, wanted):
+        """Lease up to wanted connections and return how many were granted"""
+        with self.lock:
+            granted = max(1, min(wanted, self.limit - self.in_use))
+            self.in_use += granted
+            return granted
+
+    def release(self, count):
+        with self.lock:
+            self.in_use -= count
+
+    def set_limit(self, limit):
+        with self.lock:
+            self.limit = limit
+
+    def stats(self):
+        with self.lock:
+            return {"limit": self.limit, "in_use": self.in_use}
+
+
+_shared_budget = None
+_shared_lock = threading.Lock()
+
+
+def get_connection_budget():
+    """Connection budget shared by every job in this process"""
+    global _shared_budget
+    with _shared_lock:
+        if _shared_budget is None:
+            _shared_budget = ConnectionBudget()
+        return _shared_budget
@@ -1,27 +1,58 @@
+"""Build the VeDownloader executable with PyInstaller
+
+The default onedir build puts the executable, its libraries and a PYZ
+archive of compiled modules (yt-dlp included) in dist/VeDownloader/, and
+starts without unpacking anything. --onefile builds the single executable
+of earlier releases in dist/onefile/, which unpacks that whole directory
+into a temp directory on every start.
+
+Runs on Windows, Linux and macOS with the Python running this script, which
+needs PyInstaller installed (see requirements.txt).
+
+Example:
+    python build_exe.py
+    python build_exe.py --onefile
+    python startup_benchmark.py --offscreen --executable dist/VeDownloader/VeDownloader \
+        --executable dist/onefile/VeDownloader
+"""
+import argparse
 import os
-import sys
 import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
 
-def main():
+
+def main(argv=None):
     """Build the executable for VeDownloader"""
+    parser = argparse.ArgumentParser(description="Build the VeDownloader executable.")
+    parser.add_argument("--onefile", action="store_true",
+                        help="build one self-extracting executable instead of a directory")
+    args = parser.parse_args(argv)
+
     print("Building VeDownloader executable...")
-    
-    # Define the PyInstaller command
-    cmd = [
-        ".venv\\Scripts\\pyinstaller",
-        "--name=VeDownloader",
-        "--onefile",
-        "--windowed",
-        "--clean",
-        "--add-data=.venv\\Lib\\site-packages\\yt_dlp;yt_dlp",
-        "advanced_gui.py"
-    ]
-    
+
+    # The spec file takes its own options after "--"
+    spec_options = []
+    if args.onefile:
+        spec_options.append("--onefile")
+    cmd = [sys.executable, "-m", "PyInstaller", "--clean", "--noconfirm", "VeDownloader.spec"]
+    if args.onefile:
+        # Next to, not over, the onedir build on systems without .exe names
+        cmd[-1:-1] = ["--distpath", os.path.join("dist", "onefile")]
+    if spec_options:
+        cmd += ["--"] + spec_options
+
     # Run the command
-    subprocess.run(cmd, check=True)
-    
+    subprocess.run(cmd, check=True, cwd=HERE)
+
     print("\nBuild completed!")
-    print("The executable can be found in the 'dist' folder.")
+    if args.onefile:
+        print("The executable can be found in the 'dist/onefile' folder.")
+    else:
+        print("The application can be found in the 'dist/VeDownloader' folder; "
+              "keep the folder together when copying it.")
+
 
 if __name__ == "__main__":
     main()
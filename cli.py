@@ -0,0 +1,245 @@
+"""Command-line downloader for VeDownloader
+
+Downloads every URL listed in a file (one per line, blank lines and lines
+starting with # are skipped) using the same engine as the GUI, and writes one
+JSON result per URL. PyQt5 is not needed. Playlists and channels are
+expanded as they are downloaded, adding a result for each of their entries;
+--no-playlists downloads only the video of URLs that name both.
+
+With --serve it runs as a local HTTP job-submission service instead (see
+service.py).
+
+Example:
+    python cli.py urls.txt --output-dir ~/Downloads --jobs 4 --results results.jsonl
+    python cli.py --serve --port 8765 --jobs 4
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import zip_longest
+
+from archive import DownloadArchive, ARCHIVE_PATH
+from bandwidth import get_bandwidth_limiter, parse_rate, parse_schedule
+from budget import get_connection_budget
+from engine import DownloadJob
+from info_cache import InfoCache
+from playlist import PlaylistExpander
+from postprocess import get_postprocess_stage
+from remux import FASTSTART_RESERVE, FASTSTART_REWRITE
+from politeness import HostScheduler, MAX_THROTTLE_RETRIES, host_key, is_throttled
+
+QUALITIES = ["best", "1080p", "720p", "480p", "360p", "audio only"]
+FORMATS = ["auto", "mp4", "mkv", "webm", "mp3", "aac"]
+
+
+def read_url_file(path):
+    """Return the URLs listed in a file, or on stdin if path is -"""
+    handle = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        return [line.strip() for line in handle if line.strip() and not line.lstrip().startswith("#")]
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+
+def interleave_hosts(urls):
+    """Reorder URLs round-robin by site, so one site does not hold every worker"""
+    by_host = OrderedDict()
+    for url in urls:
+        by_host.setdefault(host_key(url), []).append(url)
+    return [url for group in zip_longest(*by_host.values()) for url in group if url is not None]
+
+
+def run_job(url, args, archive, info_cache, log, hosts, downloads, feed=None):
+    """Download one URL and return its result record and the job
+
+    downloads is a semaphore of download slots, held until the job moves on
+    to post-processing. feed is the PlaylistExpander of the playlist the URL
+    is an entry of.
+    """
+    if feed is not None:
+        feed.release()
+    started = time.time()
+    job = DownloadJob(url, args.output_dir, args.quality, args.format, args.subtitles,
+                      on_status=lambda message: log(f"[{url}] {message}"),
+                      archive=archive, info_cache=info_cache, connections=args.connections,
+                      fragments=args.fragments, budget=get_connection_budget(),
+                      bandwidth=get_bandwidth_limiter().share(), expand_playlists=not args.no_playlists,
+                      postprocess=get_postprocess_stage(), faststart=args.faststart)
+    key = host_key(url)
+    downloading = threading.Event()
+
+    def downloaded():
+        # Post-processing neither talks to the site nor uses the network
+        downloading.clear()
+        hosts.finish(key)
+        downloads.release()
+
+    job.on_downloaded = downloaded
+    for attempt in range(MAX_THROTTLE_RETRIES + 1):
+        hosts.acquire(key)
+        downloads.acquire()
+        downloading.set()
+        try:
+            success, message = job.run()
+        finally:
+            if downloading.is_set():
+                downloads.release()
+        throttled = not success and is_throttled(message)
+        delay = hosts.finish(key, throttled) if downloading.is_set() else 0
+        if not throttled or attempt == MAX_THROTTLE_RETRIES:
+            break
+        log(f"[{url}] Rate limited by {key}, retrying in {delay:.0f}s")
+    return {
+        "url": url,
+        "success": success,
+        "message": message,
+        "extract_count": job.extract_count,
+        "result": job.result.to_dict() if job.result else None,
+        "elapsed": round(time.time() - started, 3),
+    }, job
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="vedownloader", description="Download videos without the GUI.")
+    parser.add_argument("url_file", nargs="?", help="file with one URL per line, or - to read from stdin")
+    parser.add_argument("-o", "--output-dir", default=os.path.join(os.path.expanduser("~"), "Downloads"),
+                        help="download directory (default: ~/Downloads)")
+    parser.add_argument("-q", "--quality", default="best", choices=QUALITIES)
+    parser.add_argument("-f", "--format", default="mp4", choices=FORMATS)
+    parser.add_argument("--subtitles", action="store_true", help="download subtitles if available")
+    parser.add_argument("--no-playlists", action="store_true",
+                        help="download only the video of URLs that also name a playlist")
+    parser.add_argument("-j", "--jobs", type=int, default=3, help="maximum concurrent downloads (default: 3)")
+    parser.add_argument("-c", "--connections", type=int, default=1,
+                        help="connections per download for large files (default: 1)")
+    parser.add_argument("--fragments", type=int, default=4,
+                        help="fragments of HLS/DASH streams fetched at once per download (default: 4)")
+    parser.add_argument("--max-connections", type=int, default=16,
+                        help="connections shared by all downloads (default: 16)")
+    parser.add_argument("--per-host", type=int, default=2,
+                        help="maximum concurrent downloads from one site (default: 2)")
+    parser.add_argument("--host-interval", type=float, default=1.0,
+                        help="minimum seconds between download starts on one site (default: 1)")
+    parser.add_argument("--postprocess-workers", type=int, default=0,
+                        help="downloads merged or converted by FFmpeg at once (default: one per CPU core)")
+    parser.add_argument("--faststart", default=FASTSTART_RESERVE, choices=[FASTSTART_RESERVE, FASTSTART_REWRITE],
+                        help="how MP4 files get their index at the start: room reserved while they are "
+                             "written, or rewriting them afterwards (default: reserve)")
+    parser.add_argument("--limit-rate", type=parse_rate, default=0,
+                        help="total download rate of all downloads, e.g. 500K or 5M (default: unlimited)")
+    parser.add_argument("--limit-schedule", type=parse_schedule, default=[],
+                        help="rates for times of day overriding --limit-rate, "
+                             "e.g. \"09:00-17:00=5M,22:00-07:00=0\" (0 is unlimited)")
+    parser.add_argument("-r", "--results", default="-",
+                        help="write JSON lines results to this file (default: stdout)")
+    parser.add_argument("--archive", default=ARCHIVE_PATH,
+                        help=f"download archive used to skip videos already downloaded (default: {ARCHIVE_PATH})")
+    parser.add_argument("--no-archive", action="store_true", help="do not use a download archive")
+    parser.add_argument("--cache-dir", help="also keep extracted video information on disk in this directory")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print progress messages to stderr")
+
+    service = parser.add_argument_group("service mode")
+    service.add_argument("--serve", action="store_true", help="run the HTTP job-submission service")
+    service.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    service.add_argument("--port", type=int, default=8765, help="port to listen on (default: 8765)")
+    service.add_argument("--queue-size", type=int, default=1000,
+                         help="queued jobs accepted before submissions get 429 (default: 1000)")
+    service.add_argument("--keep-finished", type=int, default=1000,
+                         help="finished, failed and cancelled jobs listed by GET /jobs (default: 1000)")
+    service.add_argument("--autotune", action="store_true",
+                         help="adjust running jobs and connections to the measured throughput, "
+                              "with --jobs and --max-connections as upper bounds")
+
+    args = parser.parse_args(argv)
+    if not args.serve and not args.url_file:
+        parser.error("a URL file is required unless --serve is given")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    get_connection_budget().set_limit(max(1, args.max_connections))
+    get_bandwidth_limiter().set_rate(args.limit_rate)
+    get_bandwidth_limiter().set_schedule(args.limit_schedule)
+    if args.postprocess_workers:
+        get_postprocess_stage().set_workers(args.postprocess_workers)
+    if args.serve:
+        from service import serve
+        serve(args.host, args.port, args.output_dir, max(1, args.jobs), args.queue_size, args.autotune,
+              max(1, args.per_host), args.host_interval, max(0, args.keep_finished))
+        return 0
+
+    urls = interleave_hosts(read_url_file(args.url_file))
+    hosts = HostScheduler(max(1, args.per_host), args.host_interval)
+    os.makedirs(args.output_dir, exist_ok=True)
+    # One archive instance is shared by all worker threads
+    archive = None if args.no_archive else DownloadArchive(args.archive)
+    info_cache = InfoCache(cache_dir=args.cache_dir)
+
+    def log(message):
+        if args.verbose:
+            print(message, file=sys.stderr, flush=True)
+
+    out = sys.stdout if args.results == "-" else open(args.results, "w", encoding="utf-8")
+    failures = 0
+    try:
+        # --jobs downloads at a time; the extra threads carry finished
+        # downloads through post-processing, and a full stage holds back
+        # new downloads once they are all busy
+        downloads = threading.Semaphore(max(1, args.jobs))
+        with ThreadPoolExecutor(max_workers=2 * max(1, args.jobs) + get_postprocess_stage().workers) as pool:
+            futures = {pool.submit(run_job, url, args, archive, info_cache, log, hosts, downloads) for url in urls}
+            # Entry jobs submitted by expander threads
+            entries = queue.Queue()
+            expanders = []
+
+            def expand(job):
+                # Runs outside the pool, so a playlist never holds a worker
+                def done(expander):
+                    if expander.error:
+                        log(f"[{job.url}] Playlist stopped after {expander.count} entries: {expander.error}")
+
+                expander = PlaylistExpander(job.entries, lambda url: entries.put(
+                    pool.submit(run_job, url, args, archive, info_cache, log, hosts, downloads, expander)), done)
+                expanders.append(expander)
+                expander.start()
+
+            while futures or any(expander.is_alive() for expander in expanders) or not entries.empty():
+                while not entries.empty():
+                    futures.add(entries.get())
+                if not futures:
+                    # Only expanders are left; wait for their next entry
+                    try:
+                        futures.add(entries.get(timeout=0.5))
+                    except queue.Empty:
+                        pass
+                    continue
+                done, futures = wait(futures, timeout=0.5, return_when=FIRST_COMPLETED)
+                # Results are written as jobs finish, so a partial file is still useful
+                for future in done:
+                    result, job = future.result()
+                    if not result["success"]:
+                        failures += 1
+                    if job.entries is not None:
+                        expand(job)
+                    out.write(json.dumps(result) + "\n")
+                    out.flush()
+            failures += sum(1 for expander in expanders if expander.error)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    log(f"Info cache: {info_cache.stats()}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,6 @@
+# Lets the tests under tests/ import the top-level modules, and keeps the
+# per-user files they write (see paths.py) out of the real home directory
+import os
+import tempfile
+
+os.environ["HOME"] = os.environ["USERPROFILE"] = tempfile.mkdtemp(prefix="vedownloader-tests-")
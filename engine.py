@@ -0,0 +1,913 @@
+"""Download engine shared by the GUI and the command-line downloader
+
+This module must not import PyQt5: it is used on headless servers.
+"""
+import glob
+import os
+import threading
+import time
+import yt_dlp
+from yt_dlp.downloader import get_suitable_downloader
+from yt_dlp.downloader.fragment import FragmentFD
+from yt_dlp.postprocessor.ffmpeg import FFmpegPostProcessor
+
+from extractor_index import get_extractor_index
+from playlist import is_playlist, iter_entry_urls, split_entry_url
+from politeness import is_throttled
+from remux import (AUDIO_FORMATS, COPY, FASTSTART_RESERVE, FitContainerPP, conversion_path, describe,
+                   faststart_args, moov_reserve, plan)
+from segmented import SegmentedHttpFD, can_segment, has_segment_state
+
+# Upper bound on progress updates sent to the UI per job and per second
+PROGRESS_UPDATES_PER_SECOND = 10
+
+CANCELLED_MESSAGE = "Download cancelled by user"
+
+FFMPEG_MISSING_MESSAGE = (
+    "FFmpeg is required but not installed. Please install FFmpeg:\n\n"
+    "1. Download FFmpeg from https://www.gyan.dev/ffmpeg/builds/\n"
+    "2. Extract the zip file\n"
+    "3. Copy the ffmpeg.exe file from the bin folder\n"
+    "4. Paste it into your Python installation folder or add it to your system PATH"
+)
+
+# What yt-dlp reports when FFmpeg is missing: before merging formats, and
+# when a postprocessor goes to run it
+FFMPEG_MISSING_ERRORS = ("ffmpeg is not installed", "ffmpeg not found")
+
+
+def is_ffmpeg_missing(error_msg):
+    return any(error in error_msg for error in FFMPEG_MISSING_ERRORS)
+
+
+def _ignore(*args):
+    pass
+
+
+# Subprocesses (ffmpeg) started by yt-dlp, grouped by the thread that started
+# them, so a cancelled job can stop the ones it owns
+_child_processes = {}
+_child_processes_lock = threading.Lock()
+
+
+def _track_child_processes():
+    """Record every process yt-dlp starts against the current thread"""
+    popen = yt_dlp.utils.Popen
+    if getattr(popen, '_tracked', False):
+        return
+    original_init = popen.__init__
+
+    def __init__(self, *args, **kwargs):
+        original_init(self, *args, **kwargs)
+        with _child_processes_lock:
+            _child_processes.setdefault(threading.get_ident(), set()).add(self)
+
+    popen.__init__ = __init__
+    popen._tracked = True
+
+
+_track_child_processes()
+
+
+def terminate_child_processes(thread_id):
+    """Terminate the subprocesses started by a thread that are still running
+
+    The thread that started them still waits on them, so they are reaped there.
+    """
+    with _child_processes_lock:
+        processes = list(_child_processes.get(thread_id, ()))
+    for process in processes:
+        if process.poll() is None:
+            try:
+                process.terminate()
+            except OSError:
+                pass
+
+
+def _forget_child_processes(thread_id):
+    with _child_processes_lock:
+        _child_processes.pop(thread_id, None)
+
+
+class ProgressHook:
+    """Progress hook for yt-dlp to report download progress
+
+    yt-dlp calls the hook for every chunk it writes, so updates are coalesced:
+    only the latest state is kept and it is emitted at most max_rate times a
+    second, with a final flush when the download finishes or fails.
+
+    When cancel_event is set, the next call raises DownloadCancelled so yt-dlp
+    unwinds and closes its files and connections itself.
+
+    With a bandwidth.BandwidthShare the hook charges each chunk to it and
+    sleeps in the downloading thread until the chunk is paid for. Downloaders
+    that charge the share themselves mark their progress 'bandwidth_applied'.
+    """
+    def __init__(self, on_progress, on_status, max_rate=PROGRESS_UPDATES_PER_SECOND, cancel_event=None,
+                 on_file=None, on_bytes=None, bandwidth=None):
+        self.on_progress = on_progress
+        self.on_status = on_status
+        # Called, unthrottled, with the number of bytes received since the last call
+        self.on_bytes = on_bytes or _ignore
+        self.received = {}
+        self.bandwidth = bandwidth
+        # Fragments of one download report from several threads
+        self.lock = threading.Lock()
+        # Called with the path of each temporary file the download starts writing
+        self.on_file = on_file or _ignore
+        self.interval = 1.0 / max_rate if max_rate else 0
+        self.last_emit = None
+        self.pending = None
+        self.cancel_event = cancel_event
+        # Temporary files written by the download, for cleanup on cancel
+        self.files = set()
+
+    def __call__(self, d):
+        if d.get('tmpfilename') and d['tmpfilename'] not in self.files:
+            self.files.add(d['tmpfilename'])
+            self.on_file(d['tmpfilename'])
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise yt_dlp.utils.DownloadCancelled(CANCELLED_MESSAGE)
+
+        if d['status'] == 'downloading':
+            if d.get('downloaded_bytes'):
+                key = d.get('tmpfilename') or d.get('filename')
+                with self.lock:
+                    received = d['downloaded_bytes'] - self.received.get(key, d['downloaded_bytes'])
+                    self.received[key] = d['downloaded_bytes']
+                if received > 0:
+                    self.on_bytes(received)
+                    if self.bandwidth is not None and not d.get('bandwidth_applied'):
+                        self.bandwidth.consume(received, self.cancel_event)
+            self.pending = self._progress_state(d)
+            now = time.monotonic()
+            if self.last_emit is None or now - self.last_emit >= self.interval:
+                self.last_emit = now
+                self.flush()
+
+        elif d['status'] == 'finished':
+            self.flush()
+            self.on_status("Download finished, now processing...")
+        elif d['status'] == 'error':
+            self.flush()
+            self.on_status(f"Error: {d.get('error', 'Unknown error')}")
+
+    def flush(self):
+        """Emit the latest progress state if it has not been sent yet"""
+        if self.pending is not None:
+            percent, message = self.pending
+            self.pending = None
+            self.on_progress(percent)
+            self.on_status(message)
+
+    def _progress_state(self, d):
+        # Calculate download progress
+        downloaded_bytes = d.get('downloaded_bytes', 0)
+
+        # Update status with download speed
+        if 'speed' in d and d['speed'] is not None:
+            speed = d['speed'] / 1024 / 1024  # Convert to MB/s
+            message = f"Downloading: {speed:.2f} MB/s"
+        else:
+            message = "Downloading..."
+
+        # Try to get total bytes or estimated total bytes
+        if 'total_bytes' in d and d['total_bytes'] is not None and d['total_bytes'] > 0:
+            percent = int((downloaded_bytes / d['total_bytes']) * 100)
+        elif 'total_bytes_estimate' in d and d['total_bytes_estimate'] is not None and d['total_bytes_estimate'] > 0:
+            percent = int((downloaded_bytes / d['total_bytes_estimate']) * 100)
+        else:
+            # If we can't calculate percentage, show the amount downloaded instead
+            message = f"{message} ({downloaded_bytes / 1024 / 1024:.2f} MB downloaded)"
+            # Send a progress update that's not 100% to show activity
+            percent = min(downloaded_bytes % 100, 95)
+
+        return percent, message
+
+
+def cancel_postprocessor_hook(cancel_event):
+    """Postprocessor hook that stops a cancelled job before the next step"""
+    def hook(d):
+        if d['status'] == 'started' and cancel_event.is_set():
+            raise yt_dlp.utils.DownloadCancelled(CANCELLED_MESSAGE)
+    return hook
+
+
+class CountingYoutubeDL(yt_dlp.YoutubeDL):
+    """YoutubeDL that counts how many times an extractor is run for a job
+
+    It also hands plain HTTP downloads to SegmentedHttpFD when the
+    'segment_connections' option asks for more than one connection or an
+    interrupted segmented download is resumed, and
+    leases the connections of segmented and fragmented downloads from the
+    budget.ConnectionBudget given as 'connection_budget'.
+
+    With a postprocess.PostProcessStage as 'postprocess_stage', the FFmpeg
+    steps after a download wait for a slot of that stage, and 'on_downloaded'
+    is called first so the caller can free the download slot.
+    """
+    def __init__(self, params=None, auto_init=True):
+        super().__init__(params, auto_init)
+        self.extract_count = 0
+
+    def extract_info(self, url, *args, **kwargs):
+        # yt-dlp routes every extraction (including ydl.download and url
+        # redirects resolved by process_ie_result) through this method
+        self.extract_count += 1
+        url, entry_ie_key = split_entry_url(url)
+        if entry_ie_key and len(args) < 2 and not kwargs.get('ie_key'):
+            # A playlist entry only its own extractor understands
+            kwargs['ie_key'] = entry_ie_key
+        if len(args) < 2 and not kwargs.get('ie_key') and not kwargs.get('force_generic_extractor') \
+                and not self.params.get('force_generic_extractor'):
+            # Name the extractor, so yt-dlp does not test every other one first
+            kwargs['ie_key'] = get_extractor_index().find(url, self._ies)
+        return super().extract_info(url, *args, **kwargs)
+
+    def dl(self, name, info, subtitle=False, test=False):
+        if subtitle or test or name == '-' or not info.get('url'):
+            return super().dl(name, info, subtitle, test)
+        connections = self.params.get('segment_connections') or 1
+        # An interrupted segmented download is resumed by SegmentedHttpFD even
+        # with one connection, since HttpFD cannot read its .part file
+        if can_segment(info) and (connections > 1 or has_segment_state(self, name)):
+            fd_class, wanted = SegmentedHttpFD, connections
+        else:
+            fd_class = get_suitable_downloader(info, self.params)
+            wanted = self.params.get('concurrent_fragment_downloads') or 1
+            if wanted <= 1 or fd_class is None or not issubclass(fd_class, FragmentFD):
+                return super().dl(name, info, subtitle, test)
+
+        budget = self.params.get('connection_budget')
+        granted = budget.acquire(wanted) if budget is not None else wanted
+        try:
+            # The same steps as YoutubeDL.dl, with the downloader chosen here
+            if fd_class is SegmentedHttpFD:
+                fd = SegmentedHttpFD(self, self.params, granted)
+            else:
+                fd = fd_class(self, {**self.params, 'concurrent_fragment_downloads': granted})
+            for ph in self._progress_hooks:
+                fd.add_progress_hook(ph)
+            new_info = self._copy_infodict(info)
+            if new_info.get('http_headers') is None:
+                new_info['http_headers'] = self._calc_headers(new_info)
+            return fd.download(name, new_info, subtitle)
+        finally:
+            if budget is not None:
+                budget.release(granted)
+
+    def post_process(self, filename, info, files_to_move=None):
+        stage = self.params.get('postprocess_stage')
+        if stage is None or not (info.get('__postprocessors') or self._pps['post_process']
+                                 or self._pps['after_move']):
+            return self._post_process(filename, info, files_to_move)
+        on_downloaded = self.params.get('on_downloaded')
+        if on_downloaded is not None:
+            on_downloaded()
+        with stage.slot(self.params.get('cancel_event'), CANCELLED_MESSAGE):
+            return self._post_process(filename, info, files_to_move)
+
+    def _post_process(self, filename, info, files_to_move):
+        try:
+            return super().post_process(filename, info, files_to_move)
+        except yt_dlp.utils.PostProcessingError:
+            # A merge whose MP4 index outgrew the room reserved for it (see
+            # remux.faststart_args) is run again with FFmpeg's faststart
+            args = self.params.get('postprocessor_args')
+            merging = info.get('__files_to_merge') or []
+            if not (isinstance(args, dict) and 'merger' in args and merging
+                    and all(os.path.exists(path) for path in merging)):
+                raise
+            self.params['postprocessor_args'] = {key: value for key, value in args.items() if key != 'merger'}
+            return super().post_process(filename, info, files_to_move)
+
+
+def get_format_string(quality):
+    """Convert UI quality selection to yt-dlp format string"""
+    if quality == "best":
+        return "bestvideo+bestaudio/best"
+    elif quality == "1080p":
+        return "bestvideo[height<=1080]+bestaudio/best[height<=1080]"
+    elif quality == "720p":
+        return "bestvideo[height<=720]+bestaudio/best[height<=720]"
+    elif quality == "480p":
+        return "bestvideo[height<=480]+bestaudio/best[height<=480]"
+    elif quality == "360p":
+        return "bestvideo[height<=360]+bestaudio/best[height<=360]"
+    elif quality == "audio only":
+        return "bestaudio/best"
+    else:
+        return "bestvideo+bestaudio/best"
+
+
+def build_ydl_opts(output_dir, quality="best", format_option="mp4", subtitles=False, progress_hook=None,
+                   connections=1, fragments=1, playlist=False):
+    """Build the yt-dlp options for a download job"""
+    # Configure yt-dlp options
+    ydl_opts = {
+        'format': get_format_string(quality),
+        'outtmpl': os.path.join(output_dir, '%(title)s.%(ext)s'),
+        'progress_hooks': [progress_hook] if progress_hook else [],
+        'quiet': True,
+        'no_warnings': True,
+        'noprogress': True,  # Progress is reported through the hook
+        'noplaylist': not playlist,  # A video URL that also names a playlist gets the playlist
+        'segment_connections': connections,  # Connections per plain HTTP download
+        'concurrent_fragment_downloads': fragments,  # Fragments fetched at once for HLS/DASH
+    }
+
+    # If audio only is selected, we can avoid needing FFmpeg
+    if quality == "audio only":
+        target = format_option.lower()
+        ydl_opts.update({
+            'format': AUDIO_FORMATS.get(target, 'bestaudio/best'),
+            'keepvideo': False,
+            # Copies the audio as it is when the source is already in the
+            # target codec, and re-encodes it otherwise
+            'postprocessors': [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': 'm4a' if target == 'aac' else 'mp3',
+                'preferredquality': '192',
+                'nopostoverwrites': False,
+            }] if target in ['mp3', 'aac'] else []
+        })
+
+    # Add subtitle options if requested
+    if subtitles:
+        ydl_opts.update({
+            'writesubtitles': True,
+            'writeautomaticsub': True,
+            'subtitleslangs': ['en'],
+        })
+
+    # Add format-specific options
+    if format_option.lower() != "auto":
+        if format_option.lower() == "mp4":
+            # yt-dlp already asks FFmpeg for faststart MP4 files; see
+            # DownloadJob._plan_conversion for doing it in a single pass
+            ydl_opts.update({
+                'merge_output_format': 'mp4',
+            })
+        elif format_option.lower() in ["mkv", "webm", "mp3", "aac"]:
+            ydl_opts.update({
+                'merge_output_format': format_option.lower(),
+            })
+
+    return ydl_opts
+
+
+# Parts of a processed info dict the download itself never reads
+TRIMMED_KEYS = {'formats', 'thumbnails', 'subtitles', 'automatic_captions', 'heatmap',
+                'requested_formats', 'requested_subtitles', 'description'}
+
+
+def trim_info(info, format_ids):
+    """Copy of a processed info dict that keeps only the given formats
+
+    The copy still goes through yt-dlp's format selection again, which picks
+    the same formats from the reduced list.
+    """
+    trimmed = {key: value for key, value in info.items() if key not in TRIMMED_KEYS}
+    trimmed['formats'] = [f for f in info.get('formats') or [] if f.get('format_id') in format_ids]
+    requested = info.get('requested_subtitles') or {}
+    for key in ('subtitles', 'automatic_captions'):
+        if info.get(key) and requested:
+            trimmed[key] = {lang: subs for lang, subs in info[key].items() if lang in requested}
+    if info.get('thumbnails'):
+        trimmed['thumbnails'] = info['thumbnails'][-1:]
+    return trimmed
+
+
+class JobRecord:
+    """Compact summary of a download, kept instead of the full info dict"""
+    __slots__ = ('url', 'title', 'video_id', 'extractor', 'format_id', 'ext', 'size', 'duration',
+                 'output_path', 'conversion')
+
+    def __init__(self, url, title=None, video_id=None, extractor=None, format_id=None, ext=None,
+                 size=None, duration=None, output_path=None, conversion=None):
+        self.url = url
+        self.title = title
+        self.video_id = video_id
+        self.extractor = extractor
+        self.format_id = format_id
+        self.ext = ext
+        self.size = size
+        self.duration = duration
+        self.output_path = output_path
+        # remux.COPY or remux.TRANSCODE when the file was converted to the
+        # output format
+        self.conversion = conversion
+
+    @classmethod
+    def from_info(cls, url, info):
+        """Pick the fields the GUI and the history need out of a processed info dict"""
+        downloads = info.get('requested_downloads') or [info]
+        last = downloads[-1]
+        path = last.get('filepath') or last.get('_filename')
+        if path and os.path.exists(path):
+            size = os.path.getsize(path)
+        else:
+            size = last.get('filesize') or last.get('filesize_approx')
+        return cls(
+            url,
+            title=info.get('title'),
+            video_id=info.get('id'),
+            extractor=info.get('extractor_key') or info.get('extractor'),
+            format_id=info.get('format_id'),
+            ext=last.get('ext') or info.get('ext'),
+            size=size,
+            duration=info.get('duration'),
+            output_path=path,
+        )
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class DownloadJob:
+    """A single download, reporting progress and status through callbacks
+
+    run() blocks until the job is done and returns a (success, message) tuple.
+    cancel() may be called from any thread; the job then stops at its next
+    progress update, terminating any ffmpeg it is waiting on.
+
+    on_format and on_file report the chosen format id and each .part file as
+    the job gets to them, so it can be journalled and resumed later by passing
+    that format_id and part_path back in.
+
+    With expand_playlists, a playlist or channel is not downloaded by the job:
+    run() returns once it is extracted and leaves a lazy iterator over the
+    entry URLs in self.entries, for a playlist.PlaylistExpander to queue.
+    """
+    def __init__(self, url, output_dir, quality="best", format_option="mp4", subtitles=False,
+                 on_progress=None, on_status=None, archive=None, info_cache=None, keep_partial=True,
+                 format_id=None, on_format=None, on_file=None, connections=1, fragments=1, budget=None,
+                 on_bytes=None, bandwidth=None, expand_playlists=False, postprocess=None, on_downloaded=None,
+                 faststart=FASTSTART_RESERVE, progress_rate=PROGRESS_UPDATES_PER_SECOND, part_path=None):
+        self.url = url
+        self.output_dir = output_dir
+        self.quality = quality
+        self.format_option = format_option
+        self.subtitles = subtitles
+        # Connections used for each plain HTTP download (see segmented.py)
+        self.connections = connections
+        # HLS/DASH fragments fetched at once
+        self.fragments = fragments
+        # Optional budget.ConnectionBudget shared with other jobs
+        self.budget = budget
+        # Optional bandwidth.BandwidthShare of the global rate limit; its
+        # weight is the job's priority
+        self.bandwidth = bandwidth
+        # Optional postprocess.PostProcessStage the FFmpeg steps queue for;
+        # on_downloaded is called from the job's thread when it joins that queue
+        self.postprocess = postprocess
+        self.on_downloaded = on_downloaded or _ignore
+        self.on_progress = on_progress or _ignore
+        self.on_status = on_status or _ignore
+        # Most on_progress/on_status updates per second; 0 sends every one
+        self.progress_rate = progress_rate
+        self.on_format = on_format or _ignore
+        self.on_file = on_file or _ignore
+        # Receives byte counts for throughput measurement (see autotune.py)
+        self.on_bytes = on_bytes or _ignore
+        # Format id to resume with; the quality setting is the fallback when
+        # the format is no longer offered
+        self.format_id = format_id
+        # .part file an earlier run of the job was writing, to continue from
+        self.part_path = part_path
+        # Optional archive.DownloadArchive used to skip videos already downloaded
+        self.archive = archive
+        # Optional info_cache.InfoCache used to skip extraction for repeated URLs
+        self.info_cache = info_cache
+        # Keep .part files of cancelled downloads so they can be resumed
+        self.keep_partial = keep_partial
+        self.expand_playlists = expand_playlists
+        # remux.FASTSTART_RESERVE writes the index of MP4 output in the same
+        # FFmpeg pass; remux.FASTSTART_REWRITE leaves it to FFmpeg's faststart
+        self.faststart = faststart
+        # Entry URLs of a playlist URL, set when the job finds one to expand
+        self.entries = None
+        self.cancel_event = threading.Event()
+        self._thread_id = None
+        self._hooks = []
+        # Number of extractor invocations made for this job
+        self.extract_count = 0
+        # JobRecord of the downloaded file, set when the job succeeds
+        self.result = None
+        # How the file is fitted to format_option: remux.COPY, remux.TRANSCODE
+        # or None when it needs no conversion
+        self.conversion = None
+        self._conversion_status = None
+        # The conversion status is sent once, though every FFmpeg step starts
+        self._conversion_announced = False
+        # Why the file was not converted, repeated once it is done
+        self._conversion_note = None
+
+    @property
+    def is_cancelled(self):
+        return self.cancel_event.is_set()
+
+    @is_cancelled.setter
+    def is_cancelled(self, value):
+        if value:
+            self.cancel()
+        else:
+            self.cancel_event.clear()
+
+    def cancel(self):
+        """Ask the job to stop; safe to call from any thread"""
+        self.cancel_event.set()
+        thread_id = self._thread_id
+        if thread_id is not None:
+            terminate_child_processes(thread_id)
+
+    def run(self):
+        self._thread_id = threading.get_ident()
+        try:
+            success, message = self._run()
+        finally:
+            self._thread_id = None
+            _forget_child_processes(threading.get_ident())
+            if self.bandwidth is not None:
+                self.bandwidth.release()
+        if not success and self.is_cancelled:
+            # Errors caused by the cancellation itself (a killed ffmpeg, a
+            # closed connection) are reported as the cancellation
+            if not self.keep_partial:
+                self._remove_partial_files()
+            self.on_status("Download cancelled")
+            return False, CANCELLED_MESSAGE
+        return success, message
+
+    def _progress_hook(self):
+        hook = ProgressHook(self.on_progress, self.on_status, self.progress_rate, cancel_event=self.cancel_event,
+                            on_file=self.on_file, on_bytes=self.on_bytes, bandwidth=self.bandwidth)
+        self._hooks.append(hook)
+        return hook
+
+    def _remove_partial_files(self):
+        for hook in self._hooks:
+            for path in hook.files:
+                for partial in [path, path + '.ytdl', path + '.segments'] + glob.glob(glob.escape(path) + '-Frag*'):
+                    try:
+                        os.remove(partial)
+                    except OSError:
+                        pass
+
+    def _run(self):
+        try:
+            if self.is_cancelled:
+                self.on_status("Download cancelled")
+                return False, CANCELLED_MESSAGE
+
+            # Skip known videos before any network access when the URL alone
+            # identifies them
+            if self.archive is not None:
+                archive_id = self.archive.match_url(self.url)
+                if archive_id:
+                    self.on_status("Already downloaded, skipping")
+                    return True, f"Already downloaded: {archive_id}"
+
+            self.on_status("Starting download...")
+
+            ydl_opts = build_ydl_opts(self.output_dir, self.quality, self.format_option, self.subtitles,
+                                      self._progress_hook(), self.connections, self.fragments,
+                                      self.expand_playlists)
+            ydl_opts['postprocessor_hooks'] = [cancel_postprocessor_hook(self.cancel_event), self._postprocessor_hook]
+            if self.budget is not None:
+                ydl_opts['connection_budget'] = self.budget
+            if self.bandwidth is not None:
+                ydl_opts['bandwidth_share'] = self.bandwidth
+            if self.postprocess is not None:
+                ydl_opts.update(self._postprocess_opts())
+            if self.format_id:
+                ydl_opts['format'] = f"{self.format_id}/{ydl_opts['format']}"
+            if self.archive is not None:
+                ydl_opts['download_archive'] = self.archive
+
+            # Download the video
+            with CountingYoutubeDL(ydl_opts) as ydl:
+                try:
+                    info = self.info_cache.get(self.url, ydl.params) if self.info_cache is not None else None
+                    from_cache = info is not None
+                    if from_cache:
+                        self.on_status("Using cached video information...")
+                    else:
+                        self.on_status("Extracting video information...")
+                        # Extract once without processing, then download from the
+                        # same info dict so the extractor does not run a second time
+                        try:
+                            info = ydl.extract_info(self.url, download=False, process=False)
+                            if self.expand_playlists:
+                                info = self._follow_redirects(ydl, info)
+                        finally:
+                            self.extract_count = ydl.extract_count
+                        if info and self.info_cache is not None:
+                            self.info_cache.put(self.url, info, ydl.params)
+
+                    if self.is_cancelled:
+                        self.on_status("Download cancelled")
+                        return False, CANCELLED_MESSAGE
+
+                    if not info:
+                        self.on_status("Failed to get video information")
+                        return False, "Failed to get video information"
+
+                    video_title = info.get('title', 'Video')
+                    if self.expand_playlists and is_playlist(info):
+                        # The entries are fetched page by page as they are
+                        # iterated, after this job has given up its slot
+                        self.entries = self._iter_entries(ydl, info)
+                        self.on_status(f"Expanding playlist: {video_title}")
+                        return True, f"Found playlist: {video_title}"
+
+                    self.on_status(f"Downloading: {video_title}")
+
+                    try:
+                        try:
+                            # Select the formats first so the rest of the info dict
+                            # is released before the transfer starts
+                            info = self._select_formats(ydl, info)
+                            if info.get('format_id'):
+                                self.format_id = info['format_id']
+                                self.on_format(self.format_id)
+                            self._resume_part(ydl, info)
+                            self._plan_conversion(ydl, info)
+                            # Perform the actual download from the extracted info
+                            downloaded = ydl.process_ie_result(info, download=True)
+                        finally:
+                            self.extract_count = ydl.extract_count
+
+                        if self.is_cancelled:
+                            self.on_status("Download cancelled")
+                            return False, CANCELLED_MESSAGE
+
+                        # Final success message
+                        self.result = JobRecord.from_info(self.url, downloaded or info)
+                        self.result.conversion = self.conversion
+                        if self._conversion_note:
+                            self.on_status(f"Download complete! {self._conversion_note}")
+                        else:
+                            self.on_status("Download complete!")
+                        return True, f"Successfully downloaded: {video_title}"
+                    except yt_dlp.utils.DownloadError as e:
+                        error_msg = str(e)
+
+                        # Check for FFmpeg error and try alternative download method
+                        if is_ffmpeg_missing(error_msg):
+                            self.on_status("FFmpeg not found. Trying alternative download method...")
+                            result = self._try_direct_download(info, video_title)
+                            if result:
+                                return result
+
+                            # If alternative method failed, show FFmpeg installation instructions
+                            return False, FFMPEG_MISSING_MESSAGE
+
+                        # A throttled host is left alone rather than asked again
+                        if from_cache and not self.is_cancelled and not is_throttled(error_msg):
+                            # The cached format URLs may have been rejected; extract afresh
+                            self.on_status("Cached video information failed, extracting again...")
+                            self.info_cache.invalidate(self.url, ydl.params)
+                            return self._run()
+
+                        self.on_status(f"Download error: {error_msg}")
+                        return False, f"Download error: {error_msg}"
+                except yt_dlp.utils.DownloadError as e:
+                    error_msg = str(e)
+                    self.on_status(f"Download error: {error_msg}")
+
+                    # Check for FFmpeg error
+                    if is_ffmpeg_missing(error_msg):
+                        return False, FFMPEG_MISSING_MESSAGE
+                    return False, f"Download error: {error_msg}"
+
+        except Exception as e:
+            self.on_status(f"Error: {str(e)}")
+            return False, str(e)
+
+    def _postprocessor_hook(self, d):
+        if d['status'] == 'started':
+            name = d.get('postprocessor', 'FFmpeg')
+            if self._conversion_status and name in ('Merger', 'FitContainer', 'ExtractAudio'):
+                if not self._conversion_announced:
+                    self._conversion_announced = True
+                    self.on_status(f"{self._conversion_status}...")
+            else:
+                self.on_status(f"Post-processing: {name}...")
+
+    def _postprocess_opts(self):
+        def on_downloaded():
+            self.on_status("Waiting to post-process...")
+            self.on_downloaded()
+
+        return {
+            'postprocess_stage': self.postprocess,
+            'on_downloaded': on_downloaded,
+            'cancel_event': self.cancel_event,
+        }
+
+    @staticmethod
+    def _follow_redirects(ydl, info, limit=5):
+        # Resolve plain URL results, such as a channel page pointing at its
+        # videos tab, so a playlist behind them is found before processing
+        for _ in range(limit):
+            if not info or info.get('_type') != 'url':
+                break
+            info = ydl.extract_info(info['url'], download=False, ie_key=info.get('ie_key'), process=False)
+        return info
+
+    @staticmethod
+    def _iter_entries(ydl, info):
+        try:
+            yield from iter_entry_urls(info)
+        finally:
+            # The YoutubeDL reopens its connections for later pages
+            ydl.close()
+
+    def _select_formats(self, ydl, info):
+        """Run format selection and return a trimmed copy of the info dict
+
+        Only the selected formats and the one the FFmpeg-less fallback would
+        use are kept.
+        """
+        if info.get('_type', 'video') != 'video':
+            return info
+        processed = ydl.process_ie_result(info, download=False)
+        format_ids = {f.get('format_id') for f in processed.get('requested_formats') or [processed]}
+        direct = self._pick_direct_format(processed.get('formats') or [])
+        if direct:
+            format_ids.add(direct.get('format_id'))
+        return trim_info(processed, format_ids)
+
+    def _resume_part(self, ydl, info):
+        """Continue the .part file of an earlier run, or remove it if this run cannot
+
+        The output template is pointed at the file, so a title or template
+        that changed since does not start the download over. A .part file of
+        a format that is no longer selected would never be finished, so it
+        is removed.
+        """
+        part_path, self.part_path = self.part_path, None
+        if not part_path or not os.path.isfile(part_path) or info.get('_type', 'video') != 'video':
+            return
+        stem, ext = os.path.splitext(part_path[:-len('.part')])
+        formats = {f.get('format_id'): f for f in info.get('formats') or []}
+        selected_ids = (info.get('format_id') or '').split('+')
+        if not part_path.endswith('.part'):
+            resumable = False
+        elif len(selected_ids) > 1:
+            # Each format of a merge is downloaded to <stem>.f<format id>.<ext>.part
+            stem, format_suffix = os.path.splitext(stem)
+            selected = formats.get(format_suffix[2:]) if format_suffix[2:] in selected_ids else None
+            resumable = selected is not None and ext[1:] == selected.get('ext')
+        else:
+            resumable = ext[1:] == info.get('ext')
+        if not resumable:
+            self.on_status("Discarding the partial download of another format")
+            for partial in (part_path, part_path + '.ytdl', part_path + '.segments'):
+                try:
+                    os.remove(partial)
+                except OSError:
+                    pass
+            return
+        ydl.params['outtmpl']['default'] = stem.replace('%', '%%') + '.%(ext)s'
+        self.on_status("Resuming the partial download...")
+
+    def _plan_conversion(self, ydl, info):
+        """Fit the selected formats to format_option by stream copy where they allow it
+
+        Merged formats that fit are merged straight into the output format.
+        Otherwise a FitContainerPP re-encodes only the streams that do not fit.
+        MP4 output made by either gets its index written in the same pass
+        unless faststart is FASTSTART_REWRITE.
+
+        Without FFmpeg nothing is planned: a single file is kept as it was
+        downloaded, and formats that need merging fail over to
+        _try_direct_download.
+        """
+        self.conversion = None
+        self._conversion_status = None
+        self._conversion_announced = False
+        self._conversion_note = None
+        target = self.format_option.lower()
+        if target == 'auto' or info.get('_type', 'video') != 'video':
+            return
+        audio_target = target in ('mp3', 'aac')
+        if audio_target != (self.quality == "audio only"):
+            return
+        # The trimmed info dict keeps the selected formats, not requested_formats
+        selected_ids = (info.get('format_id') or '').split('+')
+        selected = [f for f in info.get('formats') or [] if f.get('format_id') in selected_ids] or [info]
+        if not FFmpegPostProcessor(ydl).available:
+            if len(selected) == 1 and info.get('ext') != target:
+                self._conversion_note = f"FFmpeg not found, kept the {info.get('ext')} file as it is"
+                self.on_status(self._conversion_note)
+            return
+        copies = plan(target, selected)
+        path = conversion_path(copies)
+        reserve = None
+        if target == 'mp4' and self.faststart == FASTSTART_RESERVE:
+            reserve = moov_reserve(info.get('duration'), selected)
+        if audio_target:
+            # FFmpegExtractAudio (see build_ydl_opts) copies or re-encodes the
+            # audio the same way
+            pass
+        elif len(selected) > 1:
+            if path != COPY:
+                # MKV takes any codec, so the merge is still a copy
+                ydl.params['merge_output_format'] = 'mkv'
+                ydl.add_post_processor(FitContainerPP(ydl, target, copies, reserve), when='post_process')
+            elif reserve:
+                ydl.params['postprocessor_args'] = {'merger': faststart_args(reserve)}
+        elif info.get('ext') == target:
+            return
+        else:
+            ydl.add_post_processor(FitContainerPP(ydl, target, copies, reserve), when='post_process')
+        self.conversion = path
+        self._conversion_status = f"Converting to {describe(target, copies)}"
+
+    def _pick_direct_format(self, formats):
+        """Find a single format that doesn't require merging with FFmpeg"""
+        # Find a suitable format based on quality preference
+        target_format = None
+
+        # For audio only, find the best audio format
+        if self.quality == "audio only":
+            audio_formats = [f for f in formats if f.get('acodec') != 'none' and f.get('vcodec') == 'none']
+            if audio_formats:
+                target_format = max(audio_formats, key=lambda x: x.get('abr', 0) or 0)
+        else:
+            # For video, try to find a format with both audio and video
+            complete_formats = [f for f in formats if f.get('acodec') != 'none' and f.get('vcodec') != 'none']
+
+            if complete_formats:
+                # Filter by height if a specific quality was requested
+                if self.quality == "1080p":
+                    filtered = [f for f in complete_formats if (f.get('height') or 0) <= 1080]
+                elif self.quality == "720p":
+                    filtered = [f for f in complete_formats if (f.get('height') or 0) <= 720]
+                elif self.quality == "480p":
+                    filtered = [f for f in complete_formats if (f.get('height') or 0) <= 480]
+                elif self.quality == "360p":
+                    filtered = [f for f in complete_formats if (f.get('height') or 0) <= 360]
+                else:
+                    filtered = complete_formats
+
+                if filtered:
+                    # Get the best quality within our filter
+                    target_format = max(filtered, key=lambda x: x.get('height', 0) or 0)
+
+        return target_format
+
+    def _try_direct_download(self, info, video_title):
+        """Try to download a single format that doesn't require merging with FFmpeg"""
+        try:
+            self.on_status("Trying direct download without FFmpeg...")
+
+            # Get available formats
+            formats = info.get('formats', [])
+            if not formats:
+                self.on_status("No suitable formats found for direct download")
+                return None
+
+            target_format = self._pick_direct_format(formats)
+            if not target_format:
+                self.on_status("No compatible format found for direct download")
+                return None
+
+            format_id = target_format.get('format_id')
+            self.on_status(f"Found compatible format: {format_id}")
+
+            # Configure yt-dlp for direct download
+            ydl_opts = {
+                'format': format_id,
+                'outtmpl': os.path.join(self.output_dir, '%(title)s.%(ext)s'),
+                'progress_hooks': [self._progress_hook()],
+                'postprocessor_hooks': [cancel_postprocessor_hook(self.cancel_event), self._postprocessor_hook],
+                'quiet': True,
+                'no_warnings': True,
+                'noprogress': True,
+                'segment_connections': self.connections,
+                'concurrent_fragment_downloads': self.fragments,
+                'connection_budget': self.budget,
+                'bandwidth_share': self.bandwidth,
+            }
+            if self.postprocess is not None:
+                ydl_opts.update(self._postprocess_opts())
+            if self.archive is not None:
+                ydl_opts['download_archive'] = self.archive
+
+            # Reuse the info dict that was already extracted
+            with CountingYoutubeDL(ydl_opts) as ydl:
+                try:
+                    downloaded = ydl.process_ie_result(info, download=True)
+                finally:
+                    self.extract_count += ydl.extract_count
+
+            self.result = JobRecord.from_info(self.url, downloaded or info)
+            self.on_status("Download complete!")
+            return True, f"Successfully downloaded: {video_title}"
+
+        except Exception as e:
+            self.on_status(f"Direct download failed: {str(e)}")
+            return None
@@ -0,0 +1,385 @@
+"""Routing index from URL host to the yt-dlp extractors that may handle it
+
+yt-dlp picks the extractor of a URL by testing the URL pattern (_VALID_URL)
+of every extractor in turn, well over a thousand of them, until one matches.
+Most jobs only ever see a few sites, so this index reads the host part of
+each pattern once and files the extractor under the sites it can match, the
+same site key politeness.host_key gives a URL. Looking a URL up
+then tests only the extractors filed under its site plus the few whose host
+cannot be read from their pattern (Generic, patterns matching any host, and
+plugins with their own suitable()), in yt-dlp's order, so the pick is the
+same as the full scan.
+
+Reading the patterns takes a while, so the index is kept on disk and rebuilt
+only when the extractors or their patterns change.
+"""
+import hashlib
+import json
+import os
+import threading
+
+from paths import DATA_DIR
+from politeness import host_key
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+
+INDEX_PATH = os.path.join(DATA_DIR, "extractor_index.json")
+
+# Bumped when the way patterns are read changes, to drop older indexes
+INDEX_VERSION = 2
+
+# Routed URLs start with one of these, so pattern branches that cannot are dropped
+SCHEMES = ("http://", "https://")
+
+# Stand-ins for pattern pieces that match more than one string: SAFE_GAP
+# never matches a slash, OPEN_GAP may
+SAFE_GAP = "\0"
+OPEN_GAP = "\1"
+END = "\3"
+HOST_END = "/?#:" + END
+
+# Characters that may not follow "//" before the host ends in a routed URL
+NOT_HOST = "/?#:@\\"
+
+# A pattern with more branches than this up to its host is always tested
+MAX_BRANCHES = 4096
+
+# Site keys remembered with their candidate lists
+MAX_ROUTES = 256
+
+
+class Unindexable(Exception):
+    """The sites a pattern matches cannot be read from it"""
+
+
+def _in_set(items, char):
+    """Whether the character set of an IN item matches char"""
+    negate = False
+    hit = False
+    for op, av in items:
+        name = str(op)
+        if name == "NEGATE":
+            negate = True
+        elif name == "LITERAL":
+            hit = hit or chr(av) == char
+        elif name == "RANGE":
+            hit = hit or av[0] <= ord(char) <= av[1]
+        elif name == "CATEGORY":
+            # None of the characters asked about is a digit, space or word character
+            hit = hit or str(av).startswith("CATEGORY_NOT")
+        else:
+            return True
+    return hit != negate
+
+
+def _may_match(items, chars):
+    """Whether the parsed pattern items may match any of chars"""
+    for op, av in items:
+        name = str(op)
+        if name == "LITERAL":
+            matches = chr(av) in chars
+        elif name == "NOT_LITERAL":
+            matches = any(char != chr(av) for char in chars)
+        elif name == "IN":
+            matches = any(_in_set(av, char) for char in chars)
+        elif name == "BRANCH":
+            matches = any(_may_match(branch, chars) for branch in av[1])
+        elif name == "SUBPATTERN":
+            matches = _may_match(av[-1], chars)
+        elif name == "ATOMIC_GROUP":
+            matches = _may_match(av, chars)
+        elif name in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT"):
+            matches = _may_match(av[2], chars)
+        elif name == "GROUPREF_EXISTS":
+            matches = any(_may_match(branch, chars) for branch in av[1:] if branch)
+        elif name in ("AT", "ASSERT", "ASSERT_NOT"):
+            matches = False
+        else:
+            matches = True
+        if matches:
+            return True
+    return False
+
+
+def _read_host(text):
+    """Host of a pattern prefix: None while incomplete, False if it cannot match a routed URL"""
+    scheme_end = text.find("://")
+    scheme = text if scheme_end < 0 else text[:scheme_end + 3]
+    if SAFE_GAP not in scheme:
+        if scheme_end < 0:
+            return None if any(full.startswith(scheme) for full in SCHEMES) else False
+        if scheme not in SCHEMES:
+            return False
+    if scheme_end < 0:
+        # Only "://" may hold the first slash of a routed URL
+        return None if "/" not in text or text.endswith(":/") else False
+    host = text[scheme_end + 3:]
+    for index, char in enumerate(host):
+        if char in HOST_END:
+            return host[:index]
+    return None
+
+
+class _Walk:
+    """Expands a parsed pattern into the hosts it can match"""
+    def __init__(self):
+        self.hosts = set()
+
+    def append(self, states, piece):
+        live = []
+        for state in states:
+            if piece == OPEN_GAP:
+                raise Unindexable()
+            if piece == SAFE_GAP and state.endswith(SAFE_GAP):
+                live.append(state)
+                continue
+            text = state + piece
+            host = _read_host(text)
+            if host is None:
+                live.append(text)
+            elif host is not False:
+                self.hosts.add(host)
+        return self.dedupe(live)
+
+    def dedupe(self, states):
+        states = list(dict.fromkeys(states))
+        if len(states) > MAX_BRANCHES:
+            raise Unindexable()
+        return states
+
+    def gap(self, items):
+        return OPEN_GAP if _may_match(items, "/") else SAFE_GAP
+
+    def walk(self, items, states):
+        for op, av in items:
+            if not states:
+                break
+            name = str(op)
+            if name == "LITERAL":
+                states = self.append(states, chr(av).lower())
+            elif name == "IN" and len(av) <= 4 and all(str(item) == "LITERAL" for item, _ in av):
+                states = self.dedupe([state for _, char in av for state in self.append(states, chr(char).lower())])
+            elif name in ("NOT_LITERAL", "ANY", "IN"):
+                states = self.append(states, self.gap([(op, av)]))
+            elif name == "BRANCH":
+                states = self.dedupe([state for branch in av[1] for state in self.walk(branch, states)])
+            elif name == "SUBPATTERN":
+                states = self.walk(av[-1], states)
+            elif name == "ATOMIC_GROUP":
+                states = self.walk(av, states)
+            elif name in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT"):
+                low, high, item = av
+                if high == 0:
+                    continue
+                skipped = states if low == 0 else []
+                repeated = self.walk(item, states)
+                if high > 1:
+                    # The first repeat, any number more, then the last one,
+                    # whose text is the part that can border a known suffix
+                    repeated += self.walk(item, self.append(repeated, self.gap(item)))
+                states = self.dedupe(skipped + repeated)
+            elif name == "GROUPREF_EXISTS":
+                states = self.dedupe([state for branch in av[1:] for state in
+                                      (self.walk(branch, states) if branch else states)])
+            elif name == "AT":
+                if str(av) in ("AT_END", "AT_END_STRING"):
+                    states = self.append(states, END)
+            elif name in ("ASSERT", "ASSERT_NOT"):
+                # Lookarounds only narrow a match
+                continue
+            else:
+                states = self.append(states, OPEN_GAP)
+        return states
+
+
+def _site_of(host):
+    """Site key of a host read from a pattern"""
+    if SAFE_GAP in host:
+        # Only a known suffix that holds the whole site key of every host
+        # ending in it names the site
+        suffix = host[host.rindex(SAFE_GAP) + 1:]
+        if not suffix.startswith(".") or host_key("//x" + suffix) != host_key("//" + suffix[1:]):
+            raise Unindexable()
+        host = suffix[1:]
+    if not host:
+        raise Unindexable()
+    return host_key("//" + host)
+
+
+def pattern_sites(pattern):
+    """Site keys of the http(s) URLs a URL pattern can match
+
+    Raises Unindexable when the pattern may match hosts that cannot be listed.
+    """
+    walk = _Walk()
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception:
+        raise Unindexable()
+    if walk.walk(list(parsed), [""]):
+        # The pattern ends inside the host, so the host may go on
+        raise Unindexable()
+    return {_site_of(host) for host in walk.hosts}
+
+
+def pattern_bounds(ie):
+    """Whether an extractor only takes URLs its URL pattern matches
+
+    yt-dlp's own extractors that override suitable() only use it to turn away
+    some of the URLs their pattern matches; plugins are not relied on to.
+    """
+    for klass in ie.__mro__:
+        if "suitable" in vars(klass):
+            return klass.__module__.startswith("yt_dlp.")
+    return False
+
+
+def extractor_sites(ie):
+    """Site keys an extractor can match, or None if it has to be tested on every URL"""
+    valid_url = ie._VALID_URL
+    if not pattern_bounds(ie):
+        return None
+    if valid_url is False:
+        return set()
+    patterns = valid_url if isinstance(valid_url, (list, tuple)) else [valid_url]
+    try:
+        return set().union(*(pattern_sites(pattern) for pattern in patterns))
+    except Unindexable:
+        return None
+
+
+def fingerprint(ies):
+    """Hash of the extractors, their order and patterns, which an index is valid for"""
+    digest = hashlib.sha1(str(INDEX_VERSION).encode())
+    for ie in ies:
+        digest.update(f"{ie.ie_key()}\0{ie._VALID_URL!r}\0{pattern_bounds(ie)}\n".encode())
+    return digest.hexdigest()
+
+
+class ExtractorIndex:
+    """Site to candidate extractors map for an ordered list of extractor classes
+
+    The index is loaded from path when it was built for the same extractors,
+    and built and saved there otherwise; path None keeps it in memory only.
+    """
+    def __init__(self, ies, path=INDEX_PATH):
+        self.ies = list(ies)
+        self.path = path
+        self.lock = threading.Lock()
+        self.routes = {}
+        self.enabled = {}
+        self.fingerprint = fingerprint(self.ies)
+        by_key = {ie.ie_key(): ie for ie in self.ies}
+        stored = self._load()
+        if stored is None:
+            stored = self._build()
+        self.positions = {ie.ie_key(): position for position, ie in enumerate(self.ies)}
+        self.sites = {site: [by_key[key] for key in keys] for site, keys in stored["sites"].items()}
+        self.wildcards = [by_key[key] for key in stored["wildcards"]]
+
+    def _load(self):
+        if self.path is None:
+            return None
+        try:
+            with open(self.path, encoding="utf-8") as index_file:
+                stored = json.load(index_file)
+        except (OSError, ValueError):
+            return None
+        return stored if stored.get("fingerprint") == self.fingerprint else None
+
+    def _build(self):
+        sites = {}
+        wildcards = []
+        for ie in self.ies:
+            found = extractor_sites(ie)
+            if found is None:
+                wildcards.append(ie.ie_key())
+            for site in found or ():
+                sites.setdefault(site, []).append(ie.ie_key())
+        stored = {"fingerprint": self.fingerprint, "sites": sites, "wildcards": wildcards}
+        if self.path is not None:
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path + ".tmp", "w", encoding="utf-8") as index_file:
+                    json.dump(stored, index_file)
+                os.replace(self.path + ".tmp", self.path)
+            except OSError:
+                pass
+        return stored
+
+    def route(self, url):
+        """Extractor classes that may handle url, in yt-dlp's order
+
+        Returns None for URLs that are not plain http(s) URLs or have a port
+        or user name before their path; those need the full scan.
+        """
+        if not url.startswith(SCHEMES):
+            return None
+        netloc = url.split("://", 1)[1].split("/", 1)[0]
+        if not netloc or any(char in NOT_HOST for char in netloc):
+            return None
+        site = host_key("//" + netloc)
+        route = self.routes.get(site)
+        if route is None:
+            route = sorted(self.sites.get(site, []) + self.wildcards, key=lambda ie: self.positions[ie.ie_key()])
+            with self.lock:
+                if len(self.routes) >= MAX_ROUTES:
+                    self.routes.clear()
+                self.routes[site] = route
+        return route
+
+    def candidates(self, url):
+        """Extractor classes to test on url, every one when it cannot be routed"""
+        route = self.route(url)
+        return self.ies if route is None else route
+
+    def find(self, url, keys=None):
+        """ie_key of the extractor yt-dlp would pick for url
+
+        keys are the ie_keys of the YoutubeDL doing the extraction, in its
+        order. Returns None when the URL cannot be routed, no extractor
+        matches it, or keys are not indexed extractors in the indexed order.
+        """
+        route = self.route(url)
+        if route is None:
+            return None
+        if keys is not None:
+            enabled = self._enabled(tuple(keys))
+            if enabled is None:
+                return None
+            route = [ie for ie in route if ie.ie_key() in enabled]
+        for ie in route:
+            if ie.suitable(url):
+                return ie.ie_key()
+        return None
+
+    def _enabled(self, keys):
+        if keys not in self.enabled:
+            last = -1
+            for key in keys:
+                position = self.positions.get(key)
+                if position is None or position <= last:
+                    self.enabled[keys] = None
+                    break
+                last = position
+            else:
+                self.enabled[keys] = frozenset(keys)
+        return self.enabled[keys]
+
+
+_shared_index = None
+_shared_lock = threading.Lock()
+
+
+def get_extractor_index():
+    """Index of yt-dlp's extractors shared by every job in this process"""
+    global _shared_index
+    with _shared_lock:
+        if _shared_index is None:
+            from yt_dlp.extractor import gen_extractor_classes
+
+            _shared_index = ExtractorIndex(gen_extractor_classes())
+        return _shared_index
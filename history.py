@@ -0,0 +1,93 @@
+"""Persistent download history backed by SQLite"""
+import os
+import sqlite3
+import threading
+import time
+
+from paths import DATA_DIR
+
+HISTORY_PATH = os.path.join(DATA_DIR, "history.db")
+
+COLUMNS = ("id", "url", "title", "extractor", "video_id", "output_path", "size",
+           "duration", "format", "completed_at")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS downloads (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    title TEXT,
+    extractor TEXT,
+    video_id TEXT,
+    output_path TEXT,
+    size INTEGER,
+    duration REAL,
+    format TEXT,
+    completed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS downloads_url ON downloads (url);
+CREATE INDEX IF NOT EXISTS downloads_video ON downloads (extractor, video_id);
+CREATE INDEX IF NOT EXISTS downloads_video_id ON downloads (video_id);
+CREATE INDEX IF NOT EXISTS downloads_completed_at ON downloads (completed_at);
+"""
+
+
+class HistoryStore:
+    """Download history stored in an SQLite database
+
+    The connection is shared between threads and guarded by a lock, so jobs
+    running on worker threads can record entries directly.
+    """
+    def __init__(self, path=HISTORY_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+
+    def add(self, url, record=None, completed_at=None):
+        """Record a finished download; record is the job's engine.JobRecord"""
+        values = [getattr(record, name, None) for name in
+                  ('title', 'extractor', 'video_id', 'output_path', 'size', 'duration', 'format_id')]
+        with self.lock, self.db:
+            cursor = self.db.execute(
+                "INSERT INTO downloads (url, title, extractor, video_id, output_path, size, duration, format, completed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, *values, completed_at or time.time()))
+            return cursor.lastrowid
+
+    def count(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM downloads").fetchone()[0]
+
+    def page(self, offset, limit):
+        """Return entries newest first, starting at offset"""
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM downloads ORDER BY completed_at DESC, id DESC"
+                " LIMIT ? OFFSET ?", (limit, offset)).fetchall()
+        return [dict(row) for row in rows]
+
+    def find_url(self, url):
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM downloads WHERE url = ? ORDER BY completed_at DESC",
+                (url,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def find_video(self, extractor, video_id):
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM downloads WHERE extractor = ? AND video_id = ?"
+                " ORDER BY completed_at DESC", (extractor, video_id)).fetchall()
+        return [dict(row) for row in rows]
+
+    def clear(self):
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM downloads")
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,129 @@
+"""Download time of an HLS stream from a local fixture, by fragment concurrency
+
+Writes a static m3u8 playlist and its MPEG-TS segments to a temporary
+directory and serves them from a local HTTP server that waits --latency
+seconds before answering each segment request, like a distant CDN. Then
+downloads the stream with DownloadJob once for every --fragments value and
+reports the time taken and the most connections the server had open at once.
+With --jobs, that many copies of the stream are downloaded at the same time,
+and --budget shares a budget.ConnectionBudget of that many connections
+between them.
+
+Example:
+    python hls_benchmark.py
+    python hls_benchmark.py --fragments 1 --fragments 8 --segments 100
+    python hls_benchmark.py --jobs 4 --fragments 8 --budget 8
+"""
+import argparse
+import functools
+import http.server
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from budget import ConnectionBudget
+from engine import DownloadJob
+
+# MPEG-TS packets are 188 bytes, starting with this sync byte
+TS_PACKET_SIZE = 188
+TS_SYNC_BYTE = b"\x47"
+
+
+def write_fixture(directory, segments, segment_size):
+    """Write index.m3u8 and its segments to directory"""
+    packet = TS_SYNC_BYTE + bytes(TS_PACKET_SIZE - 1)
+    segment = packet * max(1, segment_size // TS_PACKET_SIZE)
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:2", "#EXT-X-MEDIA-SEQUENCE:0"]
+    for index in range(segments):
+        lines += ["#EXTINF:2.0,", f"segment{index}.ts"]
+        with open(os.path.join(directory, f"segment{index}.ts"), "wb") as segment_file:
+            segment_file.write(segment)
+    lines.append("#EXT-X-ENDLIST")
+    with open(os.path.join(directory, "index.m3u8"), "w", encoding="utf-8") as playlist:
+        playlist.write("\n".join(lines) + "\n")
+
+
+class FixtureServer(http.server.ThreadingHTTPServer):
+    """Serves a directory, delaying segment requests and counting open connections"""
+    daemon_threads = True
+
+    def __init__(self, directory, latency):
+        super().__init__(("127.0.0.1", 0), functools.partial(FixtureHandler, directory=directory))
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+        self.url = f"http://127.0.0.1:{self.server_address[1]}/index.m3u8"
+
+
+class FixtureHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+        try:
+            if self.path.endswith(".ts"):
+                time.sleep(server.latency)
+            super().do_GET()
+        finally:
+            with server.lock:
+                server.active -= 1
+
+
+def measure(server, output_dir, jobs, fragments, budget):
+    """Seconds to download the stream jobs times at once, and whether every job succeeded"""
+    server.peak = 0
+    results = []
+    threads = []
+    for index in range(jobs):
+        # Each job gets its own directory, as they all download the same title
+        job_dir = os.path.join(output_dir, f"f{fragments}-{index}")
+        job = DownloadJob(server.url, job_dir, format_option="auto", fragments=fragments, budget=budget)
+        threads.append(threading.Thread(target=lambda job=job: results.append(job.run())))
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.monotonic() - started, all(success for success, message in results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure HLS download time by fragment concurrency.")
+    parser.add_argument("--fragments", type=int, action="append", default=[],
+                        help="fragments fetched at once; may be given more than once (default: 1, 4 and 8)")
+    parser.add_argument("--jobs", type=int, default=1, help="copies of the stream downloaded at once (default: 1)")
+    parser.add_argument("--budget", type=int, help="connections shared by all jobs (default: no budget)")
+    parser.add_argument("--segments", type=int, default=40, help="segments in the stream (default: 40)")
+    parser.add_argument("--segment-size", type=int, default=188 * 1000,
+                        help="bytes per segment (default: 188000)")
+    parser.add_argument("--latency", type=float, default=0.15,
+                        help="seconds before the server answers a segment request (default: 0.15)")
+    args = parser.parse_args(argv)
+
+    passed = True
+    with tempfile.TemporaryDirectory() as fixture_dir, tempfile.TemporaryDirectory() as output_dir:
+        write_fixture(fixture_dir, args.segments, args.segment_size)
+        server = FixtureServer(fixture_dir, args.latency)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            for fragments in args.fragments or [1, 4, 8]:
+                budget = ConnectionBudget(args.budget) if args.budget else None
+                seconds, succeeded = measure(server, output_dir, args.jobs, fragments, budget)
+                print(f"fragments={fragments}: {seconds:.2f}s, peak server connections: {server.peak}"
+                      f"{'' if succeeded else ' (FAILED)'}")
+                passed = passed and succeeded
+        finally:
+            server.shutdown()
+            server.server_close()
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
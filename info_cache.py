@@ -0,0 +1,204 @@
+"""Cache of extracted info dicts so repeated jobs skip extraction
+
+Entries are keyed by normalized URL and the yt-dlp options that change what
+extraction returns, and stored as JSON, in memory with an optional on-disk
+layer. Each entry expires after the cache TTL or just before
+the earliest expiry found in its signed format URLs, whichever comes first.
+The in-memory layer evicts least recently used entries beyond a byte budget.
+"""
+import calendar
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from archive import archive_id_for_url
+
+# Query parameters that never change what a URL points to
+TRACKING_PARAMS = {"feature", "si", "fbclid", "gclid", "ref", "ref_src"}
+
+# yt-dlp options that change what an extractor returns for a URL: whether a
+# video URL that names a playlist gets the playlist, who is logged in, where
+# the request appears to come from, and the formats and subtitles asked for
+EXTRACTION_PARAMS = ("noplaylist", "extract_flat", "playlist_items", "cookiefile", "cookiesfrombrowser",
+                     "username", "password", "usenetrc", "netrc_location", "videopassword", "ap_mso",
+                     "ap_username", "http_headers", "proxy", "geo_verification_proxy", "geo_bypass",
+                     "geo_bypass_country", "geo_bypass_ip_block", "age_limit", "extractor_args",
+                     "allowed_extractors", "force_generic_extractor", "compat_opts", "format", "format_sort",
+                     "format_sort_force", "allow_unplayable_formats", "check_formats", "youtube_include_dash_manifest",
+                     "youtube_include_hls_manifest", "dynamic_mpd", "hls_split_discontinuity", "writesubtitles",
+                     "writeautomaticsub", "subtitleslangs")
+
+# Signed URLs are dropped this many seconds before they expire, so a cached
+# entry is never handed to a download that cannot finish in time
+EXPIRY_MARGIN = 300
+
+
+def normalize_url(url):
+    """Cache key for a URL
+
+    URLs an extractor recognises map to the same "<extractor> <id>" key used by
+    the download archive, so youtu.be and youtube.com links share an entry.
+    """
+    archive_id = archive_id_for_url(url)
+    if archive_id:
+        return archive_id
+    parts = urlsplit(url.strip())
+    query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if key not in TRACKING_PARAMS and not key.startswith("utm_"))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", urlencode(query), ""))
+
+
+def cache_key(url, params=None):
+    """Cache key for a URL extracted with the yt-dlp options params"""
+    key = normalize_url(url)
+    options = {name: params[name] for name in EXTRACTION_PARAMS if params and params.get(name) is not None}
+    if not options:
+        return key
+    encoded = json.dumps(options, sort_keys=True, default=repr).encode("utf-8")
+    return f"{key} {hashlib.sha1(encoded).hexdigest()[:16]}"
+
+
+def url_expiry(url):
+    """Return the unix time a signed URL expires at, or None if it is not signed"""
+    params = {key.lower(): value for key, value in parse_qsl(urlsplit(url).query)}
+    try:
+        for key in ("expire", "expires", "exp"):
+            if key in params:
+                return float(params[key])
+        if "x-amz-date" in params and "x-amz-expires" in params:
+            signed = calendar.timegm(time.strptime(params["x-amz-date"], "%Y%m%dT%H%M%SZ"))
+            return signed + float(params["x-amz-expires"])
+    except ValueError:
+        pass
+    return None
+
+
+def info_expiry(info, ttl):
+    """Expiry time for a cached info dict, honouring signed format URLs"""
+    now = time.time()
+    expires = now + ttl
+    for fmt in info.get("formats") or [info]:
+        expiry = url_expiry(fmt.get("url") or "")
+        if expiry is not None:
+            expires = min(expires, expiry - EXPIRY_MARGIN)
+    return expires
+
+
+def is_cacheable(info):
+    """Only single videos whose formats survive a JSON round trip are cached"""
+    if not info or info.get("_type", "video") != "video":
+        return False
+    return all(isinstance(fmt.get("fragments", []), list) for fmt in info.get("formats") or [])
+
+
+class InfoCache:
+    """LRU cache of extracted info dicts with per-entry expiry"""
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=3600, cache_dir=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (expires, serialized info)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, url, params=None):
+        """Return a fresh copy of the cached info dict for url and params, or None"""
+        key = cache_key(url, params)
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] <= now:
+                self._remove(key)
+                entry = None
+            if entry is None and self.cache_dir:
+                entry = self._load(key, now)
+                if entry is not None:
+                    self._store(key, entry)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        return json.loads(entry[1])
+
+    def put(self, url, info, params=None):
+        """Cache the (unprocessed) info dict extracted for url with the yt-dlp options params"""
+        if not is_cacheable(info):
+            return
+        from yt_dlp import YoutubeDL
+
+        data = json.dumps(YoutubeDL.sanitize_info(info, remove_private_keys=True))
+        expires = info_expiry(info, self.ttl)
+        if expires <= time.time() or len(data) > self.max_bytes:
+            return
+        key = cache_key(url, params)
+        with self.lock:
+            self._store(key, (expires, data))
+        if self.cache_dir:
+            with open(self._path(key), "w", encoding="utf-8") as cache_file:
+                json.dump({"expires": expires, "info": data}, cache_file)
+
+    def invalidate(self, url, params=None):
+        key = cache_key(url, params)
+        with self.lock:
+            self._remove(key)
+        if self.cache_dir:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.size, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions}
+
+    def _store(self, key, entry):
+        self._remove(key)
+        self.entries[key] = entry
+        self.size += len(entry[1])
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+    def _load(self, key, now):
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as cache_file:
+                stored = json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+        if stored["expires"] <= now:
+            os.remove(path)
+            return None
+        return stored["expires"], stored["info"]
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_info_cache():
+    """In-memory info cache shared by every job in this process"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = InfoCache()
+        return _shared_cache
@@ -0,0 +1,92 @@
+"""Write-ahead journal of queued and running download jobs
+
+A job is written to the journal when it is submitted and removed once it has
+finished, failed or been cancelled, so whatever is left after the application
+exits or crashes is the work that has to be resumed. Each entry keeps the job
+options, the format id chosen for it and the .part file it was writing, which
+a resumed DownloadJob continues from if the file is still there, or removes
+when that format is no longer the one selected.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from paths import DATA_DIR
+
+JOURNAL_PATH = os.path.join(DATA_DIR, "jobs.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    client TEXT NOT NULL,
+    url TEXT NOT NULL,
+    options TEXT NOT NULL,
+    format_id TEXT,
+    part_path TEXT,
+    submitted_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_client ON jobs (client);
+"""
+
+
+class JobJournal:
+    """Unfinished jobs stored in an SQLite database
+
+    Entries are tagged with the client that queued them ("gui" or "service"),
+    so each one only resumes its own jobs. Like HistoryStore, the connection is
+    shared between threads and guarded by a lock.
+    """
+    def __init__(self, path=JOURNAL_PATH, client="gui"):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.client = client
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self.db.execute("PRAGMA journal_mode=WAL")
+            # Every change is on disk before the job goes ahead
+            self.db.execute("PRAGMA synchronous=FULL")
+        self.db.executescript(SCHEMA)
+
+    def add(self, url, options):
+        """Record a submitted job and return its journal id
+
+        options is a JSON-serializable dict of the job settings.
+        """
+        with self.lock, self.db:
+            cursor = self.db.execute(
+                "INSERT INTO jobs (client, url, options, submitted_at) VALUES (?, ?, ?, ?)",
+                (self.client, url, json.dumps(options), time.time()))
+            return cursor.lastrowid
+
+    def set_format(self, journal_id, format_id):
+        with self.lock, self.db:
+            self.db.execute("UPDATE jobs SET format_id = ? WHERE id = ?", (format_id, journal_id))
+
+    def set_part_path(self, journal_id, part_path):
+        with self.lock, self.db:
+            self.db.execute("UPDATE jobs SET part_path = ? WHERE id = ?", (part_path, journal_id))
+
+    def remove(self, journal_id):
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM jobs WHERE id = ?", (journal_id,))
+
+    def unfinished(self):
+        """Return this client's jobs that never finished, oldest first"""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT id, url, options, format_id, part_path, submitted_at FROM jobs"
+                " WHERE client = ? ORDER BY id", (self.client,)).fetchall()
+        entries = []
+        for row in rows:
+            entry = dict(row)
+            entry["options"] = json.loads(entry["options"])
+            entries.append(entry)
+        return entries
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,133 @@
+"""Memory kept per job: full info dicts, trimmed info dicts and JobRecords
+
+Builds an info dict shaped like a large site's extraction (many formats
+with their HTTP headers, thumbnails, caption tracks in many languages, a long
+description) and runs yt-dlp's format selection on it. Then it makes --jobs
+copies of the result, each with its own video id and fresh strings, and
+measures with tracemalloc how much memory stays allocated when they are kept
+as:
+
+    full       the processed info dict, as jobs held during the download
+    trimmed    engine.trim_info's copy with only the selected formats
+    record     the engine.JobRecord a finished job keeps
+    dict       the same fields in a plain dict, as results were kept before
+
+No network access is needed.
+
+Example:
+    python memory_benchmark.py
+    python memory_benchmark.py --jobs 1000 --formats 200
+"""
+import argparse
+import gc
+import json
+import sys
+import tracemalloc
+
+from engine import CountingYoutubeDL, JobRecord, trim_info
+
+LANGUAGES = ("en", "de", "es", "fr", "it", "ja", "ko", "pt", "ru", "zh")
+
+# Replaced by the video id of each copy
+VIDEO_ID = "video-template"
+
+
+def make_info(formats, thumbnails):
+    """Info dict of a video, as an extractor returns it"""
+    video_id = VIDEO_ID
+    headers = {"User-Agent": "Mozilla/5.0 " + "x" * 100, "Accept": "*/*",
+               "Referer": f"https://example.com/{video_id}"}
+    format_list = []
+    for number in range(formats):
+        height = (144, 240, 360, 480, 720, 1080)[number % 6]
+        format_list.append({
+            "format_id": f"{number}",
+            "url": f"https://cdn.example.com/{video_id}/{number}.mp4?expire=1700000000&signature={'f' * 80}",
+            "ext": "mp4",
+            "vcodec": "avc1.4d401f",
+            "acodec": "none" if number % 3 else "mp4a.40.2",
+            "height": height,
+            "width": height * 16 // 9,
+            "tbr": height * 3 + number,
+            "filesize": height * 100000 + number,
+            "http_headers": dict(headers),
+        })
+    format_list.append({"format_id": "audio", "url": f"https://cdn.example.com/{video_id}/audio.m4a", "ext": "m4a",
+                        "vcodec": "none", "acodec": "mp4a.40.2", "abr": 128, "http_headers": dict(headers)})
+    return {
+        "id": video_id,
+        "title": f"Video {video_id}",
+        "extractor": "synthetic",
+        "extractor_key": "Synthetic",
+        "webpage_url": f"https://example.com/watch?v={video_id}",
+        "description": "Description line\n" * 200,
+        "duration": 600,
+        "formats": format_list,
+        "thumbnails": [{"url": f"https://img.example.com/{video_id}/{number}.jpg", "width": number * 10}
+                       for number in range(thumbnails)],
+        "subtitles": {lang: [{"url": f"https://example.com/{video_id}.{lang}.vtt", "ext": "vtt"}] for lang in LANGUAGES},
+        "automatic_captions": {lang: [{"url": f"https://example.com/{video_id}.{lang}.auto.vtt", "ext": "vtt"}]
+                               for lang in LANGUAGES},
+    }
+
+
+def keep_full(processed):
+    return processed
+
+
+def keep_trimmed(processed):
+    format_ids = {f.get("format_id") for f in processed.get("requested_formats") or [processed]}
+    return trim_info(processed, format_ids)
+
+
+def keep_record(processed):
+    return JobRecord.from_info(processed["webpage_url"], processed)
+
+
+def keep_dict(processed):
+    return JobRecord.from_info(processed["webpage_url"], processed).to_dict()
+
+
+KEEPERS = {"full": keep_full, "trimmed": keep_trimmed, "record": keep_record, "dict": keep_dict}
+
+
+def processed_template(formats, thumbnails):
+    """JSON of an info dict after format selection"""
+    ydl = CountingYoutubeDL({"quiet": True, "format": "bestvideo+bestaudio/best", "writesubtitles": True,
+                             "subtitleslangs": ["en"]})
+    processed = ydl.process_ie_result(make_info(formats, thumbnails), download=False)
+    return json.dumps(ydl.sanitize_info(processed))
+
+
+def measure(keep, template, jobs):
+    """Bytes still allocated after keeping what keep returns for jobs copies of template"""
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    kept = []
+    for index in range(jobs):
+        processed = json.loads(template.replace(VIDEO_ID, f"video{index:06d}"))
+        kept.append(keep(processed))
+        del processed
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return retained
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the memory kept per download job.")
+    parser.add_argument("--jobs", type=int, default=1000, help="jobs kept (default: 1000)")
+    parser.add_argument("--formats", type=int, default=60, help="video formats per info dict (default: 60)")
+    parser.add_argument("--thumbnails", type=int, default=40, help="thumbnails per info dict (default: 40)")
+    args = parser.parse_args(argv)
+
+    template = processed_template(args.formats, args.thumbnails)
+    for name, keep in KEEPERS.items():
+        retained = measure(keep, template, args.jobs)
+        print(f"{name:8} {retained / 1e6:8.2f} MB for {args.jobs} jobs, {retained / args.jobs / 1e3:8.1f} KB per job")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""Prepare the VeDownloader-Portable tree for shipping
+
+Removes what the app never uses from the bundled Python (test suites, docs,
+man pages, shell completions, pip and setuptools, and the parts of PyQt5
+other than widgets) and precompiles the app and every installed package, so
+the first launch on a new machine does not compile yt-dlp and PyQt5 from
+source. The pycs are checked-hash ones: they are validated against
+the source they were compiled from rather than its modification time, so they
+stay valid when the tree is unzipped or copied to a USB drive.
+
+Prints the size of the tree and its cold-start time, the seconds the bundled
+interpreter takes to import the app and yt-dlp, before and after.
+
+Compiling is done by the bundled interpreter, so the pycs match its version;
+this script itself can be run with any Python 3.
+
+Example:
+    python package_portable.py
+    python package_portable.py --portable /path/to/VeDownloader-Portable
+"""
+import argparse
+import glob
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Module the launcher starts, and what it has loaded once the app is running
+APP_MODULE = "advanced_gui"
+COLD_START_IMPORTS = f"import {APP_MODULE}, yt_dlp"
+
+# Under python/share: documentation, man pages and shell completions
+SHARE_DIRS = ("doc", "info", "man", "bash-completion", "fish", "zsh")
+
+# Directory names of test suites installed along with packages
+TEST_DIRS = ("test", "tests")
+
+# Installed to build and install packages, which the portable tree never does
+INSTALL_PACKAGES = ("pip", "setuptools", "pkg_resources", "_distutils_hack")
+
+# The PyQt5 modules the app imports; the Qt libraries and plugins stay, as
+# the platform plugins load some of the others
+QT_MODULES = ("QtCore", "QtGui", "QtWidgets")
+
+# Under PyQt5: QML modules, translations, QScintilla and the .sip files for
+# building bindings against PyQt5
+PYQT_DATA = ("Qt5/qml", "Qt5/translations", "Qt5/qsci", "bindings")
+
+
+def tree_size(path):
+    """Bytes in the files under path, not following symlinks"""
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            total += os.lstat(os.path.join(root, name)).st_size
+    return total
+
+
+def site_packages(portable):
+    return glob.glob(os.path.join(portable, "python", "lib", "python*", "site-packages"))
+
+
+def remove(paths):
+    """Delete the files and directories in paths and return how many there were"""
+    removed = 0
+    # Parents sort first, so paths under one already deleted are skipped
+    for path in sorted(set(paths)):
+        if not os.path.lexists(path):
+            continue
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+        removed += 1
+    return removed
+
+
+def find_dirs(top, names):
+    """Directories under top with one of names, without descending into them"""
+    found = []
+    for root, dirs, files in os.walk(top):
+        for name in [name for name in dirs if name in names]:
+            found.append(os.path.join(root, name))
+            dirs.remove(name)
+    return found
+
+
+def unused_paths(portable):
+    """What the app never loads: docs, man pages, completions, test suites and unused packages"""
+    share = os.path.join(portable, "python", "share")
+    paths = [os.path.join(share, name) for name in SHARE_DIRS]
+    paths += glob.glob(os.path.join(portable, "python", "bin", "pip*"))
+    for packages in site_packages(portable):
+        # Only Python test suites; Qt ships a QML module named "test"
+        paths += [path for path in find_dirs(packages, TEST_DIRS)
+                  if any(name.endswith(".py") for name in os.listdir(path))]
+        for name in INSTALL_PACKAGES:
+            paths += [os.path.join(packages, name)] + glob.glob(os.path.join(packages, f"{name}-*.dist-info"))
+        paths.append(os.path.join(packages, "distutils-precedence.pth"))
+        pyqt = os.path.join(packages, "PyQt5")
+        paths += [os.path.join(pyqt, *name.split("/")) for name in PYQT_DATA]
+        paths += [path for path in glob.glob(os.path.join(pyqt, "Qt*.*"))
+                  if os.path.basename(path).split(".")[0] not in QT_MODULES]
+        paths += glob.glob(os.path.join(pyqt, "*.pyi"))
+    return paths
+
+
+def cold_start(python, portable):
+    """Seconds for the bundled interpreter to import the app without writing bytecode"""
+    env = dict(os.environ, PYTHONPATH=os.path.join(portable, "app"), PYTHONDONTWRITEBYTECODE="1",
+               QT_QPA_PLATFORM="offscreen")
+    started = time.monotonic()
+    subprocess.run([python, "-c", COLD_START_IMPORTS], env=env, check=True)
+    return time.monotonic() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Strip and precompile the portable tree.")
+    parser.add_argument("--portable", default=os.path.join(HERE, "VeDownloader-Portable"),
+                        help="portable tree to prepare (default: VeDownloader-Portable next to this script)")
+    args = parser.parse_args(argv)
+
+    portable = os.path.abspath(args.portable)
+    python = os.path.join(portable, "python", "bin", "python3")
+    if not os.path.isfile(python):
+        print(f"Error: no bundled interpreter at {python}")
+        return 1
+    compile_dirs = [os.path.join(portable, "app")] + site_packages(portable)
+
+    size_before = tree_size(portable)
+    # Bytecode already in the tree may be timestamp-based or from another
+    # Python version; it is all rebuilt below
+    caches = []
+    for top in compile_dirs:
+        caches += find_dirs(top, ("__pycache__",))
+    print(f"Removed {remove(caches)} bytecode caches.")
+    start_before = cold_start(python, portable)
+
+    print(f"Removed {remove(unused_paths(portable))} unused files and directories.")
+    print("Compiling...")
+    subprocess.run([python, "-m", "compileall", "-q", "-f", "-j", "0", "--invalidation-mode", "checked-hash"]
+                   + compile_dirs, check=True)
+
+    size_after = tree_size(portable)
+    start_after = cold_start(python, portable)
+    print(f"Size: {size_before / 1e6:.1f} MB -> {size_after / 1e6:.1f} MB")
+    print(f"Cold start: {start_before:.2f}s -> {start_after:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
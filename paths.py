@@ -0,0 +1,9 @@
+"""Location of VeDownloader's per-user files
+
+Kept out of engine.py, which imports yt-dlp, so the history, journal and
+archive modules load without it when the GUI starts.
+"""
+import os
+
+# Per-user data directory for the history database and other state
+DATA_DIR = os.path.join(os.path.expanduser("~"), ".vedownloader")
@@ -0,0 +1,123 @@
+"""Lazy expansion of playlists and channels into download jobs
+
+A DownloadJob that may expand playlists stops after extraction when its URL
+turns out to be a playlist or channel, and leaves an iterator over the entry
+URLs in job.entries. The extractor fetches the pages of the playlist only as
+that iterator is advanced.
+
+A PlaylistExpander walks the iterator on its own thread and passes each URL
+to a callback that queues it as a job of its own. It stays at most lookahead
+entries ahead of the downloads: every entry queued takes a slot, and the
+queue gives the slot back with release() once the entry starts or leaves the
+queue. So a 10,000 video channel starts downloading after its first page
+and only a few of its entries are held at a time.
+"""
+import threading
+
+# Entries queued ahead of the downloads for each playlist
+PLAYLIST_LOOKAHEAD = 10
+
+PLAYLIST_TYPES = ('playlist', 'multi_video')
+
+# Key of the extractor smuggled into an entry URL that only it can extract
+ENTRY_IE_KEY = 'vedownloader_ie_key'
+
+
+def is_playlist(info):
+    return bool(info) and info.get('_type') in PLAYLIST_TYPES
+
+
+def entry_url(entry):
+    """URL to download one playlist entry from, or None
+
+    Flat entries may hold only an id that their extractor's URL pattern
+    accepts (a bare YouTube video id, say), which no other extractor can
+    route. Unless they also have a webpage_url, their ie_key is smuggled into
+    the id the way yt-dlp passes data along with URLs, so it survives the
+    queue and the journal and split_entry_url can hand it back to
+    extract_info.
+    """
+    if not entry:
+        return None
+    if entry.get('_type') in ('url', 'url_transparent'):
+        url = entry.get('webpage_url') or entry.get('url')
+        if url and entry.get('ie_key') and '://' not in url:
+            from yt_dlp.utils import smuggle_url
+            url = smuggle_url(url, {ENTRY_IE_KEY: entry['ie_key']})
+        return url
+    return entry.get('webpage_url') or entry.get('original_url') or entry.get('url')
+
+
+def split_entry_url(url):
+    """The URL to extract and the ie_key entry_url smuggled into it, if any"""
+    if '#__youtubedl_smuggle=' not in url:
+        return url, None
+    from yt_dlp.utils import unsmuggle_url
+
+    plain, data = unsmuggle_url(url)
+    if not data or ENTRY_IE_KEY not in data:
+        # Smuggled by an extractor, which unsmuggles it itself
+        return url, None
+    return plain, data[ENTRY_IE_KEY]
+
+
+def iter_entry_urls(info):
+    """Yield the URL of every entry of a playlist as the extractor produces it"""
+    from yt_dlp.utils import PagedList
+
+    entries = info.get('entries') or ()
+    if isinstance(entries, PagedList):
+        # getslice() would fetch every page before returning; walk them instead
+        entries = entries._getslice(0, None)
+    for entry in entries:
+        url = entry_url(entry)
+        if url:
+            yield url
+
+
+class PlaylistExpander(threading.Thread):
+    """Feed the entries of a playlist to on_entry without running ahead
+
+    on_done is called with the expander when it stops: count entries were
+    queued, and error holds the message of an extraction error, if any.
+    """
+    def __init__(self, entries, on_entry, on_done=None, cancel_event=None, lookahead=PLAYLIST_LOOKAHEAD):
+        super().__init__(daemon=True)
+        self.entries = entries
+        self.on_entry = on_entry
+        self.on_done = on_done
+        self.cancel_event = cancel_event or threading.Event()
+        self.slots = threading.Semaphore(lookahead)
+        self.count = 0
+        self.error = None
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def release(self):
+        """Give back the slot of an entry that has started or left the queue"""
+        self.slots.release()
+
+    def run(self):
+        try:
+            for url in self.entries:
+                # Poll so a cancelled playlist stops while the queue is full
+                while not self.slots.acquire(timeout=0.5):
+                    if self.cancelled:
+                        return
+                if self.cancelled:
+                    return
+                self.on_entry(url)
+                self.count += 1
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            close = getattr(self.entries, 'close', None)
+            if close is not None:
+                close()
+            if self.on_done is not None:
+                self.on_done(self)
@@ -0,0 +1,163 @@
+"""Per-host concurrency caps, request spacing and backoff for download jobs
+
+Jobs are grouped by the site they download from. A HostScheduler lets at most
+max_per_host jobs of a site run at once and starts them at least min_interval
+seconds apart. When a job is turned away with HTTP 429 or 503, the site is
+left alone for an exponentially growing, jittered delay before its next job.
+Jobs for other sites are not held up by any of this: the queues ask pick()
+for the first job whose site is ready.
+"""
+import ipaddress
+import random
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+# Messages yt-dlp gives for responses that mean "slow down"
+THROTTLED_PATTERN = re.compile(r"HTTP Error (429|503)\b")
+
+# Times a throttled job is put back in the queue before it fails
+MAX_THROTTLE_RETRIES = 5
+
+
+# Second-level labels under which country-code domains register sites, as in
+# example.co.uk or example.com.au
+COUNTRY_SECOND_LEVELS = frozenset({
+    "ac", "co", "com", "edu", "go", "gob", "gov", "ltd", "mil", "ne", "net", "nic", "nom", "or", "org",
+    "plc", "sch",
+})
+
+# Domains under which unrelated sites are hosted, one per subdomain
+SHARED_SUFFIXES = frozenset({
+    "appspot.com", "azurewebsites.net", "blogspot.com", "cloudfront.net", "firebaseapp.com", "github.io",
+    "gitlab.io", "herokuapp.com", "netlify.app", "pages.dev", "s3.amazonaws.com", "vercel.app", "web.app",
+    "workers.dev",
+})
+
+
+def host_key(url):
+    """Site a URL belongs to: its host name from the label before the public suffix
+
+    www.youtube.com, m.youtube.com and youtube.com share a key, so they share
+    a cap, while news.bbc.co.uk is bbc.co.uk and every user.github.io is a
+    site of its own. The suffixes are the common ones of the Public Suffix
+    List: top-level domains, second levels of country codes such as co.uk,
+    and SHARED_SUFFIXES.
+    """
+    host = (urlsplit(url.strip()).hostname or "").lower().rstrip(".")
+    try:
+        ipaddress.ip_address(host)
+        return host
+    except ValueError:
+        pass
+    labels = host.split(".")
+    suffix = 1
+    for length in (3, 2):
+        if ".".join(labels[-length:]) in SHARED_SUFFIXES:
+            suffix = length
+            break
+    else:
+        if len(labels) > 2 and len(labels[-1]) == 2 and labels[-2] in COUNTRY_SECOND_LEVELS:
+            suffix = 2
+    return ".".join(labels[-suffix - 1:])
+
+
+def is_throttled(message):
+    """Whether a job failure message reports HTTP 429 or 503"""
+    return bool(message) and THROTTLED_PATTERN.search(message) is not None
+
+
+class HostScheduler:
+    """Thread-safe per-host start gate
+
+    Call try_start() before running a job for a host and finish() once it is
+    done; acquire() is the blocking form of try_start() for worker threads.
+    """
+    def __init__(self, max_per_host=2, min_interval=1.0, base_backoff=2.0, max_backoff=300.0):
+        self.max_per_host = max_per_host
+        self.min_interval = min_interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.condition = threading.Condition()
+        self.running = {}
+        self.last_start = {}
+        self.blocked_until = {}
+        self.strikes = {}
+
+    def wait_time(self, key, now=None):
+        """Seconds until a job for key may start, or None while the host is at its cap"""
+        now = time.monotonic() if now is None else now
+        with self.condition:
+            if self.running.get(key, 0) >= self.max_per_host:
+                return None
+            ready_at = max(self.last_start.get(key, float("-inf")) + self.min_interval,
+                           self.blocked_until.get(key, float("-inf")))
+            return max(0.0, ready_at - now)
+
+    def try_start(self, key, now=None):
+        """Claim a slot for key if one is free right now"""
+        now = time.monotonic() if now is None else now
+        with self.condition:
+            if self.wait_time(key, now) != 0:
+                return False
+            self.running[key] = self.running.get(key, 0) + 1
+            self.last_start[key] = now
+            return True
+
+    def acquire(self, key, cancel_event=None):
+        """Block until a slot for key is free and claim it
+
+        Returns False if cancel_event was set while waiting.
+        """
+        with self.condition:
+            while not self.try_start(key):
+                if cancel_event is not None and cancel_event.is_set():
+                    return False
+                delay = self.wait_time(key)
+                # A full host is woken by finish(); poll for cancellation anyway
+                self.condition.wait(1.0 if delay is None else min(delay, 1.0))
+            return True
+
+    def finish(self, key, throttled=False):
+        """Release the slot of a job for key; throttled jobs start a backoff
+
+        Returns the backoff delay in seconds, or 0.
+        """
+        with self.condition:
+            self.running[key] = max(0, self.running.get(key, 0) - 1)
+            delay = 0
+            if throttled:
+                strikes = self.strikes.get(key, 0)
+                self.strikes[key] = strikes + 1
+                delay = min(self.max_backoff, self.base_backoff * 2 ** strikes) * random.uniform(0.5, 1.5)
+                self.blocked_until[key] = time.monotonic() + delay
+            else:
+                self.strikes.pop(key, None)
+            self.condition.notify_all()
+            return delay
+
+    def pick(self, keys, now=None):
+        """Index of the first key whose host can start a job now, or None
+
+        The second value is the seconds until one of them may become ready,
+        or None if they all wait for running jobs to finish.
+        """
+        now = time.monotonic() if now is None else now
+        soonest = None
+        with self.condition:
+            for index, key in enumerate(keys):
+                delay = self.wait_time(key, now)
+                if delay == 0:
+                    return index, 0
+                if delay is not None and (soonest is None or delay < soonest):
+                    soonest = delay
+        return None, soonest
+
+    def stats(self):
+        now = time.monotonic()
+        with self.condition:
+            return {key: {"running": self.running.get(key, 0),
+                          "strikes": self.strikes.get(key, 0),
+                          "blocked_for": round(max(0.0, until - now), 1)}
+                    for key, until in {**{k: 0 for k in self.running}, **self.blocked_until}.items()}
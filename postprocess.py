@@ -0,0 +1,74 @@
+"""Post-processing stage shared by every job in the process
+
+Merging formats, extracting audio and the other FFmpeg steps are CPU-bound,
+while the download before them waits on the network. A job that reaches
+post-processing hands back its download slot (see DownloadJob's
+on_downloaded) and takes a slot of this stage instead. The stage has one
+slot per CPU core by default. Downloads carry on at full concurrency while
+the cores work through finished files, and jobs that find the stage full
+wait in its queue.
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+
+def default_workers():
+    return max(1, os.cpu_count() or 1)
+
+
+class PostProcessStage:
+    """Counting gate for post-processing, with the depth of its queue"""
+    def __init__(self, workers=None):
+        self.workers = workers or default_workers()
+        self.active = 0
+        self.waiting = 0
+        self.condition = threading.Condition()
+
+    @contextmanager
+    def slot(self, cancel_event=None, message=None):
+        """Hold a post-processing slot for the body of the with statement
+
+        Raises DownloadCancelled if cancel_event is set while waiting.
+        """
+        with self.condition:
+            self.waiting += 1
+            try:
+                while self.active >= self.workers:
+                    if cancel_event is not None and cancel_event.is_set():
+                        from yt_dlp.utils import DownloadCancelled
+
+                        raise DownloadCancelled(message)
+                    # Woken by a finished job; poll for cancellation anyway
+                    self.condition.wait(0.5)
+            finally:
+                self.waiting -= 1
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.active -= 1
+                self.condition.notify()
+
+    def set_workers(self, workers):
+        with self.condition:
+            self.workers = max(1, workers)
+            self.condition.notify_all()
+
+    def stats(self):
+        with self.condition:
+            return {"workers": self.workers, "active": self.active, "waiting": self.waiting}
+
+
+_shared_stage = None
+_shared_lock = threading.Lock()
+
+
+def get_postprocess_stage():
+    """Post-processing stage shared by every job in this process"""
+    global _shared_stage
+    with _shared_lock:
+        if _shared_stage is None:
+            _shared_stage = PostProcessStage()
+        return _shared_stage
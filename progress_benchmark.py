@@ -0,0 +1,168 @@
+"""Progress signals sent to the GUI thread, and its event-loop latency, during downloads
+
+Serves files from memory as fast as a local HTTP server can and downloads
+--jobs of them at once on QThreads, the way the GUI's DownloadThread does,
+each updating a progress bar and a label on the GUI thread through queued
+signals. Every --rate value is measured in turn; rate 0 sends an update for
+every chunk yt-dlp writes, as ProgressHook did before it was throttled.
+
+While the downloads run, a timer on the GUI thread fires every --tick
+milliseconds; how late it fires is the event-loop latency the user sees as
+a stuttering window.
+
+Example:
+    python progress_benchmark.py --offscreen
+    python progress_benchmark.py --offscreen --jobs 8 --size 200 --rate 0 --rate 10 --rate 30
+"""
+import argparse
+import http.server
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class FileServer(http.server.ThreadingHTTPServer):
+    """Serves size bytes for any path, without pausing"""
+    daemon_threads = True
+
+    def __init__(self, size):
+        super().__init__(("127.0.0.1", 0), FileHandler)
+        self.size = size
+        self.chunk = bytes(CHUNK_SIZE)
+        self.base_url = f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class FileHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        size = self.server.size
+        self.send_response(200)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        try:
+            for pos in range(0, size, CHUNK_SIZE):
+                self.wfile.write(self.server.chunk[:min(CHUNK_SIZE, size - pos)])
+        except OSError:
+            pass
+
+
+def measure(app, server, output_dir, jobs, rate, tick):
+    """Signals received on the GUI thread and its timer lateness in seconds, for one run"""
+    from PyQt5.QtCore import QThread, QTimer, pyqtSignal
+    from PyQt5.QtWidgets import QLabel, QProgressBar, QVBoxLayout, QWidget
+
+    from engine import DownloadJob
+
+    class JobThread(QThread):
+        progress_signal = pyqtSignal(int)
+        status_signal = pyqtSignal(str)
+
+        def __init__(self, url, job_dir):
+            super().__init__()
+            self.job = DownloadJob(url, job_dir, format_option="auto", on_progress=self.progress_signal.emit,
+                                   on_status=self.status_signal.emit, progress_rate=rate)
+
+        def run(self):
+            self.result = self.job.run()
+
+    window = QWidget()
+    layout = QVBoxLayout(window)
+    counts = {"progress": 0, "status": 0}
+    threads = []
+    for index in range(jobs):
+        bar = QProgressBar()
+        label = QLabel()
+        layout.addWidget(bar)
+        layout.addWidget(label)
+        thread = JobThread(f"{server.base_url}/file{index}.mp4", output_dir)
+
+        def on_progress(value, bar=bar):
+            counts["progress"] += 1
+            bar.setValue(value)
+
+        def on_status(message, label=label):
+            counts["status"] += 1
+            label.setText(message)
+
+        thread.progress_signal.connect(on_progress)
+        thread.status_signal.connect(on_status)
+        threads.append(thread)
+    window.show()
+
+    lateness = []
+    last = [time.monotonic()]
+
+    def on_tick():
+        now = time.monotonic()
+        lateness.append(max(0.0, now - last[0] - tick))
+        last[0] = now
+        if all(thread.isFinished() for thread in threads):
+            timer.stop()
+            app.quit()
+
+    timer = QTimer()
+    timer.timeout.connect(on_tick)
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    timer.start(int(tick * 1000))
+    app.exec_()
+    seconds = time.monotonic() - started
+    window.close()
+    succeeded = all(thread.result[0] for thread in threads)
+    return seconds, counts, lateness, succeeded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count progress signals and measure GUI event-loop latency.")
+    parser.add_argument("--jobs", type=int, default=4, help="downloads run at once (default: 4)")
+    parser.add_argument("--size", type=int, default=100, help="megabytes per download (default: 100)")
+    parser.add_argument("--rate", type=int, action="append", default=[],
+                        help="progress updates per second and job; 0 for every chunk; "
+                             "may be given more than once (default: 0 and 10)")
+    parser.add_argument("--tick", type=float, default=10, help="timer interval in milliseconds (default: 10)")
+    parser.add_argument("--offscreen", action="store_true", help="use Qt's offscreen platform, for machines without a display")
+    args = parser.parse_args(argv)
+
+    if args.offscreen:
+        os.environ["QT_QPA_PLATFORM"] = "offscreen"
+    from PyQt5.QtWidgets import QApplication
+
+    app = QApplication(sys.argv[:1])
+    # Load yt-dlp and its extractor index first, so the first run does not
+    # pay for them
+    from extractor_index import get_extractor_index
+    get_extractor_index()
+    server = FileServer(args.size * 1024 * 1024)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    passed = True
+    try:
+        with tempfile.TemporaryDirectory() as output_dir:
+            for rate in args.rate or [0, 10]:
+                # A directory per run, so no run finds the files of another
+                seconds, counts, lateness, succeeded = measure(app, server, tempfile.mkdtemp(dir=output_dir),
+                                                               args.jobs, rate, args.tick / 1000)
+                lateness_ms = sorted(value * 1000 for value in lateness) or [0.0]
+                p99 = lateness_ms[min(len(lateness_ms) - 1, int(len(lateness_ms) * 0.99))]
+                print(f"rate={rate}: {seconds:.2f}s, {counts['progress']} progress and {counts['status']} "
+                      f"status signals, timer late by median {statistics.median(lateness_ms):.1f} ms, "
+                      f"p99 {p99:.1f} ms, max {lateness_ms[-1]:.1f} ms{'' if succeeded else ' (FAILED)'}")
+                passed = passed and succeeded
+    finally:
+        server.shutdown()
+        server.server_close()
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
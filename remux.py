@@ -0,0 +1,197 @@
+"""Stream copy or re-encode: fitting downloaded streams to the output format
+
+Re-encoding a video takes minutes of CPU time, while copying its streams
+into another container takes seconds and loses nothing. The matrix below
+lists the codecs each output format holds as they are. plan() looks at the
+streams yt-dlp selected and tells which of them fit the target. The path is
+COPY when all of them do, so FFmpeg only remuxes (or merges) them, and
+TRANSCODE otherwise; FitContainerPP then re-encodes only the streams that do
+not fit and copies the rest.
+
+MP4 files get their index (the moov atom) at the start so players can begin
+before the whole file is there. FFmpeg's faststart flag, which yt-dlp passes
+to every FFmpeg run, writes the file and then rewrites all of it to move the
+index forward. faststart_args() instead reserves room for the index at the
+start of the file, so it is written once, in the same pass as the merge or
+conversion. The room is estimated from the duration and frame rate, and a
+run that outgrows it is repeated with faststart.
+"""
+from yt_dlp.postprocessor.ffmpeg import FFmpegPostProcessor, FFmpegVideoConvertorPP
+from yt_dlp.utils import PostProcessingError
+
+COPY = "copy"
+TRANSCODE = "transcode"
+
+# Codec families each output format holds without re-encoding; None is any.
+# Audio formats take any video, as extracting the audio drops it.
+CONTAINER_CODECS = {
+    "mp4": {"video": {"h264", "h265", "av1", "vp9", "mpeg4"},
+            "audio": {"aac", "mp3", "ac3", "eac3", "alac"}},
+    "mkv": {"video": None, "audio": None},
+    "webm": {"video": {"vp8", "vp9", "av1"}, "audio": {"opus", "vorbis"}},
+    "mp3": {"video": None, "audio": {"mp3"}},
+    "aac": {"video": None, "audio": {"aac"}},
+}
+
+# Prefixes of the codec strings extractors report, by family
+CODEC_FAMILIES = [
+    (("avc", "h264"), "h264"),
+    (("hvc", "hev", "h265", "hevc"), "h265"),
+    (("av01", "av1"), "av1"),
+    (("vp09", "vp9"), "vp9"),
+    (("vp08", "vp8"), "vp8"),
+    (("mp4v",), "mpeg4"),
+    (("mp4a", "aac"), "aac"),
+    (("mp3",), "mp3"),
+    (("opus",), "opus"),
+    (("vorbis",), "vorbis"),
+    (("ac-3", "ac3"), "ac3"),
+    (("ec-3", "eac3"), "eac3"),
+    (("alac",), "alac"),
+    (("flac",), "flac"),
+]
+
+# Codecs assumed for formats whose codecs the extractor did not report
+EXT_CODECS = {
+    "mp4": ("h264", "aac"),
+    "m4v": ("h264", None),
+    "m4a": (None, "aac"),
+    "webm": ("vp9", "opus"),
+    "mp3": (None, "mp3"),
+    "ogg": (None, "vorbis"),
+    "opus": (None, "opus"),
+}
+
+# How MP4 output gets its index to the start: reserved room, or a rewrite
+FASTSTART_RESERVE = "reserve"
+FASTSTART_REWRITE = "rewrite"
+
+# Room reserved for the index: a fixed part plus an upper bound per frame or
+# audio packet (sample size, chunk offset, timing and keyframe entries)
+MOOV_BASE_BYTES = 32 * 1024
+MOOV_BYTES_PER_SAMPLE = 24
+
+# Assumed when a format does not report its frame rate
+DEFAULT_FPS = 60
+
+# AAC and Opus both stay under this many packets per second
+AUDIO_PACKETS_PER_SECOND = 50
+
+# Format selection for audio-only downloads: a source already in the target
+# codec is copied, so it is preferred over one that has to be re-encoded
+AUDIO_FORMATS = {
+    "mp3": "bestaudio[acodec^=mp3]/bestaudio/best",
+    "aac": "bestaudio[acodec^=mp4a]/bestaudio[acodec=aac]/bestaudio/best",
+}
+
+
+def codec_family(codec):
+    """Family of a codec string such as "avc1.64001F", or None for "none" or unknown"""
+    codec = (codec or "").lower()
+    if not codec or codec == "none":
+        return None
+    for prefixes, family in CODEC_FAMILIES:
+        if codec.startswith(prefixes):
+            return family
+    return codec.split(".")[0]
+
+
+def stream_codecs(fmt):
+    """(video family, audio family) of a format dict; None where it has no such stream"""
+    guess = EXT_CODECS.get(fmt.get("ext"), (None, None))
+    codecs = []
+    for key, guessed in zip(("vcodec", "acodec"), guess):
+        codec = fmt.get(key)
+        if codec == "none":
+            codecs.append(None)
+        elif codec:
+            codecs.append(codec_family(codec))
+        else:
+            codecs.append(guessed)
+    return tuple(codecs)
+
+
+def plan(target, formats):
+    """Which streams of the selected formats can be copied into the target format
+
+    Returns {"video": bool, "audio": bool}; a kind of stream the formats do
+    not have counts as copied.
+    """
+    allowed = CONTAINER_CODECS[target]
+    copies = {"video": True, "audio": True}
+    for fmt in formats:
+        for kind, codec in zip(("video", "audio"), stream_codecs(fmt)):
+            if codec is not None and allowed[kind] is not None and codec not in allowed[kind]:
+                copies[kind] = False
+    return copies
+
+
+def conversion_path(copies):
+    return COPY if all(copies.values()) else TRANSCODE
+
+
+def describe(target, copies):
+    """Status text for the conversion to the target format"""
+    if all(copies.values()):
+        return f"{target.upper()} by stream copy, without re-encoding"
+    if target in ("mp3", "aac") or not any(copies.values()):
+        return f"{target.upper()} by re-encoding"
+    copied, encoded = ("video", "audio") if copies["video"] else ("audio", "video")
+    return f"{target.upper()} by re-encoding the {encoded} and copying the {copied}"
+
+
+def moov_reserve(duration, formats):
+    """Bytes to reserve for the index of an MP4 of the given formats, or None if unknown"""
+    if not duration:
+        return None
+    samples = 0
+    for fmt in formats:
+        video, audio = stream_codecs(fmt)
+        if video is not None:
+            samples += duration * (fmt.get("fps") or DEFAULT_FPS)
+        if audio is not None:
+            samples += duration * AUDIO_PACKETS_PER_SECOND
+    return int(MOOV_BASE_BYTES + samples * MOOV_BYTES_PER_SAMPLE)
+
+
+def faststart_args(reserve):
+    """FFmpeg output options that write the MP4 index into reserve bytes at the start"""
+    # The later -movflags replaces the +faststart yt-dlp adds, which would
+    # otherwise rewrite the file anyway
+    return ["-movflags", "-faststart", "-moov_size", str(reserve)]
+
+
+class FitContainerPP(FFmpegVideoConvertorPP):
+    """Convert to the target format, copying the streams that fit it
+
+    With reserve, MP4 output gets its index in one pass (see faststart_args).
+    """
+    def __init__(self, downloader, target, copies, reserve=None):
+        super().__init__(downloader, target)
+        self.copies = copies
+        self.reserve = reserve
+        self._ACTION = "remuxing" if all(copies.values()) else "converting"
+
+    def _options(self, target_ext):
+        yield from FFmpegPostProcessor.stream_copy_opts(False, ext=target_ext)
+        if self.copies["video"]:
+            yield from ("-c:v", "copy")
+        if self.copies["audio"]:
+            yield from ("-c:a", "copy")
+
+    def _configuration_args(self, exe, keys=None, *args, **kwargs):
+        configured = super()._configuration_args(exe, keys, *args, **kwargs)
+        if self.reserve and self.mapping == "mp4" and keys and "" in keys:
+            # Options of the output file, which follow yt-dlp's +faststart
+            configured = [*configured, *faststart_args(self.reserve)]
+        return configured
+
+    def run(self, info):
+        try:
+            return super().run(info)
+        except PostProcessingError:
+            if not self.reserve:
+                raise
+            # The index outgrew the room reserved for it
+            self.reserve = None
+            return super().run(info)
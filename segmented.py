@@ -0,0 +1,275 @@
+"""Multi-connection HTTP downloader for large progressive formats
+
+yt-dlp's HttpFD fetches a file over a single connection, which CDNs that
+throttle each connection hold far below the link speed. SegmentedHttpFD
+splits the file into byte ranges, fetches them over several connections at
+once and writes each range at its offset in a preallocated .part file. When a
+connection runs out of work it takes over half of the largest range left, so
+all connections stay busy until the end.
+
+Each connection charges what it reads to the job's share of the global
+bandwidth limit ('bandwidth_share', see bandwidth.py) before reading more.
+Progress is reported through the usual progress hooks as a single download,
+and the position of every range is saved next to the .part file, so an
+interrupted download carries on where each range stopped.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from yt_dlp.downloader.http import HttpFD
+from yt_dlp.networking import Request
+from yt_dlp.networking.exceptions import HTTPError, TransportError
+from yt_dlp.utils import determine_protocol, parse_http_range
+
+# Ranges are never split below this size
+MIN_SEGMENT_SIZE = 1024 * 1024
+
+CHUNK_SIZE = 256 * 1024
+
+# Seconds between progress reports and between saves of the range state
+PROGRESS_INTERVAL = 0.1
+SAVE_INTERVAL = 1.0
+
+
+def segments_path(tmpfilename):
+    """Where the position of every range of a .part file is saved"""
+    return tmpfilename + '.segments'
+
+
+def has_segment_state(ydl, filename):
+    """Whether an interrupted segmented download of filename can be resumed
+
+    Its .part file is preallocated to the full size, so only SegmentedHttpFD
+    knows which parts of it hold data.
+    """
+    return os.path.isfile(segments_path(HttpFD(ydl, ydl.params).temp_name(filename)))
+
+
+def can_segment(info):
+    """Whether a format is a plain HTTP(S) file that could be fetched in ranges"""
+    return (determine_protocol(info) in ('http', 'https')
+            and not info.get('is_live')
+            and not info.get('request_data'))
+
+
+class SegmentedHttpFD(HttpFD):
+    """HttpFD that fetches byte ranges of a file over several connections
+
+    Servers that do not answer range requests, and files too small to be
+    worth splitting, are downloaded by HttpFD as usual.
+    """
+    FD_NAME = 'segmented'
+
+    def __init__(self, ydl, params, connections=4):
+        super().__init__(ydl, params)
+        self.connections = connections
+
+    def real_download(self, filename, info_dict):
+        url = info_dict['url']
+        headers = dict(info_dict.get('http_headers') or {})
+        size = self._probe_size(url, headers)
+        tmpfilename = self.temp_name(filename)
+        state_path = segments_path(tmpfilename)
+        if not size or size < 2 * MIN_SEGMENT_SIZE:
+            if os.path.isfile(state_path):
+                # HttpFD would take the preallocated file for a partial one
+                # written from the start, holes and all
+                self.to_screen('[download] Discarding the ranges of an earlier segmented download')
+                for path in (tmpfilename, state_path):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+            return super().real_download(filename, info_dict)
+
+        ranges = self._load_ranges(tmpfilename, state_path, size)
+        self.report_destination(filename)
+
+        # Preallocate so every range can be written at its offset, and save
+        # the ranges first, so the file is never left without them
+        with open(tmpfilename, 'ab'):
+            pass
+        with open(tmpfilename, 'r+b') as part_file:
+            part_file.truncate(size)
+        lock = threading.Lock()
+        self._save_ranges(state_path, size, ranges, lock)
+
+        active = set()
+        stop = threading.Event()
+
+        def remaining():
+            with lock:
+                return sum(max(0, end - pos) for pos, end in ranges)
+
+        def claim():
+            # Take a range nobody is fetching, or split the largest busy one
+            with lock:
+                for index, (pos, end) in enumerate(ranges):
+                    if pos < end and index not in active:
+                        active.add(index)
+                        return index
+                busy = [index for index in active if ranges[index][1] - ranges[index][0] >= 2 * MIN_SEGMENT_SIZE]
+                if not busy:
+                    return None
+                index = max(busy, key=lambda i: ranges[i][1] - ranges[i][0])
+                pos, end = ranges[index]
+                middle = pos + (end - pos) // 2
+                ranges[index][1] = middle
+                ranges.append([middle, end])
+                active.add(len(ranges) - 1)
+                return len(ranges) - 1
+
+        def worker():
+            while not stop.is_set():
+                index = claim()
+                if index is None:
+                    return
+                try:
+                    self._fetch_range(url, headers, tmpfilename, ranges[index], lock, stop)
+                finally:
+                    with lock:
+                        active.discard(index)
+
+        start_time = time.time()
+        start_remaining = remaining()
+        last_save = start_time
+        with ThreadPoolExecutor(max_workers=self.connections) as pool:
+            futures = [pool.submit(worker) for _ in range(self.connections)]
+            try:
+                while True:
+                    done, not_done = wait(futures, timeout=PROGRESS_INTERVAL)
+                    for future in done:
+                        # Re-raise the error of a connection that gave up
+                        future.result()
+                    left = remaining()
+                    now = time.time()
+                    speed = self.calc_speed(start_time, now, start_remaining - left)
+                    self._hook_progress({
+                        'status': 'downloading',
+                        'downloaded_bytes': size - left,
+                        'total_bytes': size,
+                        'filename': filename,
+                        'tmpfilename': tmpfilename,
+                        'elapsed': now - start_time,
+                        'speed': speed,
+                        'eta': self.calc_eta(speed, left),
+                        'bandwidth_applied': True,
+                    }, info_dict)
+                    if not not_done:
+                        break
+                    if now - last_save >= SAVE_INTERVAL:
+                        last_save = now
+                        self._save_ranges(state_path, size, ranges, lock)
+            except BaseException:
+                # Also reached when a progress hook cancels the download
+                stop.set()
+                wait(futures)
+                self._save_ranges(state_path, size, ranges, lock)
+                raise
+
+        if remaining():
+            self._save_ranges(state_path, size, ranges, lock)
+            self.report_error('unable to download every range of the file')
+            return False
+
+        try:
+            os.remove(state_path)
+        except FileNotFoundError:
+            pass
+        self.try_rename(tmpfilename, filename)
+        self._hook_progress({
+            'status': 'finished',
+            'downloaded_bytes': size,
+            'total_bytes': size,
+            'filename': filename,
+            'elapsed': time.time() - start_time,
+        }, info_dict)
+        return True
+
+    def _probe_size(self, url, headers):
+        """Return the file size if the server answers range requests, else None"""
+        try:
+            with self.ydl.urlopen(Request(url, None, {**headers, 'Range': 'bytes=0-0'})) as response:
+                if response.status != 206:
+                    return None
+                return parse_http_range(response.headers.get('Content-Range'))[2]
+        except (HTTPError, TransportError):
+            return None
+
+    def _load_ranges(self, tmpfilename, state_path, size):
+        """Ranges still to fetch, as [position, end) lists"""
+        start = 0
+        if self.params.get('continuedl', True) and os.path.isfile(tmpfilename):
+            if os.path.isfile(state_path):
+                try:
+                    with open(state_path, encoding='utf-8') as state_file:
+                        state = json.load(state_file)
+                    if state['size'] == size:
+                        return state['ranges']
+                except (OSError, ValueError, KeyError):
+                    pass
+                # Preallocated for a file that has changed since, or
+                # unreadable: nothing in it can be trusted
+            else:
+                start = os.path.getsize(tmpfilename)
+                if start >= size:
+                    start = 0
+                elif start:
+                    # Left by a single-connection download, which writes from the start
+                    self.report_resuming_byte(start)
+        step = max(MIN_SEGMENT_SIZE, -(-(size - start) // self.connections))
+        return [[pos, min(pos + step, size)] for pos in range(start, size, step)]
+
+    @staticmethod
+    def _save_ranges(state_path, size, ranges, lock):
+        with lock:
+            state = {'size': size, 'ranges': [list(r) for r in ranges if r[0] < r[1]]}
+        with open(state_path, 'w', encoding='utf-8') as state_file:
+            json.dump(state, state_file)
+
+    def _fetch_range(self, url, headers, tmpfilename, rng, lock, stop):
+        """Fetch one range, reconnecting from where it stopped on errors
+
+        rng is shared with the other connections: its end may be moved down
+        while it is fetched when another connection takes over part of it.
+        """
+        retries = self.params.get('retries', 10)
+        bandwidth = self.params.get('bandwidth_share')
+        attempt = 0
+        while True:
+            with lock:
+                pos, end = rng
+            if pos >= end or stop.is_set():
+                return
+            request = Request(url, None, {**headers, 'Range': f'bytes={pos}-{end - 1}'})
+            try:
+                with self.ydl.urlopen(request) as response, open(tmpfilename, 'r+b') as part_file:
+                    if response.status != 206:
+                        raise TransportError('server ignored the range request')
+                    part_file.seek(pos)
+                    while not stop.is_set():
+                        with lock:
+                            left = rng[1] - rng[0]
+                        if left <= 0:
+                            return
+                        data = response.read(min(CHUNK_SIZE, left))
+                        if not data:
+                            raise TransportError('connection closed before the range was complete')
+                        part_file.write(data)
+                        with lock:
+                            rng[0] += len(data)
+                        attempt = 0
+                        if bandwidth is not None:
+                            bandwidth.consume(len(data), stop)
+                    return
+            except (HTTPError, TransportError) as err:
+                if isinstance(err, HTTPError) and err.status < 500 and err.status != 429:
+                    raise
+                attempt += 1
+                if attempt > retries:
+                    raise
+                self.report_retry(err, attempt, retries)
+                time.sleep(min(2 ** attempt, 30) / 10)
@@ -0,0 +1,559 @@
+"""Local HTTP job-submission service for VeDownloader
+
+Runs the same download engine as the GUI behind a small JSON API:
+
+    POST   /jobs          submit {"url": ...} or {"urls": [...]}, plus optional
+                          output_dir, quality, format, subtitles, connections,
+                          fragments, priority (low, normal or high share of the
+                          bandwidth limit), playlist (false to download only the
+                          video of a URL that also names a playlist) and
+                          redownload (ignore the download archive)
+    GET    /jobs          list jobs (optional ?state=queued|running|finished|failed|cancelled)
+    GET    /jobs/<id>     status of one job
+    DELETE /jobs/<id>     cancel a job
+    GET    /events        Server-Sent Events stream of job updates (optional ?job=<id>)
+    GET    /stats         queue, post-processing, connection budget, bandwidth, auto-tuning
+                          and info cache counters
+
+Jobs are queued in a bounded queue and run by a fixed pool of workers. When
+the queue is full, submissions are rejected with 429 so clients can back off.
+Only the last keep_finished finished, failed or cancelled jobs are kept for
+GET /jobs; older ones are forgotten.
+Workers take the oldest job whose site is not at its per-host cap or backing
+off after a 429/503 (see politeness.py); throttled jobs go back in the queue.
+Queued and running jobs are kept in a job journal, so the ones interrupted by
+a restart are queued again when the service starts. With auto-tuning, the
+number of workers is the upper bound and a ConcurrencyTuner decides how many
+of them run jobs at a time. A worker is free for the next job as soon as its
+job's download is done; merging and conversion then wait for the shared
+post-processing stage (see postprocess.py).
+
+A playlist or channel URL becomes a job that frees its worker once the
+playlist is extracted and then queues its entries, with the same options, a
+few at a time as the downloads catch up (see playlist.py).
+"""
+import asyncio
+import itertools
+import json
+import os
+import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+from archive import get_download_archive
+from autotune import ConcurrencyTuner
+from bandwidth import PRIORITY_WEIGHTS, get_bandwidth_limiter
+from budget import get_connection_budget
+from engine import CANCELLED_MESSAGE, DownloadJob
+from info_cache import get_info_cache
+from journal import JobJournal
+from playlist import PlaylistExpander
+from postprocess import get_postprocess_stage
+from politeness import HostScheduler, MAX_THROTTLE_RETRIES, host_key, is_throttled
+
+REASONS = {
+    200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 409: "Conflict", 429: "Too Many Requests",
+}
+
+
+def positive_int(value):
+    """value as a count of at least 1, from a JSON number or string, or None"""
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        return None
+    try:
+        count = int(value)
+    except ValueError:
+        return None
+    return count if count >= 1 else None
+
+
+class ServiceJob:
+    """Bookkeeping for a job submitted to the service"""
+    def __init__(self, job_id, url, output_dir, quality, format_option, subtitles, archive=None,
+                 format_id=None, journal_id=None, connections=1, fragments=4, priority="normal",
+                 playlist=False):
+        self.id = job_id
+        self.journal_id = journal_id
+        # Options the job was submitted with, passed on to playlist entries
+        self.options = None
+        # Expander of the playlist this job is a queued entry of
+        self.feed = None
+        # Entries queued by a playlist job
+        self.entries = 0
+        self.host = host_key(url)
+        self.retries = 0
+        self.state = "queued"
+        self.progress = 0
+        self.status = "Queued"
+        self.message = ""
+        self.submitted = time.time()
+        self.finished = None
+        self.job = DownloadJob(url, output_dir, quality, format_option, subtitles,
+                               archive=archive, info_cache=get_info_cache(), format_id=format_id,
+                               connections=connections, fragments=fragments,
+                               budget=get_connection_budget(),
+                               bandwidth=get_bandwidth_limiter().share(PRIORITY_WEIGHTS[priority]),
+                               expand_playlists=playlist,
+                               postprocess=get_postprocess_stage())
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "url": self.job.url,
+            "state": self.state,
+            "progress": self.progress,
+            "status": self.status,
+            "message": self.message,
+            "submitted": self.submitted,
+            "finished": self.finished,
+            "entries": self.entries,
+            "result": self.job.result.to_dict() if self.job.result else None,
+        }
+
+
+class DownloadService:
+    """Bounded job queue served over HTTP"""
+    def __init__(self, output_dir, workers=3, queue_size=1000, journal=None, tuner=None, hosts=None,
+                 keep_finished=1000):
+        self.output_dir = output_dir
+        self.workers = workers
+        self.queue_size = queue_size
+        self.keep_finished = keep_finished
+        self.journal = journal
+        self.tuner = tuner
+        self.hosts = hosts or HostScheduler()
+        self.running = 0
+        self.queue = deque()
+        self.jobs = {}
+        # Ids of the jobs in self.jobs that are done, oldest first
+        self.finished_ids = OrderedDict()
+        # Entries already active are not queued again when a playlist is resumed
+        self.active_urls = Counter()
+        self.subscribers = set()
+        self._ids = itertools.count(1)
+        # Jobs keep their thread through post-processing. Threads beyond one per
+        # worker and post-processing slot only buffer finished downloads, so a
+        # full stage holds back new downloads rather than piling them up.
+        self._executor = ThreadPoolExecutor(max_workers=2 * workers + get_postprocess_stage().workers)
+
+    async def start(self, host, port):
+        self.loop = asyncio.get_running_loop()
+        # Signalled whenever a job may have become ready to start
+        self.wakeup = asyncio.Condition()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if self.tuner is not None:
+            get_connection_budget().set_limit(self.tuner.connections)
+            self._tuning = asyncio.create_task(self._tune())
+        self.resume_unfinished()
+        return await asyncio.start_server(self._handle_connection, host, port)
+
+    # -- Jobs ---------------------------------------------------------------
+
+    def submit(self, specs):
+        """Queue a batch of job specs, or none of them if they do not all fit"""
+        # Only enforced here, so jobs resumed from the journal are never turned away
+        if len(self.queue) + len(specs) > self.queue_size:
+            return None
+        jobs = []
+        for spec in specs:
+            options = {
+                "output_dir": spec.get("output_dir", self.output_dir),
+                "quality": spec.get("quality", "best"),
+                "format": spec.get("format", "mp4"),
+                "subtitles": bool(spec.get("subtitles", False)),
+                "archive": not spec.get("redownload"),
+                "connections": spec.get("connections", 1),
+                "fragments": spec.get("fragments", 4),
+                "priority": spec.get("priority", "normal"),
+                "playlist": bool(spec.get("playlist", True)),
+            }
+            journal_id = self.journal.add(spec["url"], options) if self.journal is not None else None
+            jobs.append(self._enqueue(spec["url"], options, journal_id=journal_id))
+        return jobs
+
+    def resume_unfinished(self):
+        """Queue the jobs a previous run left in the journal"""
+        if self.journal is None:
+            return []
+        return [self._enqueue(entry["url"], entry["options"], entry["format_id"], entry["id"], entry["part_path"])
+                for entry in self.journal.unfinished()]
+
+    def _enqueue(self, url, options, format_id=None, journal_id=None, part_path=None):
+        job = ServiceJob(
+            next(self._ids), url, options["output_dir"], options["quality"], options["format"],
+            options["subtitles"], get_download_archive() if options["archive"] else None,
+            format_id, journal_id, options.get("connections", 1), options.get("fragments", 4),
+            options.get("priority", "normal"), options.get("playlist", False),
+        )
+        job.options = options
+        job.job.part_path = part_path
+        self.active_urls[url] += 1
+        self._bind_callbacks(job)
+        self.jobs[job.id] = job
+        self.queue.append(job)
+        self._wake()
+        self._publish(job)
+        return job
+
+    def _wake(self):
+        async def notify():
+            async with self.wakeup:
+                self.wakeup.notify_all()
+        self.loop.create_task(notify())
+
+    def cancel(self, job):
+        if job.state in ("finished", "failed", "cancelled"):
+            return False
+        job.job.cancel()
+        if job.state == "queued":
+            self.queue.remove(job)
+            self._release_feed(job)
+            self._finish(job, False, CANCELLED_MESSAGE)
+        return True
+
+    @staticmethod
+    def _release_feed(job):
+        if job.feed is not None:
+            job.feed.release()
+            job.feed = None
+
+    def _expand(self, job):
+        # The expander runs on its own thread, so it holds no worker
+        expander = PlaylistExpander(
+            job.job.entries,
+            lambda url: self.loop.call_soon_threadsafe(self._add_entry, job, expander, url),
+            lambda _: self.loop.call_soon_threadsafe(self._expanded, job, expander),
+            job.job.cancel_event)
+        expander.start()
+
+    def _add_entry(self, parent, expander, url):
+        if expander.cancelled or url in self.active_urls:
+            # Duplicates are entries the journal already queued again on resume
+            expander.release()
+            return
+        journal_id = self.journal.add(url, parent.options) if self.journal is not None else None
+        self._enqueue(url, parent.options, journal_id=journal_id).feed = expander
+        parent.entries += 1
+        self._update(parent, None, f"Queued {parent.entries} entries")
+
+    def _expanded(self, job, expander):
+        if expander.cancelled:
+            self._finish(job, False, CANCELLED_MESSAGE)
+        elif expander.error:
+            self._finish(job, False, f"Playlist stopped after {job.entries} entries: {expander.error}")
+        else:
+            self._finish(job, True, f"Queued {job.entries} entries")
+
+    def _bind_callbacks(self, job):
+        # The engine calls these from a worker thread
+        def on_progress(value):
+            self.loop.call_soon_threadsafe(self._update, job, value, None)
+
+        def on_status(message):
+            self.loop.call_soon_threadsafe(self._update, job, None, message)
+
+        job.job.on_progress = on_progress
+        job.job.on_status = on_status
+        if self.tuner is not None:
+            job.job.on_bytes = self.tuner.record
+        if job.journal_id is not None:
+            job.job.on_format = lambda format_id: self.journal.set_format(job.journal_id, format_id)
+            job.job.on_file = lambda path: self.journal.set_part_path(job.journal_id, path)
+
+    def _update(self, job, progress, status):
+        if job.state != "running":
+            return
+        if progress is not None:
+            job.progress = progress
+        if status is not None:
+            job.status = status
+        self._publish(job)
+
+    def _finish(self, job, success, message):
+        if success:
+            job.state = "finished"
+            job.progress = 100
+        elif message == CANCELLED_MESSAGE:
+            job.state = "cancelled"
+        else:
+            job.state = "failed"
+        job.status = job.message = message
+        job.finished = time.time()
+        self.active_urls[job.job.url] -= 1
+        if self.active_urls[job.job.url] <= 0:
+            del self.active_urls[job.job.url]
+        if job.journal_id is not None:
+            self.journal.remove(job.journal_id)
+        self._publish(job)
+        self.finished_ids[job.id] = None
+        while len(self.finished_ids) > self.keep_finished:
+            del self.jobs[self.finished_ids.popitem(last=False)[0]]
+
+    async def _next_job(self):
+        """Wait for a job that may start now and take it off the queue"""
+        async with self.wakeup:
+            while True:
+                delay = None
+                if self.tuner is None or self.running < self.tuner.jobs:
+                    index, delay = self.hosts.pick([job.host for job in self.queue])
+                    if index is not None:
+                        job = self.queue[index]
+                        del self.queue[index]
+                        self.hosts.try_start(job.host)
+                        self._release_feed(job)
+                        self.running += 1
+                        return job
+                try:
+                    # Without a delay, only a finished or new job can change anything
+                    await asyncio.wait_for(self.wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _worker(self):
+        while True:
+            job = await self._next_job()
+            throttled = False
+            try:
+                job.state = "running"
+                job.status = "Starting download..."
+                self._publish(job)
+                downloaded = asyncio.Event()
+                job.job.on_downloaded = lambda: self.loop.call_soon_threadsafe(downloaded.set)
+                run = self.loop.run_in_executor(self._executor, job.job.run)
+                waiter = asyncio.ensure_future(downloaded.wait())
+                await asyncio.wait([run, waiter], return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+                if not run.done():
+                    # The download is done; post-processing goes on without this worker
+                    self.loop.create_task(self._finish_processing(job, run))
+                    continue
+                success, message = run.result()
+                if success and job.job.entries is not None:
+                    self._expand(job)
+                    continue
+                throttled = not success and not job.job.is_cancelled and is_throttled(message)
+                if throttled and job.retries < MAX_THROTTLE_RETRIES:
+                    self._requeue(job, self.hosts.finish(job.host, True))
+                    continue
+                self._finish(job, success, message)
+            except Exception as e:
+                self._finish(job, False, str(e))
+            finally:
+                if job.state != "queued":
+                    self.hosts.finish(job.host, throttled)
+                self.running -= 1
+                self._wake()
+
+    async def _finish_processing(self, job, run):
+        try:
+            success, message = await run
+        except Exception as e:
+            success, message = False, str(e)
+        self._finish(job, success, message)
+
+    def _requeue(self, job, delay):
+        # Back to the front of the queue; other sites keep going meanwhile
+        job.retries += 1
+        job.state = "queued"
+        job.status = f"Rate limited by {job.host}, retrying in {delay:.0f}s"
+        self.queue.appendleft(job)
+        self._publish(job)
+
+    async def _tune(self):
+        while True:
+            await asyncio.sleep(self.tuner.interval)
+            saturated = bool(self.queue) or self.running >= self.tuner.jobs
+            decision = self.tuner.update(saturated)
+            if decision:
+                print(f"Auto-tune: {decision}", flush=True)
+                get_connection_budget().set_limit(self.tuner.connections)
+                self._wake()
+
+    # -- Events -------------------------------------------------------------
+
+    def _publish(self, job):
+        event = job.to_dict()
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Slow subscribers lose intermediate updates, not the stream
+                pass
+
+    # -- HTTP ---------------------------------------------------------------
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            if not request_line:
+                return
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = b""
+            if int(headers.get("content-length", 0)):
+                body = await reader.readexactly(int(headers["content-length"]))
+            await self._route(method, target, body, writer)
+        except (ValueError, asyncio.IncompleteReadError):
+            self._respond(writer, 400, {"error": "malformed request"})
+        except ConnectionError:
+            pass
+        finally:
+            try:
+                await writer.drain()
+                writer.close()
+            except ConnectionError:
+                pass
+
+    async def _route(self, method, target, body, writer):
+        parts = urlsplit(target)
+        path = parts.path.rstrip("/")
+        query = parse_qs(parts.query)
+
+        if path == "/jobs":
+            if method == "GET":
+                state = query.get("state", [None])[0]
+                jobs = [job.to_dict() for job in self.jobs.values() if state is None or job.state == state]
+                return self._respond(writer, 200, {"jobs": jobs})
+            if method == "POST":
+                return self._submit(body, writer)
+            return self._respond(writer, 405, {"error": "method not allowed"})
+
+        if path.startswith("/jobs/"):
+            job = self._lookup(path[len("/jobs/"):])
+            if job is None:
+                return self._respond(writer, 404, {"error": "no such job"})
+            if method == "GET":
+                return self._respond(writer, 200, job.to_dict())
+            if method == "DELETE":
+                if not self.cancel(job):
+                    return self._respond(writer, 409, {"error": f"job already {job.state}"})
+                return self._respond(writer, 202, job.to_dict())
+            return self._respond(writer, 405, {"error": "method not allowed"})
+
+        if path == "/stats" and method == "GET":
+            return self._respond(writer, 200, {
+                "queued": len(self.queue),
+                "running": sum(1 for job in self.jobs.values() if job.state == "running"),
+                "downloading": self.running,
+                "postprocess": get_postprocess_stage().stats(),
+                "autotune": self.tuner.stats() if self.tuner is not None else None,
+                "hosts": self.hosts.stats(),
+                "connections": get_connection_budget().stats(),
+                "bandwidth": get_bandwidth_limiter().stats(),
+                "info_cache": get_info_cache().stats(),
+            })
+
+        if path == "/events" and method == "GET":
+            job = None
+            if "job" in query:
+                job = self._lookup(query["job"][0])
+                if job is None:
+                    return self._respond(writer, 404, {"error": "no such job"})
+            return await self._stream_events(writer, job)
+
+        self._respond(writer, 404, {"error": "not found"})
+
+    def _submit(self, body, writer):
+        try:
+            payload = json.loads(body or b"{}")
+            if not isinstance(payload, dict) or not isinstance(payload.get("urls", []), list):
+                raise ValueError
+            specs = [{**payload, "url": url} for url in payload["urls"]] if "urls" in payload else [payload]
+            if not specs or not all(isinstance(spec.get("url"), str) and spec["url"] for spec in specs):
+                raise ValueError
+            if not all(spec.get("priority", "normal") in PRIORITY_WEIGHTS for spec in specs):
+                priorities = ", ".join(PRIORITY_WEIGHTS)
+                return self._respond(writer, 400, {"error": f"priority must be one of {priorities}"})
+            for spec in specs:
+                for name in ("connections", "fragments"):
+                    if name in spec:
+                        spec[name] = positive_int(spec[name])
+                        if spec[name] is None:
+                            return self._respond(writer, 400, {"error": f"{name} must be a positive integer"})
+        except (ValueError, TypeError, KeyError):
+            return self._respond(writer, 400, {"error": "expected {\"url\": ...} or {\"urls\": [...]}"})
+        jobs = self.submit(specs)
+        if jobs is None:
+            return self._respond(writer, 429, {"error": "queue is full", "queued": len(self.queue)},
+                                 {"Retry-After": "5"})
+        self._respond(writer, 202, {"ids": [job.id for job in jobs]})
+
+    def _lookup(self, job_id):
+        try:
+            return self.jobs.get(int(job_id))
+        except ValueError:
+            return None
+
+    async def _stream_events(self, writer, job):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                     b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n")
+        if job is not None:
+            writer.write(self._event(job.to_dict()))
+            if job.state not in ("queued", "running"):
+                return
+        events = asyncio.Queue(maxsize=1000)
+        self.subscribers.add(events)
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(events.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # Keep-alive comment so idle connections are noticed
+                    writer.write(b": keep-alive\n\n")
+                    await writer.drain()
+                    continue
+                if job is not None and event["id"] != job.id:
+                    continue
+                writer.write(self._event(event))
+                await writer.drain()
+                if job is not None and event["state"] not in ("queued", "running"):
+                    return
+        finally:
+            self.subscribers.discard(events)
+
+    @staticmethod
+    def _event(data):
+        return f"event: job\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+    @staticmethod
+    def _respond(writer, status, data, headers=None):
+        body = json.dumps(data).encode("utf-8")
+        head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+                "Content-Type: application/json",
+                f"Content-Length: {len(body)}",
+                "Connection: close"]
+        head += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+
+
+async def _serve(host, port, output_dir, workers, queue_size, autotune, per_host, host_interval, keep_finished):
+    tuner = ConcurrencyTuner(workers, get_connection_budget().limit) if autotune else None
+    service = DownloadService(output_dir, workers, queue_size, JobJournal(client="service"), tuner,
+                              HostScheduler(per_host, host_interval), keep_finished)
+    server = await service.start(host, port)
+    print(f"VeDownloader service listening on http://{host}:{port}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def serve(host="127.0.0.1", port=8765, output_dir=None, workers=3, queue_size=1000, autotune=False,
+          per_host=2, host_interval=1.0, keep_finished=1000):
+    """Run the service until interrupted
+
+    With autotune, workers and the connection budget limit are upper bounds.
+    """
+    output_dir = output_dir or os.path.join(os.path.expanduser("~"), "Downloads")
+    os.makedirs(output_dir, exist_ok=True)
+    try:
+        asyncio.run(_serve(host, port, output_dir, workers, queue_size, autotune, per_host, host_interval,
+                           keep_finished))
+    except KeyboardInterrupt:
+        pass
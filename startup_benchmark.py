@@ -0,0 +1,90 @@
+"""Startup time of the GUI, from process start to the first painted window
+
+Starts advanced_gui.py several times with VEDOWNLOADER_STARTUP_PROBE set to
+a file, which makes it write the time of its first paint there and quit, and
+reports the times and their median. Exits with status 1 when the median is
+above --threshold seconds or yt-dlp was imported before the window was
+painted, so it can be run to catch startup regressions.
+
+With --executable it starts built executables instead (see build_exe.py),
+one after the other, so builds can be compared.
+
+Example:
+    python startup_benchmark.py --runs 5 --threshold 1.0
+    python startup_benchmark.py --offscreen    # on a machine without a display
+    python startup_benchmark.py --offscreen --executable dist/onefile/VeDownloader --executable dist/VeDownloader/VeDownloader
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Seconds to the first paint above which the benchmark fails
+DEFAULT_THRESHOLD = 1.0
+
+
+def measure(command, env):
+    """Seconds from starting the GUI process to its first paint, and whether yt-dlp was loaded by then"""
+    with tempfile.TemporaryDirectory() as probe_dir:
+        probe = os.path.join(probe_dir, "probe")
+        started = time.monotonic()
+        subprocess.run(command, env=dict(env, VEDOWNLOADER_STARTUP_PROBE=probe), cwd=HERE,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=60)
+        try:
+            with open(probe, encoding="utf-8") as probe_file:
+                fields = probe_file.read().split()
+        except FileNotFoundError:
+            raise RuntimeError("the GUI exited without painting its window")
+    return float(fields[1]) - started, fields[2] == "yt_dlp_loaded=True"
+
+
+def benchmark(command, env, runs, threshold):
+    """Measure command runs times and print the results; returns whether it passed"""
+    times = []
+    eager = False
+    for run in range(runs):
+        seconds, loaded = measure(command, env)
+        times.append(seconds)
+        eager = eager or loaded
+        print(f"run {run + 1}: {seconds:.3f}s{' (yt-dlp loaded before the first paint)' if loaded else ''}")
+    median = statistics.median(times)
+    print(f"median: {median:.3f}s, threshold: {threshold:.3f}s")
+    if eager:
+        print("FAIL: yt-dlp was imported before the window was painted")
+        return False
+    if median > threshold:
+        print("FAIL: startup is slower than the threshold")
+        return False
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the time until the GUI window is first painted.")
+    parser.add_argument("-n", "--runs", type=int, default=5, help="times to start the GUI (default: 5)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"fail when the median is above this many seconds (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--offscreen", action="store_true", help="use Qt's offscreen platform, for machines without a display")
+    parser.add_argument("--executable", action="append", default=[],
+                        help="start this built executable instead of advanced_gui.py; may be given more than once")
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    if args.offscreen:
+        env["QT_QPA_PLATFORM"] = "offscreen"
+    commands = [[os.path.abspath(path)] for path in args.executable]
+    commands = commands or [[sys.executable, os.path.join(HERE, "advanced_gui.py")]]
+    passed = True
+    for command in commands:
+        if len(commands) > 1:
+            print(f"{command[0]}:")
+        passed = benchmark(command, env, args.runs, args.threshold) and passed
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+import threading
+
+import pytest
+from yt_dlp import YoutubeDL
+from yt_dlp.utils import make_archive_id as ytdlp_archive_id
+
+from archive import DownloadArchive, archive_id_for_url, make_archive_id
+from playlist import entry_url
+
+VIDEO = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return DownloadArchive(str(tmp_path / "data" / "archive.txt"))
+
+
+def test_make_archive_id_matches_ytdlp():
+    assert make_archive_id("Youtube", "dQw4w9WgXcQ") == ytdlp_archive_id("Youtube", "dQw4w9WgXcQ")
+
+
+def test_ytdlp_records_into_the_archive(archive):
+    info = {"id": "dQw4w9WgXcQ", "extractor": "youtube", "extractor_key": "Youtube"}
+    with YoutubeDL({"quiet": True, "download_archive": archive}) as ydl:
+        assert ydl.archive is archive
+        assert not ydl.in_download_archive(info)
+        ydl.record_download_archive(info)
+        assert ydl.in_download_archive(info)
+    assert "youtube dQw4w9WgXcQ" in archive
+    assert archive.match_url(VIDEO) == "youtube dQw4w9WgXcQ"
+
+    # The file is in yt-dlp's format, so a new archive and yt-dlp itself read it back
+    assert DownloadArchive(archive.path).ids == {"youtube dQw4w9WgXcQ"}
+    with YoutubeDL({"quiet": True, "download_archive": archive.path}) as ydl:
+        assert ydl.in_download_archive(info)
+
+
+def test_add_writes_each_id_once(archive):
+    threads = [threading.Thread(target=archive.add, args=(f"youtube id{index % 5}",)) for index in range(40)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(archive) == 5
+    with open(archive.path, encoding="utf-8") as archive_file:
+        assert sorted(archive_file.read().splitlines()) == [f"youtube id{index}" for index in range(5)]
+
+
+@pytest.mark.parametrize("url", [
+    VIDEO,
+    "https://youtu.be/dQw4w9WgXcQ",
+    "https://www.youtube.com/shorts/dQw4w9WgXcQ",
+])
+def test_archive_id_from_the_url_pattern(url):
+    assert archive_id_for_url(url) == "youtube dQw4w9WgXcQ"
+
+
+@pytest.mark.parametrize("url", [
+    # Only the generic extractor takes these
+    "https://example.com/video.mp4",
+    # A YouTube-style query on a site no extractor knows
+    "https://example.org/watch?v=dQw4w9WgXcQ",
+])
+def test_archive_id_needs_an_extraction(url):
+    assert archive_id_for_url(url) is None
+
+
+def test_playlist_entry_is_only_matched_by_its_extractor():
+    entry = {"_type": "url", "url": "dQw4w9WgXcQ", "ie_key": "Youtube"}
+    assert archive_id_for_url(entry_url(entry)) == "youtube dQw4w9WgXcQ"
+    entry["ie_key"] = "Vimeo"
+    assert archive_id_for_url(entry_url(entry)) is None
+
+
+def test_match_url_needs_the_id_archived(archive):
+    assert archive.match_url(VIDEO) is None
+    archive.add("youtube other")
+    assert archive.match_url(VIDEO) is None
+    assert archive.match_url("https://example.com/video.mp4") is None
+    archive.add(make_archive_id("Youtube", "dQw4w9WgXcQ"))
+    assert archive.match_url("https://youtu.be/dQw4w9WgXcQ") == "youtube dQw4w9WgXcQ"
@@ -0,0 +1,103 @@
+import pytest
+
+from autotune import DECREASE_FACTOR, PROBE_AFTER, ConcurrencyTuner
+
+
+class Clock:
+    """Drives a tuner one interval at a time at a chosen throughput"""
+    def __init__(self, tuner):
+        self.tuner = tuner
+        self.now = 0.0
+        assert tuner.update(now=self.now) is None
+
+    def interval(self, rate, saturated=True):
+        self.now += self.tuner.interval
+        self.tuner.record(int(rate * self.tuner.interval))
+        return self.tuner.update(saturated, now=self.now)
+
+    def settings(self):
+        return self.tuner.jobs, self.tuner.connections
+
+
+@pytest.fixture
+def clock():
+    clock = Clock(ConcurrencyTuner(max_jobs=10, max_connections=16))
+    # The first interval only gives the tuner a rate to compare against
+    assert clock.interval(1000) is None
+    return clock
+
+
+def test_starts_halfway_between_the_bounds():
+    tuner = ConcurrencyTuner(max_jobs=10, max_connections=16)
+    assert (tuner.jobs, tuner.connections) == (5, 8)
+    assert ConcurrencyTuner(max_jobs=1, max_connections=1, interval=1).jobs == 1
+
+
+def test_kept_probe_is_followed_by_another(clock):
+    assert clock.interval(1000).startswith("probing")
+    assert clock.settings() == (6, 8)
+    assert clock.interval(1100).startswith("throughput rose")
+    assert clock.settings() == (7, 8)
+    assert clock.tuner.throughput == pytest.approx(1100)
+
+
+def test_probe_without_gain_is_undone(clock):
+    clock.interval(1000)
+    assert clock.interval(1020).startswith("no gain from one more job")
+    assert clock.settings() == (5, 8)
+
+    # Steady again, then the other setting is probed
+    for _ in range(PROBE_AFTER - 1):
+        assert clock.interval(1020) is None
+    assert clock.interval(1020).startswith("probing")
+    assert clock.settings() == (5, 9)
+    assert clock.interval(1020).startswith("no gain from one more connection")
+    assert clock.settings() == (5, 8)
+
+    # Neither helped alone, so both are probed together
+    for _ in range(PROBE_AFTER - 1):
+        clock.interval(1020)
+    clock.interval(1020)
+    assert clock.settings() == (6, 9)
+
+
+def test_drop_cuts_both_settings(clock):
+    assert clock.interval(800).startswith("throughput fell")
+    assert clock.settings() == (int(5 * DECREASE_FACTOR), int(8 * DECREASE_FACTOR))
+
+
+def test_drops_stop_at_the_minimum(clock):
+    rate = 1000
+    for _ in range(10):
+        rate /= 2
+        clock.interval(rate)
+    assert clock.settings() == (1, 1)
+    # Nothing left to cut
+    assert clock.interval(rate / 2) is None
+
+
+def test_unsaturated_intervals_change_nothing(clock):
+    for rate in (1000, 100, 1000, 5000):
+        assert clock.interval(rate, saturated=False) is None
+    assert clock.settings() == (5, 8)
+
+
+def test_probes_stay_within_the_bounds():
+    clock = Clock(ConcurrencyTuner(max_jobs=2, max_connections=3))
+    clock.interval(1000)
+    rate = 1000
+    for _ in range(10):
+        rate *= 2
+        clock.interval(rate)
+    assert clock.settings() == (2, 3)
+    # Both at their bound: a probe has nothing to raise
+    assert clock.interval(rate * 2) is None
+
+
+def test_set_bounds_clamps_the_settings(clock):
+    clock.tuner.set_bounds(max_jobs=3, max_connections=4)
+    assert clock.settings() == (3, 4)
+    clock.tuner.set_bounds(max_jobs=0)
+    assert clock.tuner.max_jobs == clock.tuner.min_jobs == clock.tuner.jobs == 1
+    stats = clock.tuner.stats()
+    assert (stats["max_jobs"], stats["max_connections"]) == (1, 4)
@@ -0,0 +1,126 @@
+import threading
+import time
+
+import pytest
+
+from bandwidth import BURST_SECONDS, BandwidthLimiter, parse_rate, parse_schedule
+
+
+class FakeClock:
+    """Monotonic clock that only moves when a job waits on it
+
+    Stands in for the cancel event too, so consume() sleeps on it. Like a
+    real clock it ticks by at least a microsecond per wait.
+    """
+    def __init__(self):
+        self.now = 0.0
+        self.slept = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def wait(self, seconds):
+        seconds = max(seconds, 1e-6)
+        self.now += seconds
+        self.slept += seconds
+        return False
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_rate_holds_over_a_window(clock):
+    limiter = BandwidthLimiter(10000, clock=clock)
+    share = limiter.share()
+    started = clock.now
+    total = 0
+    while total < 100000:
+        share.consume(1000, clock)
+        total += 1000
+    # The first burst is free, the rest is paid for at the rate
+    assert clock.now - started == pytest.approx((total - 10000 * BURST_SECONDS) / 10000, abs=1e-3)
+
+
+def test_active_jobs_split_the_rate_by_weight(clock):
+    limiter = BandwidthLimiter(3000, clock=clock)
+    low, high = limiter.share(1.0), limiter.share(2.0)
+    low.consume(0, clock)
+    high.consume(0, clock)
+
+    # Each pays one second at its part of the rate for what it took beyond its burst
+    low.consume(1000 * BURST_SECONDS + 1000, clock)
+    assert clock.slept == pytest.approx(1.0, abs=1e-3)
+    high.consume(2000 * BURST_SECONDS + 2000, clock)
+    assert clock.slept == pytest.approx(2.0, abs=1e-3)
+
+    # Once the other job is gone the whole rate and burst are its own
+    high.release()
+    low.consume(3000 * BURST_SECONDS + 3000, clock)
+    assert clock.slept == pytest.approx(3.0, abs=1e-3)
+
+
+def test_unlimited_rate_never_waits(clock):
+    limiter = BandwidthLimiter(0, clock=clock)
+    limiter.share().consume(10 ** 9, clock)
+    limiter.set_rate(None)
+    limiter.share().consume(10 ** 9, clock)
+    assert clock.slept == 0
+
+
+def test_consume_wakes_on_the_stop_event():
+    limiter = BandwidthLimiter(1000)
+    share = limiter.share()
+    stop = threading.Event()
+    thread = threading.Thread(target=share.consume, args=(10 ** 6, stop))
+    started = time.monotonic()
+    thread.start()
+    time.sleep(0.1)
+    stop.set()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert time.monotonic() - started < 1.0
+
+
+@pytest.mark.parametrize("text, rate", [
+    ("0", 0),
+    ("1500", 1500),
+    ("500K", 500 * 1024),
+    ("5m", 5 * 1024 ** 2),
+    ("1.5G", int(1.5 * 1024 ** 3)),
+    (" 2 MiB/s ", 2 * 1024 ** 2),
+    ("10kb", 10 * 1024),
+])
+def test_parse_rate(text, rate):
+    assert parse_rate(text) == rate
+
+
+@pytest.mark.parametrize("text", ["", "fast", "5T", "-1M"])
+def test_parse_rate_rejects(text):
+    with pytest.raises(ValueError):
+        parse_rate(text)
+
+
+def test_parse_schedule():
+    assert parse_schedule("09:00-17:00=5M, 22:00-6:30=0,") == [
+        (9 * 60, 17 * 60, 5 * 1024 ** 2), (22 * 60, 6 * 60 + 30, 0)]
+    for text in ("9-17=5M", "09:00-25:00=1M", "09:60-17:00=1M", "09:00-17:00=fast"):
+        with pytest.raises(ValueError):
+            parse_schedule(text)
+
+
+def at(hour, minute):
+    return time.mktime((2024, 1, 15, hour, minute, 0, 0, 0, -1))
+
+
+def test_current_rate_follows_the_schedule():
+    limiter = BandwidthLimiter(1000, parse_schedule("09:00-17:00=5M,22:00-06:00=0"))
+    assert limiter.current_rate(at(8, 59)) == 1000
+    assert limiter.current_rate(at(9, 0)) == 5 * 1024 ** 2
+    assert limiter.current_rate(at(16, 59)) == 5 * 1024 ** 2
+    assert limiter.current_rate(at(17, 0)) == 1000
+    # Wraps past midnight
+    assert limiter.current_rate(at(23, 30)) == 0
+    assert limiter.current_rate(at(5, 59)) == 0
+    assert limiter.current_rate(at(6, 0)) == 1000
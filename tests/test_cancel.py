@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+
+import pytest
+import yt_dlp
+
+import engine
+from engine import CANCELLED_MESSAGE, CountingYoutubeDL, DownloadJob, ProgressHook
+from test_segmented import RangeServer
+
+JOBS = 8
+
+
+@pytest.fixture
+def server():
+    server = RangeServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def open_fds():
+    return len(os.listdir(f"/proc/{os.getpid()}/fd"))
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+def cancel_when_downloading(job):
+    """Run job on a thread and cancel it once bytes arrive; returns its result"""
+    started = threading.Event()
+    job.on_bytes = lambda received: started.set()
+    result = []
+    thread = threading.Thread(target=lambda: result.append(job.run()))
+    thread.start()
+    assert started.wait(10)
+    job.cancel()
+    thread.join(10)
+    assert not thread.is_alive()
+    return result[0]
+
+
+def test_cancel_event_raises_download_cancelled(server, tmp_path):
+    cancel_event = threading.Event()
+
+    def on_progress(percent):
+        cancel_event.set()
+
+    hook = ProgressHook(on_progress, lambda message: None, 0, cancel_event=cancel_event)
+    params = {"quiet": True, "noprogress": True, "progress_hooks": [hook],
+              "outtmpl": str(tmp_path / "%(id)s.%(ext)s")}
+    with CountingYoutubeDL(params) as ydl:
+        with pytest.raises(yt_dlp.utils.DownloadCancelled):
+            ydl.process_ie_result({"id": "file", "title": "file", "url": server.url, "ext": "mp4"}, download=True)
+    assert hook.files
+
+
+@pytest.mark.parametrize("connections", [1, 4])
+def test_cancelled_job_reports_cancellation(server, tmp_path, connections):
+    job = DownloadJob(server.url, str(tmp_path), format_option="auto", connections=connections)
+    assert cancel_when_downloading(job) == (False, CANCELLED_MESSAGE)
+    # The partial download is kept for resuming
+    expected = ["file.bin.part"] + (["file.bin.part.segments"] if connections > 1 else [])
+    assert sorted(os.listdir(tmp_path)) == expected
+
+
+@pytest.mark.parametrize("connections", [1, 4])
+def test_cancel_without_keep_partial_removes_partial_files(server, tmp_path, connections):
+    job = DownloadJob(server.url, str(tmp_path), format_option="auto", connections=connections, keep_partial=False)
+    assert cancel_when_downloading(job) == (False, CANCELLED_MESSAGE)
+    assert os.listdir(tmp_path) == []
+
+
+def test_parallel_cancels_leak_no_threads_or_files(server, tmp_path):
+    # Load yt-dlp, its extractor index and the connection pools once first
+    cancel_when_downloading(DownloadJob(server.url, str(tmp_path / "warmup"), format_option="auto"))
+    time.sleep(0.5)
+    threads, fds = threading.active_count(), open_fds()
+
+    jobs = [DownloadJob(server.url, str(tmp_path / f"job{index}"), format_option="auto",
+                        connections=1 + index % 2 * 3, keep_partial=False) for index in range(JOBS)]
+    results = []
+    runners = [threading.Thread(target=lambda job=job: results.append(cancel_when_downloading(job))) for job in jobs]
+    for runner in runners:
+        runner.start()
+    for runner in runners:
+        runner.join(30)
+
+    assert results == [(False, CANCELLED_MESSAGE)] * JOBS
+    # The server's handler threads end as the closed connections are noticed
+    assert wait_for(lambda: threading.active_count() <= threads), threading.enumerate()
+    assert wait_for(lambda: open_fds() <= fds)
+    assert not engine._child_processes
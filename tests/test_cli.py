@@ -0,0 +1,91 @@
+import json
+import threading
+
+import pytest
+
+import cli
+from remux import FASTSTART_REWRITE
+from test_engine import FileServer
+
+
+def test_parse_args_defaults():
+    args = cli.parse_args(["urls.txt"])
+    assert (args.url_file, args.quality, args.format, args.jobs, args.per_host) == ("urls.txt", "best", "mp4", 3, 2)
+    assert (args.limit_rate, args.limit_schedule, args.results) == (0, [], "-")
+    assert not args.serve and not args.no_archive
+
+
+def test_parse_args_options():
+    args = cli.parse_args(["-", "-q", "720p", "-f", "mkv", "-j", "5", "--limit-rate", "2M",
+                           "--limit-schedule", "09:00-17:00=500K", "--faststart", FASTSTART_REWRITE])
+    assert (args.url_file, args.quality, args.format, args.jobs) == ("-", "720p", "mkv", 5)
+    assert args.limit_rate == 2 * 1024 ** 2
+    assert args.limit_schedule == [(9 * 60, 17 * 60, 500 * 1024)]
+    assert args.faststart == FASTSTART_REWRITE
+    assert cli.parse_args(["--serve", "--port", "9000"]).port == 9000
+
+
+@pytest.mark.parametrize("argv", [
+    [],
+    ["urls.txt", "-q", "4k"],
+    ["urls.txt", "--limit-rate", "fast"],
+    ["urls.txt", "--limit-schedule", "always=1M"],
+])
+def test_parse_args_rejects(argv, capsys):
+    with pytest.raises(SystemExit) as error:
+        cli.parse_args(argv)
+    assert error.value.code == 2
+
+
+def test_read_url_file_skips_blanks_and_comments(tmp_path):
+    path = tmp_path / "urls.txt"
+    path.write_text("# videos\nhttps://a.example/1\n\n   \n  # later\n  https://b.example/2  \n", encoding="utf-8")
+    assert cli.read_url_file(str(path)) == ["https://a.example/1", "https://b.example/2"]
+
+
+def test_interleave_hosts_round_robin():
+    urls = ["https://www.youtube.com/1", "https://m.youtube.com/2", "https://youtu.be/3",
+            "https://vimeo.com/4", "https://youtube.com/5", "https://news.bbc.co.uk/6", "https://vimeo.com/7"]
+    assert cli.interleave_hosts(urls) == [
+        "https://www.youtube.com/1", "https://youtu.be/3", "https://vimeo.com/4", "https://news.bbc.co.uk/6",
+        "https://m.youtube.com/2", "https://vimeo.com/7",
+        "https://youtube.com/5",
+    ]
+    assert cli.interleave_hosts([]) == []
+
+
+@pytest.fixture
+def server():
+    server = FileServer({"/a.mp4": b"\0" * 50000, "/b.mp4": b"\1" * 50000})
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def run_main(tmp_path, urls):
+    url_file = tmp_path / "urls.txt"
+    url_file.write_text("\n".join(urls), encoding="utf-8")
+    results = tmp_path / "results.jsonl"
+    code = cli.main([str(url_file), "-o", str(tmp_path / "out"), "-f", "auto", "--no-archive",
+                     "--host-interval", "0", "-r", str(results)])
+    with open(results, encoding="utf-8") as results_file:
+        return code, {record["url"]: record for record in map(json.loads, results_file)}
+
+
+def test_exit_code_is_zero_when_every_job_succeeds(tmp_path, server):
+    urls = [f"{server.base_url}/a.mp4", f"{server.base_url}/b.mp4"]
+    code, results = run_main(tmp_path, urls)
+    assert code == 0
+    assert sorted(results) == sorted(urls)
+    assert all(record["success"] and record["extract_count"] == 1 for record in results.values())
+
+
+def test_exit_code_is_one_when_some_jobs_fail(tmp_path, server):
+    urls = [f"{server.base_url}/a.mp4", f"{server.base_url}/missing.mp4", f"{server.base_url}/b.mp4"]
+    code, results = run_main(tmp_path, urls)
+    assert code == 1
+    # Every job still runs and gets its result
+    assert sorted(results) == sorted(urls)
+    assert [results[url]["success"] for url in urls] == [True, False, True]
+    assert "404" in results[urls[1]]["message"]
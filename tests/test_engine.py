@@ -0,0 +1,139 @@
+import http.server
+import os
+import threading
+import time
+
+import pytest
+from yt_dlp.extractor.common import InfoExtractor
+from yt_dlp.postprocessor.ffmpeg import FFmpegPostProcessor
+
+import engine
+from engine import CountingYoutubeDL, DownloadJob
+
+CHUNK = 16 * 1024
+
+
+class FileServer(http.server.ThreadingHTTPServer):
+    """Serves the bytes in files by path, pausing delay seconds between chunks"""
+    daemon_threads = True
+
+    def __init__(self, files, delay=0):
+        super().__init__(("127.0.0.1", 0), FileHandler)
+        self.files = files
+        self.delay = delay
+        self.base_url = f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class FileHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        data = self.server.files.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        try:
+            for pos in range(0, len(data), CHUNK):
+                self.wfile.write(data[pos:pos + CHUNK])
+                time.sleep(self.server.delay)
+        except OSError:
+            pass
+
+
+class StubIE(InfoExtractor):
+    """Offers separate video and audio formats, and a single file with both"""
+    _VALID_URL = r"stub://(?P<id>\w+)"
+    base_url = None
+
+    def _real_extract(self, url):
+        video_id = self._match_id(url)
+        return {"id": video_id, "title": video_id, "formats": [
+            {"format_id": "both", "url": f"{self.base_url}/clip.mp4", "ext": "mp4",
+             "vcodec": "avc1", "acodec": "mp4a.40.2", "height": 360},
+            {"format_id": "video", "url": f"{self.base_url}/video.mp4", "ext": "mp4",
+             "vcodec": "avc1", "acodec": "none", "height": 720},
+            {"format_id": "audio", "url": f"{self.base_url}/audio.m4a", "ext": "m4a",
+             "vcodec": "none", "acodec": "mp4a.40.2"},
+        ]}
+
+
+class StubYoutubeDL(CountingYoutubeDL):
+    def add_default_info_extractors(self):
+        # Ahead of the Generic extractor, which matches any URL
+        self.add_info_extractor(StubIE())
+        super().add_default_info_extractors()
+
+
+@pytest.fixture
+def stub_extractor(monkeypatch, server):
+    monkeypatch.setattr(engine, "CountingYoutubeDL", StubYoutubeDL)
+    monkeypatch.setattr(StubIE, "base_url", server.base_url)
+
+
+@pytest.fixture
+def server():
+    data = os.urandom(256 * 1024)
+    server = FileServer({"/clip.mp4": data, "/video.mp4": data, "/audio.m4a": data[:64 * 1024]})
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def no_ffmpeg(monkeypatch):
+    monkeypatch.setattr(FFmpegPostProcessor, "available", property(lambda self: False))
+
+
+def test_file_is_kept_when_ffmpeg_is_missing(server, no_ffmpeg, tmp_path):
+    statuses = []
+    job = DownloadJob(f"{server.base_url}/clip.mp4", str(tmp_path), format_option="mkv", on_status=statuses.append)
+    success, message = job.run()
+    assert success, message
+    assert os.listdir(tmp_path) == ["clip.mp4"]
+    assert job.conversion is None
+    assert statuses[-1] == "Download complete! FFmpeg not found, kept the mp4 file as it is"
+
+
+def test_conversion_status_is_sent_once(tmp_path):
+    statuses = []
+    job = DownloadJob("https://example.com/v", str(tmp_path), on_status=statuses.append)
+    job._conversion_status = "Converting to MKV"
+    for name in ("Merger", "FitContainer", "FitContainer", "MoveFiles"):
+        job._postprocessor_hook({"status": "started", "postprocessor": name})
+    assert statuses == ["Converting to MKV...", "Post-processing: MoveFiles..."]
+
+
+@pytest.mark.parametrize("error", [
+    "ERROR: You have requested merging of multiple formats but ffmpeg is not installed. Aborting due to --abort-on-error",
+    "ERROR: Postprocessing: ffmpeg not found. Please install or provide the path using --ffmpeg-location",
+])
+def test_both_ffmpeg_errors_are_recognised(error):
+    assert engine.is_ffmpeg_missing(error)
+    assert not engine.is_ffmpeg_missing("ERROR: HTTP Error 404: Not Found")
+
+
+def test_one_extraction_per_job(stub_extractor, tmp_path):
+    job = DownloadJob("stub://single", str(tmp_path), quality="360p", format_option="auto")
+    success, message = job.run()
+    assert success, message
+    assert job.extract_count == 1
+    assert job.format_id == "both"
+
+
+def test_one_extraction_when_falling_back_without_ffmpeg(stub_extractor, no_ffmpeg, tmp_path):
+    statuses = []
+    job = DownloadJob("stub://merged", str(tmp_path), format_option="auto", on_status=statuses.append)
+    success, message = job.run()
+    assert success, message
+    # The merge needs FFmpeg, so the single file with both streams is downloaded
+    assert "Trying direct download without FFmpeg..." in statuses
+    assert os.listdir(tmp_path) == ["merged.mp4"]
+    assert job.extract_count == 1
@@ -0,0 +1,71 @@
+import pytest
+from yt_dlp.extractor import gen_extractor_classes
+
+from extractor_index import ExtractorIndex
+
+# Test URLs of every STEP-th extractor are checked, to keep the run short
+STEP = 10
+
+EXTRA_URLS = [
+    "https://youtu.be/dQw4w9WgXcQ",
+    "https://m.youtube.com/watch?v=dQw4w9WgXcQ",
+    "https://www.youtube.com/playlist?list=PLBCF2DAC6FFB574DE",
+    "https://vimeo.com/56015672",
+    "https://www.bbc.co.uk/programmes/b039g8p7",
+    "https://WWW.Dailymotion.com/video/x5kesuj",
+    "https://example.com/video.mp4",
+    "http://127.0.0.1:8000/video.mp4",
+]
+
+
+@pytest.fixture(scope="module")
+def ies():
+    return list(gen_extractor_classes())
+
+
+@pytest.fixture(scope="module")
+def index(ies, tmp_path_factory):
+    return ExtractorIndex(ies, path=str(tmp_path_factory.mktemp("index") / "index.json"))
+
+
+def full_scan(ies, url):
+    """The ie_key yt-dlp's own loop over every extractor picks"""
+    return next((ie.ie_key() for ie in ies if ie.suitable(url)), None)
+
+
+def test_url_routes_to_the_extractor_of_a_full_scan(ies, index):
+    urls = list(EXTRA_URLS)
+    for ie in ies[::STEP]:
+        urls += [test["url"] for test in ie.get_testcases(include_onlymatching=True) if test.get("url")]
+    routed = 0
+    for url in urls:
+        expected = full_scan(ies, url)
+        if index.route(url) is None:
+            assert index.find(url) is None
+            continue
+        routed += 1
+        assert index.find(url) == expected, url
+    assert routed > len(urls) // 2
+
+
+def test_stored_index_is_reused_and_dropped_when_extractors_change(ies, index):
+    reloaded = ExtractorIndex(ies, path=index.path)
+    assert reloaded.sites.keys() == index.sites.keys()
+    assert reloaded.find("https://youtu.be/dQw4w9WgXcQ") == "Youtube"
+    # Another extractor order means another fingerprint, so the index is rebuilt
+    reordered = ExtractorIndex(ies[::-1], path=index.path)
+    assert reordered.fingerprint != index.fingerprint
+    assert reordered.positions["Generic"] < reordered.positions["Youtube"]
+
+
+def test_unroutable_urls_fall_back_to_every_extractor(ies, index):
+    for url in ("ytsearch:cats", "dQw4w9WgXcQ", "https://user@example.com/video", "ftp://example.com/video"):
+        assert index.route(url) is None
+        assert index.candidates(url) == index.ies
+
+
+def test_find_respects_the_enabled_extractors(ies, index):
+    keys = [ie.ie_key() for ie in ies if ie.ie_key() != "Youtube"]
+    assert index.find("https://youtu.be/dQw4w9WgXcQ", keys) != "Youtube"
+    # Out of order keys cannot be matched to the index
+    assert index.find("https://youtu.be/dQw4w9WgXcQ", keys[::-1]) is None
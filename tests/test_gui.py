@@ -0,0 +1,107 @@
+import os
+import time
+import types
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+QtCore = pytest.importorskip("PyQt5.QtCore")
+QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+
+import advanced_gui  # noqa: E402
+
+
+class StubbornThread(QtCore.QThread):
+    """Stands in for DownloadThread; takes a second to notice it was cancelled"""
+    progress_signal = QtCore.pyqtSignal(int)
+    status_signal = QtCore.pyqtSignal(str)
+    finished_signal = QtCore.pyqtSignal(bool, str)
+    downloaded_signal = QtCore.pyqtSignal()
+    started_threads = []
+
+    def __init__(self, *args):
+        super().__init__()
+        self.job = types.SimpleNamespace(on_bytes=None, on_format=None, on_file=None)
+        self.is_cancelled = False
+        StubbornThread.started_threads.append(self)
+
+    def cancel(self):
+        self.is_cancelled = True
+
+    def run(self):
+        while not self.is_cancelled:
+            time.sleep(0.01)
+        time.sleep(1)
+
+
+@pytest.fixture
+def app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+@pytest.fixture
+def manager(monkeypatch, app):
+    monkeypatch.setattr(advanced_gui, "DownloadThread", StubbornThread)
+    StubbornThread.started_threads = []
+    manager = advanced_gui.DownloadManager(max_concurrent=2)
+    yield manager
+    for thread in StubbornThread.started_threads:
+        thread.wait()
+    app.processEvents()
+
+
+def test_shutdown_waits_once_and_starts_nothing(manager, tmp_path):
+    for index in range(3):
+        manager.submit(f"https://example{index}.com/video", str(tmp_path))
+    assert len(StubbornThread.started_threads) == 2
+
+    started = time.monotonic()
+    manager.shutdown(timeout=400)
+    elapsed = time.monotonic() - started
+    # One deadline for every thread, not 400 ms for each
+    assert elapsed < 0.7
+    assert all(thread.is_cancelled for thread in StubbornThread.started_threads)
+    # Cancelling the queued job freed no slot for anything to start in
+    assert len(StubbornThread.started_threads) == 2
+    manager.submit("https://example9.com/video", str(tmp_path))
+    assert len(StubbornThread.started_threads) == 2
+
+
+def test_failures_are_shown_in_their_rows(monkeypatch, app):
+    dialogs = []
+    monkeypatch.setattr(advanced_gui.QMessageBox, "critical", lambda *args: dialogs.append(args))
+    window = advanced_gui.MainWindow()
+    try:
+        for job_id in range(20):
+            window.add_job_row(job_id, f"https://example.com/{job_id}")
+            window.download_finished(job_id, False, "Download error: HTTP Error 404\nsecond line", None)
+        assert dialogs == []
+        item = window.queue_table.item(window.job_rows[7], 1)
+        assert item.text() == "Failed: Download error: HTTP Error 404"
+        assert item.toolTip() == "Download error: HTTP Error 404\nsecond line"
+
+        # A job without a row in the queue still gets a dialog
+        window.download_finished(99, False, "Download error: gone", None)
+        assert len(dialogs) == 1
+    finally:
+        window.download_manager.shutdown()
+        window.deleteLater()
+
+
+def test_jobs_held_back_by_their_site_say_so(manager, tmp_path):
+    manager.max_concurrent = 3
+    manager.hosts = advanced_gui.HostScheduler(2, 0.0)
+    statuses = {}
+    manager.job_status.connect(lambda job_id, message: statuses.__setitem__(job_id, message))
+    jobs = [manager.submit(f"https://www.example.com/{index}", str(tmp_path)) for index in range(3)]
+    assert len(StubbornThread.started_threads) == 2
+    assert statuses[jobs[2]] == ("Waiting: example.com already has 2 downloads running "
+                                 "(Maximum Downloads Per Site)")
+    assert list(manager.host_waits) == [jobs[2]]
+
+    # Another site's job takes the free slot; the third waits on max_concurrent now
+    manager.submit("https://other.example.org/video", str(tmp_path))
+    assert len(StubbornThread.started_threads) == 3
+    assert statuses[jobs[2]] == "Queued"
+    assert manager.host_waits == {}
+    manager.shutdown(timeout=0)
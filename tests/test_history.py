@@ -0,0 +1,122 @@
+import os
+import sqlite3
+
+import pytest
+
+from engine import JobRecord
+from history import HistoryStore
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+
+def fill(store, count):
+    for index in range(count):
+        store.add(f"https://example.com/v{index}", JobRecord(f"https://example.com/v{index}", title=f"Video {index}"),
+                  completed_at=1700000000 + index)
+
+
+def test_store_round_trip_through_the_wal_database(tmp_path):
+    path = str(tmp_path / "data" / "history.db")
+    store = HistoryStore(path)
+    assert store.db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    record = JobRecord("https://www.youtube.com/watch?v=abc", title="A video", video_id="abc", extractor="youtube",
+                       format_id="137+140", size=1234, duration=61.5, output_path="/videos/A video.mp4")
+    row_id = store.add(record.url, record, completed_at=1700000000)
+    store.add("https://example.com/other", completed_at=1700000100)
+
+    # A second connection sees the committed rows while the first is still open
+    reader = HistoryStore(path)
+    assert reader.count() == 2
+    [entry] = reader.find_video("youtube", "abc")
+    assert entry == {"id": row_id, "url": record.url, "title": "A video", "extractor": "youtube", "video_id": "abc",
+                     "output_path": "/videos/A video.mp4", "size": 1234, "duration": 61.5, "format": "137+140",
+                     "completed_at": 1700000000}
+    assert reader.find_url(record.url) == [entry]
+    assert reader.find_url("https://example.com/missing") == []
+    reader.close()
+
+    store.close()
+    store = HistoryStore(path)
+    assert [entry["url"] for entry in store.page(0, 10)] == ["https://example.com/other", record.url]
+    store.clear()
+    assert store.count() == 0
+    store.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        store.count()
+
+
+def test_pages_are_newest_first():
+    store = HistoryStore(":memory:")
+    fill(store, 25)
+    assert store.count() == 25
+    assert [entry["title"] for entry in store.page(0, 3)] == ["Video 24", "Video 23", "Video 22"]
+    assert [entry["title"] for entry in store.page(20, 10)] == [f"Video {index}" for index in range(4, -1, -1)]
+    assert store.page(25, 10) == []
+
+
+@pytest.fixture
+def app():
+    QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+@pytest.fixture
+def model(app):
+    import advanced_gui
+
+    class SmallPages(advanced_gui.HistoryModel):
+        PAGE_SIZE = 10
+        MAX_PAGES = 3
+
+    store = HistoryStore(":memory:")
+    fill(store, 95)
+    reads = []
+    page = store.page
+    store.page = lambda offset, limit: reads.append(offset) or page(offset, limit)
+    model = SmallPages(store)
+    model.reads = reads
+    return model
+
+
+def title(model, row):
+    from PyQt5.QtCore import Qt
+
+    return model.data(model.index(row), Qt.DisplayRole).split("  ", 1)[1]
+
+
+def test_model_reads_a_page_at_a_time(model):
+    assert model.rowCount() == 95
+    assert model.reads == []
+    assert title(model, 0) == "Video 94"
+    assert title(model, 9) == "Video 85"
+    assert model.reads == [0]
+    assert title(model, 94) == "Video 0"
+    assert title(model, 10) == "Video 84"
+    assert model.reads == [0, 90, 10]
+
+
+def test_model_keeps_only_the_latest_pages(model):
+    for row in (0, 10, 20, 30):
+        title(model, row)
+    assert list(model.pages) == [1, 2, 3]
+    # A page used again moves to the back instead of being read again
+    title(model, 15)
+    title(model, 40)
+    assert list(model.pages) == [3, 1, 4]
+    title(model, 0)
+    assert model.reads == [0, 10, 20, 30, 40, 0]
+
+
+def test_model_add_and_clear(model):
+    title(model, 0)
+    inserted = []
+    model.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+    model.add("https://example.com/new", JobRecord("https://example.com/new", title="New video"))
+    assert inserted == [(0, 0)]
+    assert model.rowCount() == 96
+    assert title(model, 0) == "New video"
+    assert title(model, 1) == "Video 94"
+
+    model.clear()
+    assert model.rowCount() == 0
+    assert model.store.count() == 0
@@ -0,0 +1,27 @@
+from info_cache import InfoCache
+
+URL = "https://example.com/watch?v=1&list=2"
+INFO = {"id": "1", "title": "video", "formats": [{"format_id": "0", "url": "https://cdn.example.com/1.mp4"}]}
+
+
+def test_extraction_options_are_part_of_the_key(tmp_path):
+    cache = InfoCache(cache_dir=str(tmp_path))
+    params = {"noplaylist": True, "format": "best", "quiet": True}
+    cache.put(URL, INFO, params)
+    assert cache.get(URL, params)["id"] == "1"
+    # Options that do not change the extraction do not change the key
+    assert cache.get(URL, dict(params, quiet=False, progress_hooks=[print])) is not None
+    assert cache.get(URL, dict(params, noplaylist=False)) is None
+    assert cache.get(URL, dict(params, format="bestaudio")) is None
+    assert cache.get(URL, dict(params, cookiefile="cookies.txt")) is None
+    assert cache.get(URL) is None
+
+
+def test_on_disk_entries_use_the_same_key(tmp_path):
+    params = {"noplaylist": True, "cookiesfrombrowser": ("firefox",)}
+    InfoCache(cache_dir=str(tmp_path)).put(URL, INFO, params)
+    cache = InfoCache(cache_dir=str(tmp_path))
+    assert cache.get(URL, dict(params, cookiesfrombrowser=("chrome",))) is None
+    assert cache.get(URL, params)["title"] == "video"
+    cache.invalidate(URL, params)
+    assert InfoCache(cache_dir=str(tmp_path)).get(URL, params) is None
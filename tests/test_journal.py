@@ -0,0 +1,111 @@
+import os
+import threading
+
+import pytest
+
+from engine import DownloadJob
+from journal import JobJournal
+from test_segmented import RangeServer
+from test_service import run
+
+OPTIONS = {"output_dir": "/downloads", "quality": "best", "format": "mp4", "subtitles": False,
+           "archive": True, "connections": 4, "fragments": 4, "priority": "normal", "playlist": False}
+
+
+def test_unfinished_jobs_survive_a_restart(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    journal = JobJournal(path)
+    done = journal.add("https://example.com/done", OPTIONS)
+    running = journal.add("https://example.com/running", OPTIONS)
+    queued = journal.add("https://example.com/queued", dict(OPTIONS, quality="720p"))
+    journal.set_format(running, "137+140")
+    journal.set_part_path(running, "/downloads/video.f137.mp4.part")
+    journal.remove(done)
+    # No close(): the process is gone, and only what was committed is left
+    del journal
+
+    entries = JobJournal(path).unfinished()
+    assert [entry["id"] for entry in entries] == [running, queued]
+    assert entries[0]["url"] == "https://example.com/running"
+    assert entries[0]["format_id"] == "137+140"
+    assert entries[0]["part_path"] == "/downloads/video.f137.mp4.part"
+    assert entries[0]["options"] == OPTIONS
+    assert entries[1]["format_id"] is None and entries[1]["options"]["quality"] == "720p"
+
+
+def test_each_client_resumes_only_its_own_jobs(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    JobJournal(path, client="gui").add("https://example.com/gui", OPTIONS)
+    JobJournal(path, client="service").add("https://example.com/service", OPTIONS)
+    assert [entry["url"] for entry in JobJournal(path, client="gui").unfinished()] == ["https://example.com/gui"]
+    assert [entry["url"] for entry in JobJournal(path, client="service").unfinished()] == \
+        ["https://example.com/service"]
+
+
+def test_service_requeues_journalled_jobs(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    service, [(status, _)] = run(tmp_path, ("POST", "/jobs", {"url": "https://example.com/v", "connections": 2}),
+                                 journal=JobJournal(path, client="service"))
+    assert status == 202
+    [job] = service.jobs.values()
+    JobJournal(path, client="service").set_format(job.journal_id, "22")
+
+    # The next start queues it again, with the format it had chosen
+    service, _ = run(tmp_path, journal=JobJournal(path, client="service"))
+    [resumed] = service.queue
+    assert resumed.journal_id == job.journal_id
+    assert resumed.job.url == "https://example.com/v"
+    assert resumed.job.format_id == "22"
+    assert resumed.job.connections == 2
+    assert resumed.job.part_path is None
+
+
+def test_service_passes_the_part_file_on(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    journal = JobJournal(path, client="service")
+    journal_id = journal.add("https://example.com/v", OPTIONS)
+    journal.set_part_path(journal_id, "/downloads/v.mp4.part")
+    service, _ = run(tmp_path, journal=JobJournal(path, client="service"))
+    [resumed] = service.queue
+    assert resumed.job.part_path == "/downloads/v.mp4.part"
+
+
+@pytest.fixture
+def server():
+    server = RangeServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def resume(server, tmp_path, part_name, size):
+    """Run a job resumed from a .part file holding the first size bytes"""
+    part_path = str(tmp_path / part_name)
+    with open(part_path, "wb") as part_file:
+        part_file.write(server.data[:size])
+    job = DownloadJob(server.url, str(tmp_path), format_option="auto", part_path=part_path)
+    success, message = job.run()
+    assert success, message
+
+
+def test_resume_continues_the_part_file(server, tmp_path):
+    # The title the file was started under has changed since
+    half = len(server.data) // 2
+    resume(server, tmp_path, "Old title.bin.part", half)
+    assert os.listdir(tmp_path) == ["Old title.bin"]
+    with open(tmp_path / "Old title.bin", "rb") as done:
+        assert done.read() == server.data
+    assert server.requested[-1] == f"bytes={half}-"
+
+
+def test_part_file_of_another_format_is_removed(server, tmp_path):
+    resume(server, tmp_path, "Old title.webm.part", 1000)
+    assert os.listdir(tmp_path) == ["file.bin"]
+    assert server.requested[-1] is None
+
+
+def test_missing_part_file_downloads_from_the_start(server, tmp_path):
+    job = DownloadJob(server.url, str(tmp_path), format_option="auto", part_path=str(tmp_path / "gone.bin.part"))
+    assert job.run()[0]
+    assert os.listdir(tmp_path) == ["file.bin"]
@@ -0,0 +1,46 @@
+from yt_dlp.extractor.common import InfoExtractor
+
+from engine import CountingYoutubeDL
+from playlist import entry_url, iter_entry_urls, split_entry_url
+
+
+class FirstIE(InfoExtractor):
+    _VALID_URL = r"(?P<id>[a-z0-9]{6})$"
+
+    def _real_extract(self, url):
+        return {"id": self._match_id(url), "title": "first", "url": "http://127.0.0.1/first.mp4"}
+
+
+class SecondIE(FirstIE):
+    def _real_extract(self, url):
+        return {"id": self._match_id(url), "title": "second", "url": "http://127.0.0.1/second.mp4"}
+
+
+def make_ydl():
+    ydl = CountingYoutubeDL({"quiet": True}, auto_init=False)
+    ydl.add_info_extractor(FirstIE())
+    ydl.add_info_extractor(SecondIE())
+    return ydl
+
+
+def test_entry_url_prefers_webpage_url():
+    entry = {"_type": "url", "url": "abc123", "ie_key": "Second", "webpage_url": "https://example.com/abc123"}
+    assert entry_url(entry) == "https://example.com/abc123"
+
+
+def test_entry_url_keeps_plain_urls():
+    entry = {"_type": "url", "url": "https://www.youtube.com/watch?v=dQw4w9WgXcQ", "ie_key": "Youtube"}
+    assert entry_url(entry) == entry["url"]
+    assert split_entry_url(entry_url(entry)) == (entry["url"], None)
+
+
+def test_id_only_entry_keeps_its_extractor():
+    entries = [{"_type": "url", "url": "abc123", "ie_key": "Second"}, {"_type": "url", "url": "def456"}]
+    urls = list(iter_entry_urls({"_type": "playlist", "entries": entries}))
+    assert split_entry_url(urls[0]) == ("abc123", "Second")
+    assert urls[1] == "def456"
+
+    ydl = make_ydl()
+    # FirstIE matches the id too and comes first; only the ie_key picks SecondIE
+    assert ydl.extract_info(urls[0], download=False, process=False)["title"] == "second"
+    assert ydl.extract_info(urls[1], download=False, process=False)["title"] == "first"
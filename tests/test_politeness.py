@@ -0,0 +1,169 @@
+import asyncio
+import http.server
+import threading
+import time
+
+import pytest
+
+from politeness import HostScheduler, host_key, is_throttled
+from service import DownloadService
+
+
+@pytest.mark.parametrize("url, key", [
+    ("https://www.youtube.com/watch?v=x", "youtube.com"),
+    ("https://m.youtube.com/", "youtube.com"),
+    ("https://youtube.com", "youtube.com"),
+    ("https://news.bbc.co.uk/a", "bbc.co.uk"),
+    ("https://www.example.co.uk/", "example.co.uk"),
+    ("https://www.abc.net.au/", "abc.net.au"),
+    ("https://alice.github.io/v.mp4", "alice.github.io"),
+    ("https://bob.github.io/v.mp4", "bob.github.io"),
+    ("https://a.b.s3.amazonaws.com/v.mp4", "b.s3.amazonaws.com"),
+    ("https://t.co/x", "t.co"),
+    ("https://Example.COM./", "example.com"),
+    ("http://127.0.0.1:8000/v", "127.0.0.1"),
+    ("http://[::1]/v", "::1"),
+])
+def test_host_key(url, key):
+    assert host_key(url) == key
+
+
+def test_unrelated_sites_under_a_public_suffix_do_not_share_a_cap():
+    assert host_key("https://bbc.co.uk/") != host_key("https://example.co.uk/")
+    assert host_key("https://www.bbc.co.uk/") == host_key("https://news.bbc.co.uk/")
+
+
+def test_is_throttled():
+    assert is_throttled("ERROR: unable to download video data: HTTP Error 429: Too Many Requests")
+    assert is_throttled("HTTP Error 503: Service Unavailable")
+    assert not is_throttled("HTTP Error 404: Not Found")
+    assert not is_throttled(None)
+
+
+def test_scheduler_caps_spaces_and_backs_off():
+    hosts = HostScheduler(max_per_host=2, min_interval=1.0, base_backoff=10.0)
+    assert hosts.try_start("a", now=0)
+    assert not hosts.try_start("a", now=0.5)
+    assert hosts.try_start("a", now=1.0)
+    assert hosts.wait_time("a", now=5) is None
+    assert hosts.pick(["a", "b"], now=5) == (1, 0)
+    hosts.finish("a")
+    delay = hosts.finish("a", throttled=True)
+    assert 5.0 <= delay <= 15.0
+    assert hosts.wait_time("a") > 4.0
+
+
+class StubServer(http.server.ThreadingHTTPServer):
+    """Serves small videos, answering 429 above limit requests at once for a host
+
+    Each video takes ten times delay seconds to send.
+    """
+    daemon_threads = True
+
+    def __init__(self, limits, delay=0.02):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.limits = limits
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.active = {}
+        self.throttled = 0
+        self.peak = {}
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        host = self.headers["Host"].rsplit(":", 1)[0]
+        with server.lock:
+            if server.active.get(host, 0) >= server.limits.get(host, 1000):
+                server.throttled += 1
+                self.send_response(429)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            server.active[host] = server.active.get(host, 0) + 1
+            server.peak[host] = max(server.peak.get(host, 0), server.active[host])
+        try:
+            body = b"\0" * 100000
+            self.send_response(200)
+            self.send_header("Content-Type", "video/mp4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            for pos in range(0, len(body), 10000):
+                self.wfile.write(body[pos:pos + 10000])
+                time.sleep(server.delay)
+        except OSError:
+            pass
+        finally:
+            with server.lock:
+                server.active[host] -= 1
+
+
+@pytest.fixture
+def stub_server():
+    servers = []
+
+    def start(limits, delay=0.02):
+        server = StubServer(limits, delay)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def run_service(tmp_path, urls, hosts):
+    async def main():
+        service = DownloadService(str(tmp_path), workers=6, hosts=hosts)
+        await service.start("127.0.0.1", 0)
+        jobs = service.submit([{"url": url, "redownload": True, "format": "auto"} for url in urls])
+        finished = {}
+        started = time.monotonic()
+        while len(finished) < len(jobs) and time.monotonic() - started < 60:
+            elapsed = time.monotonic() - started
+            for job in jobs:
+                if job.state not in ("queued", "running") and job.id not in finished:
+                    finished[job.id] = elapsed
+            await asyncio.sleep(0.05)
+        return jobs, finished
+    return asyncio.run(main())
+
+
+def test_throttled_site_backs_off_without_holding_up_others(tmp_path, stub_server):
+    # 127.0.0.1 and localhost are two sites on the same stub server; only
+    # the first one throttles. A job may still have its extraction request
+    # open when its download starts, so the limit lets one job through whole.
+    # The downloads are slow enough to overlap on a loaded machine too
+    server = stub_server({"127.0.0.1": 2}, delay=0.1)
+    port = server.server_address[1]
+    throttled = [f"http://127.0.0.1:{port}/a{index}.mp4" for index in range(4)]
+    other = [f"http://localhost:{port}/b{index}.mp4" for index in range(4)]
+    jobs, finished = run_service(tmp_path, throttled + other, HostScheduler(3, 0.0, base_backoff=0.2))
+
+    assert [job.state for job in jobs] == ["finished"] * 8, [job.message for job in jobs]
+    assert server.throttled > 0
+    assert sum(job.retries for job in jobs) > 0
+    assert all(job.retries == 0 for job in jobs[4:])
+    # The other site is not held up by the backoff; under load its last job
+    # may still end a little after the throttled site's, so allow one download
+    assert max(finished[job.id] for job in jobs[4:]) <= max(finished[job.id] for job in jobs[:4]) + 1.0
+
+
+def test_host_cap_keeps_jobs_under_the_server_limit(tmp_path, stub_server):
+    # A job may still have its extraction request open when its download
+    # starts, so each running job counts for two connections
+    server = stub_server({"127.0.0.1": 4})
+    port = server.server_address[1]
+    urls = [f"http://127.0.0.1:{port}/a{index}.mp4" for index in range(6)]
+    jobs, finished = run_service(tmp_path, urls, HostScheduler(2, 0.0))
+
+    assert [job.state for job in jobs] == ["finished"] * 6, [job.message for job in jobs]
+    assert server.throttled == 0
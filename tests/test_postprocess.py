@@ -0,0 +1,94 @@
+import threading
+import time
+
+import pytest
+from yt_dlp.utils import DownloadCancelled
+
+from postprocess import PostProcessStage
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def start_jobs(stage, count, release):
+    """Threads that each hold a slot until release is set"""
+    peak = []
+
+    def job():
+        with stage.slot():
+            peak.append(stage.stats()["active"])
+            release.wait(5)
+
+    threads = [threading.Thread(target=job) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, peak
+
+
+def test_slots_are_capped_at_the_workers():
+    stage = PostProcessStage(workers=2)
+    release = threading.Event()
+    threads, peak = start_jobs(stage, 5, release)
+    wait_for(lambda: stage.stats() == {"workers": 2, "active": 2, "waiting": 3})
+
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert max(peak) == 2 and len(peak) == 5
+    assert stage.stats() == {"workers": 2, "active": 0, "waiting": 0}
+
+
+def test_slot_is_released_when_the_body_raises():
+    stage = PostProcessStage(workers=1)
+    with pytest.raises(RuntimeError):
+        with stage.slot():
+            raise RuntimeError("ffmpeg failed")
+    assert stage.stats()["active"] == 0
+    # The next job gets the slot at once
+    with stage.slot():
+        assert stage.stats()["active"] == 1
+
+
+def test_cancelled_job_leaves_the_queue():
+    stage = PostProcessStage(workers=1)
+    release, cancel = threading.Event(), threading.Event()
+    threads, _ = start_jobs(stage, 1, release)
+    wait_for(lambda: stage.stats()["active"] == 1)
+
+    errors = []
+
+    def waiter():
+        try:
+            with stage.slot(cancel, "Download cancelled by user"):
+                pass
+        except DownloadCancelled as error:
+            errors.append(str(error))
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    wait_for(lambda: stage.stats()["waiting"] == 1)
+    cancel.set()
+    thread.join(5)
+    assert errors == ["Download cancelled by user"]
+    assert stage.stats() == {"workers": 1, "active": 1, "waiting": 0}
+    release.set()
+    threads[0].join(5)
+
+
+def test_more_workers_let_waiting_jobs_in():
+    stage = PostProcessStage(workers=1)
+    release = threading.Event()
+    threads, _ = start_jobs(stage, 3, release)
+    wait_for(lambda: stage.stats()["waiting"] == 2)
+
+    stage.set_workers(3)
+    wait_for(lambda: stage.stats()["active"] == 3)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    stage.set_workers(0)
+    assert stage.workers == 1
@@ -0,0 +1,137 @@
+import pytest
+import yt_dlp
+from yt_dlp.postprocessor import ffmpeg
+
+from remux import (CONTAINER_CODECS, COPY, TRANSCODE, FitContainerPP, conversion_path, describe, faststart_args,
+                   moov_reserve, plan, stream_codecs)
+
+# A codec string extractors report for each family
+VIDEO_CODECS = {"h264": "avc1.64001F", "h265": "hvc1.1.6.L120.90", "av1": "av01.0.08M.08", "vp9": "vp09.00.40.08",
+                "vp8": "vp8", "mpeg4": "mp4v.20.3"}
+AUDIO_CODECS = {"aac": "mp4a.40.2", "mp3": "mp3", "opus": "opus", "vorbis": "vorbis", "ac3": "ac-3",
+                "eac3": "ec-3", "alac": "alac", "flac": "flac"}
+
+
+def fits(target, kind, family):
+    allowed = CONTAINER_CODECS[target][kind]
+    return allowed is None or family in allowed
+
+
+@pytest.mark.parametrize("target", sorted(CONTAINER_CODECS))
+@pytest.mark.parametrize("video", sorted(VIDEO_CODECS))
+@pytest.mark.parametrize("audio", sorted(AUDIO_CODECS))
+def test_plan_follows_the_container_matrix(target, video, audio):
+    combined = [{"vcodec": VIDEO_CODECS[video], "acodec": AUDIO_CODECS[audio]}]
+    merged = [{"vcodec": VIDEO_CODECS[video], "acodec": "none"}, {"vcodec": "none", "acodec": AUDIO_CODECS[audio]}]
+    expected = {"video": fits(target, "video", video), "audio": fits(target, "audio", audio)}
+    assert plan(target, combined) == expected
+    assert plan(target, merged) == expected
+    assert conversion_path(expected) == (COPY if all(expected.values()) else TRANSCODE)
+
+
+def test_missing_streams_and_codecs():
+    # A stream the formats do not have counts as copied
+    assert plan("webm", [{"vcodec": "none", "acodec": "opus"}]) == {"video": True, "audio": True}
+    # Unreported codecs are guessed from the extension
+    assert stream_codecs({"ext": "webm"}) == ("vp9", "opus")
+    assert plan("mp4", [{"ext": "webm"}]) == {"video": True, "audio": False}
+    assert plan("mp4", [{"ext": "flv"}]) == {"video": True, "audio": True}
+
+
+def test_describe():
+    assert describe("mkv", {"video": True, "audio": True}) == "MKV by stream copy, without re-encoding"
+    assert describe("mp4", {"video": True, "audio": False}) == "MP4 by re-encoding the audio and copying the video"
+    assert describe("webm", {"video": False, "audio": False}) == "WEBM by re-encoding"
+    assert describe("mp3", {"video": True, "audio": False}) == "MP3 by re-encoding"
+
+
+def test_moov_reserve():
+    assert moov_reserve(None, [{"vcodec": "avc1"}]) is None
+    formats = [{"vcodec": "avc1", "acodec": "none", "fps": 30}, {"vcodec": "none", "acodec": "mp4a"}]
+    # 30 video frames and 50 audio packets a second, 24 bytes each, over the base
+    assert moov_reserve(10, formats) == 32 * 1024 + (300 + 500) * 24
+    # Without a frame rate, 60 fps is assumed
+    assert moov_reserve(10, [{"vcodec": "avc1", "acodec": "none"}]) == 32 * 1024 + 600 * 24
+
+
+@pytest.fixture
+def ffmpeg_runs(monkeypatch):
+    """Stands in for FFmpeg: records each command line, failing runs while returncodes holds non-zero codes"""
+    runs = []
+    returncodes = []
+
+    def run(cmd, *args, **kwargs):
+        runs.append(cmd)
+        code = returncodes.pop(0) if returncodes else 0
+        if code == 0:
+            with open(cmd[-1].replace("file:", "", 1), "wb") as output:
+                output.write(b"\0")
+        return "", "moov atom does not fit" if code else "", code
+
+    monkeypatch.setattr(ffmpeg.FFmpegPostProcessor, "_get_ffmpeg_version", lambda self, program: ("6.0", {}))
+    monkeypatch.setattr(ffmpeg.Popen, "run", run)
+    return runs, returncodes
+
+
+def output_args(cmd):
+    """Options of the output file: everything after the last input"""
+    return cmd[len(cmd) - 1 - cmd[::-1].index("-i") + 2:-1]
+
+
+def convert(tmp_path, copies, reserve, target="mp4"):
+    source = tmp_path / "video.mkv"
+    source.write_bytes(b"\0")
+    with yt_dlp.YoutubeDL({"quiet": True}) as ydl:
+        pp = FitContainerPP(ydl, target, copies, reserve)
+        return pp.run({"filepath": str(source), "ext": "mkv"})
+
+
+def test_fit_container_reserves_room_for_the_index(tmp_path, ffmpeg_runs):
+    runs, _ = ffmpeg_runs
+    files, info = convert(tmp_path, {"video": True, "audio": False}, 50000)
+    assert info["filepath"] == str(tmp_path / "video.mp4")
+    [cmd] = runs
+    args = output_args(cmd)
+    assert args[args.index("-c:v") + 1] == "copy"
+    assert "-c:a" not in args
+    # The reserve follows yt-dlp's +faststart, so its -movflags wins
+    assert args[-4:] == faststart_args(50000)
+    assert args.index("+faststart") < args.index("-faststart")
+
+
+def test_fit_container_retries_without_the_reserve(tmp_path, ffmpeg_runs):
+    runs, returncodes = ffmpeg_runs
+    returncodes.append(1)
+    files, info = convert(tmp_path, {"video": True, "audio": True}, 50000)
+    assert len(runs) == 2
+    assert "-moov_size" in runs[0]
+    assert "-moov_size" not in runs[1] and "+faststart" in output_args(runs[1])
+    assert info["ext"] == "mp4"
+
+
+def test_fit_container_without_reserve_fails_once(tmp_path, ffmpeg_runs):
+    runs, returncodes = ffmpeg_runs
+    returncodes.append(1)
+    with pytest.raises(yt_dlp.utils.PostProcessingError):
+        convert(tmp_path, {"video": True, "audio": True}, None)
+    assert len(runs) == 1
+
+
+def test_merger_args_apply_to_the_output_after_faststart(tmp_path, ffmpeg_runs):
+    runs, _ = ffmpeg_runs
+    parts = [tmp_path / "video.f1.mp4", tmp_path / "video.f2.m4a"]
+    for part in parts:
+        part.write_bytes(b"\0")
+    params = {"quiet": True, "postprocessor_args": {"merger": faststart_args(50000)}}
+    with yt_dlp.YoutubeDL(params) as ydl:
+        ffmpeg.FFmpegMergerPP(ydl).run({
+            "filepath": str(tmp_path / "video.mp4"), "ext": "mp4",
+            "requested_formats": [{"vcodec": "avc1", "acodec": "none", "protocol": "https"},
+                                  {"vcodec": "none", "acodec": "mp4a.40.2", "protocol": "https"}],
+            "__files_to_merge": [str(part) for part in parts]})
+    [cmd] = runs
+    # Not applied to the inputs
+    assert cmd.index("-moov_size") > len(cmd) - 1 - cmd[::-1].index("-i")
+    args = output_args(cmd)
+    assert args[-4:] == faststart_args(50000)
+    assert args.index("+faststart") < args.index("-faststart")
@@ -0,0 +1,118 @@
+import http.server
+import os
+import re
+import threading
+import time
+
+import pytest
+import yt_dlp
+
+from engine import CountingYoutubeDL
+from segmented import MIN_SEGMENT_SIZE
+
+SIZE = 4 * MIN_SEGMENT_SIZE
+CHUNK = 16 * 1024
+
+
+class RangeServer(http.server.ThreadingHTTPServer):
+    """Serves one file slowly, answering range requests while ranges is true"""
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), RangeHandler)
+        self.data = os.urandom(SIZE)
+        self.ranges = True
+        # Range header of every request, None for requests without one
+        self.requested = []
+        self.url = f'http://127.0.0.1:{self.server_address[1]}/file.bin'
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        data = self.server.data
+        self.server.requested.append(self.headers.get('Range'))
+        start, end = 0, len(data) - 1
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range') or '')
+        if match and self.server.ranges:
+            start = int(match.group(1))
+            if start >= len(data):
+                self.send_response(416)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            end = min(int(match.group(2) or end), end)
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(data)}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        try:
+            for pos in range(start, end + 1, CHUNK):
+                self.wfile.write(data[pos:min(pos + CHUNK, end + 1)])
+                time.sleep(0.005)
+        except OSError:
+            pass
+
+
+@pytest.fixture
+def server():
+    server = RangeServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def download(server, filename, connections, progress_hook=None):
+    params = {'quiet': True, 'noprogress': True, 'retries': 0, 'segment_connections': connections,
+              'progress_hooks': [progress_hook] if progress_hook else []}
+    with CountingYoutubeDL(params) as ydl:
+        info = {'url': server.url, 'ext': 'bin', 'http_headers': {}}
+        return ydl.dl(filename, info)
+
+
+def interrupt_segmented(server, filename):
+    def cancel(d):
+        if d['status'] == 'downloading' and d['downloaded_bytes']:
+            raise yt_dlp.utils.DownloadCancelled('interrupted')
+
+    with pytest.raises(yt_dlp.utils.DownloadCancelled):
+        download(server, filename, 4, cancel)
+    assert os.path.getsize(filename + '.part') == SIZE
+    assert os.path.isfile(filename + '.part.segments')
+
+
+def test_segmented_download(server, tmp_path):
+    filename = str(tmp_path / 'file.bin')
+    assert download(server, filename, 4)
+    with open(filename, 'rb') as f:
+        assert f.read() == server.data
+    assert not os.path.exists(filename + '.part.segments')
+
+
+def test_resume_segmented_with_one_connection(server, tmp_path):
+    filename = str(tmp_path / 'file.bin')
+    interrupt_segmented(server, filename)
+
+    assert download(server, filename, 1)
+    with open(filename, 'rb') as f:
+        assert f.read() == server.data
+    assert sorted(os.listdir(tmp_path)) == ['file.bin']
+
+
+def test_resume_without_range_support_starts_over(server, tmp_path):
+    filename = str(tmp_path / 'file.bin')
+    interrupt_segmented(server, filename)
+
+    server.ranges = False
+    assert download(server, filename, 4)
+    with open(filename, 'rb') as f:
+        assert f.read() == server.data
+    assert sorted(os.listdir(tmp_path)) == ['file.bin']
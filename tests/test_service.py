@@ -0,0 +1,79 @@
+import asyncio
+import json
+
+import pytest
+
+from service import DownloadService
+
+
+async def request(port, method, path, body=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    data = json.dumps(body).encode("utf-8") if body is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(data)}\r\n\r\n"
+                 .encode("latin-1") + data)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(body) if body else None
+
+
+def run(tmp_path, *requests, **options):
+    """Send requests to a service without workers, so jobs stay queued"""
+    async def main():
+        service = DownloadService(str(tmp_path), workers=0, **options)
+        server = await service.start("127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            responses = [await request(port, *args) for args in requests]
+        return service, responses
+    return asyncio.run(main())
+
+
+def submit(tmp_path, body, **options):
+    service, [(status, data)] = run(tmp_path, ("POST", "/jobs", body), **options)
+    return service, status, data
+
+
+@pytest.mark.parametrize("name", ["connections", "fragments"])
+@pytest.mark.parametrize("value", [None, "abc", 0, -2, 1.5, True, [4]])
+def test_bad_counts_are_rejected(tmp_path, name, value):
+    service, status, data = submit(tmp_path, {"url": "https://example.com/v", name: value})
+    assert status == 400
+    assert name in data["error"]
+    assert not service.jobs
+
+
+def test_batch_with_one_bad_spec_queues_nothing(tmp_path):
+    body = {"urls": ["https://example.com/a", "https://example.com/b"], "connections": "x"}
+    service, status, data = submit(tmp_path, body)
+    assert status == 400
+    assert not service.jobs and not service.queue
+
+
+def test_counts_are_coerced(tmp_path):
+    service, status, data = submit(tmp_path, {"url": "https://example.com/v", "connections": "4", "fragments": 2})
+    assert status == 202
+    [job] = service.jobs.values()
+    assert job.job.connections == 4
+    assert job.job.fragments == 2
+
+
+@pytest.mark.parametrize("body", [[], "x", 4, {"urls": "https://example.com/v"}, {"urls": []}, {}])
+def test_bad_payloads_are_rejected(tmp_path, body):
+    service, status, data = submit(tmp_path, body)
+    assert status == 400
+    assert not service.jobs
+
+
+def test_only_the_last_finished_jobs_are_kept(tmp_path):
+    urls = [f"https://example.com/{index}" for index in range(5)]
+    service, responses = run(
+        tmp_path, ("POST", "/jobs", {"urls": urls}),
+        *[("DELETE", f"/jobs/{job_id}") for job_id in range(1, 5)],
+        ("GET", "/jobs"), ("GET", "/jobs/1"),
+        keep_finished=2)
+    assert [status for status, data in responses[1:5]] == [202] * 4
+    status, data = responses[5]
+    assert [(job["id"], job["state"]) for job in data["jobs"]] == [(3, "cancelled"), (4, "cancelled"), (5, "queued")]
+    assert responses[6][0] == 404
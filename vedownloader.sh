@@ -6,6 +6,16 @@
 # Set script to exit on error
 set -e
 
+# Headless mode: any arguments are passed to the command-line downloader,
+# which does not need PyQt5 or a display
+if [ "$#" -gt 0 ]; then
+    SCRIPT_DIR="$(cd "$(dirname "$(readlink -f "${BASH_SOURCE[0]}")")" &> /dev/null && pwd)"
+    if [ -f "$SCRIPT_DIR/.venv/bin/activate" ]; then
+        source "$SCRIPT_DIR/.venv/bin/activate"
+    fi
+    exec python3 "$SCRIPT_DIR/cli.py" "$@"
+fi
+
 # Display banner
 echo "========================================"
 echo "       VeDownloader Launcher           "
@@ -14,42 +24,68 @@ echo "Developed by: OsiragenTM"
 echo "========================================"
 echo ""
 
-# Check if Python is installed
-if ! command -v python3 &> /dev/null; then
-    echo "Error: Python 3 is not installed."
-    echo "Please install Python 3 using your distribution's package manager."
-    echo "For example: sudo apt install python3 python3-pip python3-venv"
-    exit 1
-fi
+# Dependency checks start Python and pip several times, so they are skipped
+# while nothing they looked at has changed. The stamp written after they pass
+# holds the versions they found and, on its last line, a hash of the
+# interpreter, the installed packages and this launcher.
+STAMP=".venv/.vedownloader-stamp"
 
-# Check Python version
-PYTHON_VERSION=$(python3 -c 'import sys; print(f"{sys.version_info.major}.{sys.version_info.minor}")')
-REQUIRED_VERSION="3.6"
+venv_hash() {
+    # Read without starting Python; creating the venv or installing,
+    # upgrading or removing a package changes it
+    {
+        stat -L -c '%n %s %Y' .venv/bin/python3
+        cat .venv/pyvenv.cfg
+        printf '%s\n' .venv/lib/python*/site-packages/*.dist-info .venv/lib/python*/site-packages/*.egg-info
+        cksum < "${BASH_SOURCE[0]}"
+    } 2>/dev/null | cksum
+}
 
-if [ "$(printf '%s\n' "$REQUIRED_VERSION" "$PYTHON_VERSION" | sort -V | head -n1)" != "$REQUIRED_VERSION" ]; then
-    echo "Error: Python version $PYTHON_VERSION is installed, but VeDownloader requires Python $REQUIRED_VERSION or higher."
-    exit 1
-fi
+if [ -f "$STAMP" ] && [ "$(tail -n 1 "$STAMP")" == "venv $(venv_hash)" ]; then
+    echo "Dependencies unchanged since the last check."
+    source .venv/bin/activate
+else
+    # Check if Python is installed
+    if ! command -v python3 &> /dev/null; then
+        echo "Error: Python 3 is not installed."
+        echo "Please install Python 3 using your distribution's package manager."
+        echo "For example: sudo apt install python3 python3-pip python3-venv"
+        exit 1
+    fi
 
-# Set up virtual environment if it doesn't exist
-if [ ! -d ".venv" ]; then
-    echo "Setting up virtual environment..."
-    python3 -m venv .venv
-    echo "Virtual environment created."
-fi
+    # Check Python version
+    PYTHON_VERSION=$(python3 -c 'import sys; print(f"{sys.version_info.major}.{sys.version_info.minor}")')
+    REQUIRED_VERSION="3.6"
 
-# Activate virtual environment
-echo "Activating virtual environment..."
-source .venv/bin/activate
+    if [ "$(printf '%s\n' "$REQUIRED_VERSION" "$PYTHON_VERSION" | sort -V | head -n1)" != "$REQUIRED_VERSION" ]; then
+        echo "Error: Python version $PYTHON_VERSION is installed, but VeDownloader requires Python $REQUIRED_VERSION or higher."
+        exit 1
+    fi
 
-# Install required packages if needed
-echo "Checking dependencies..."
-if ! pip show PyQt5 &> /dev/null || ! pip show yt-dlp &> /dev/null; then
-    echo "Installing required packages..."
-    pip install PyQt5 yt-dlp
-    echo "Dependencies installed."
-else
-    echo "Dependencies already installed."
+    # Set up virtual environment if it doesn't exist
+    if [ ! -d ".venv" ]; then
+        echo "Setting up virtual environment..."
+        python3 -m venv .venv
+        echo "Virtual environment created."
+    fi
+
+    # Activate virtual environment
+    echo "Activating virtual environment..."
+    source .venv/bin/activate
+
+    # Install required packages if needed; one pip run reports both
+    echo "Checking dependencies..."
+    DEPENDENCIES=$(pip show PyQt5 yt-dlp 2> /dev/null | awk '/^Name:/ {name = $2} /^Version:/ {print name, $2}')
+    if [ "$(printf '%s\n' "$DEPENDENCIES" | grep -c .)" -lt 2 ]; then
+        echo "Installing required packages..."
+        pip install PyQt5 yt-dlp
+        echo "Dependencies installed."
+        DEPENDENCIES=$(pip show PyQt5 yt-dlp 2> /dev/null | awk '/^Name:/ {name = $2} /^Version:/ {print name, $2}')
+    else
+        echo "Dependencies already installed."
+    fi
+
+    printf 'python %s\n%s\nvenv %s\n' "$PYTHON_VERSION" "$DEPENDENCIES" "$(venv_hash)" > "$STAMP"
 fi
 
 # Check if FFmpeg is installed